@@ -1,11 +1,12 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, session, g
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, session, g, stream_with_context, has_request_context
 import os
-from datetime import datetime
-from sqlalchemy import func
-from sqlalchemy import inspect, text
+from datetime import date, datetime
 from functools import wraps
 import io
 import secrets
+import click
+
+from database import configure_engine, database_url, engine_options, write_transactions
 
 app = Flask(__name__)
 # Use SECRET_KEY and DATABASE_URL from environment when available (useful in hosting)
@@ -13,14 +14,81 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
 # Make sqlite path absolute by default so WSGI processes can find the DB reliably
 basedir = os.path.abspath(os.path.dirname(__file__))
 default_sqlite = f"sqlite:///{os.path.join(basedir, 'sistema_financeiro.db')}"
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', default_sqlite)
+# DATABASE_URL pode apontar para um PostgreSQL (vários nós no mesmo banco); o pool vem de DB_POOL_* (database.py)
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url(os.environ.get('DATABASE_URL', default_sqlite))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-from models import db, Receita, CategoriaDespesa, SubcategoriaDespesa, TipoPagamento, Despesa, Usuario
-from pdf_generator import generate_pdf_report
+# Pasta de arquivos compartilhados entre os workers (versão dos dados, caches em disco)
+app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(app.instance_path, 'cache'))
+# Processos usados para montar relatórios PDF grandes em paralelo (precisa da pypdf). Padrão 1: cada relatório
+# grande sobe um pool próprio, então só vale a pena com núcleos sobrando além dos workers (ver benchmark_pdf.py)
+app.config['PDF_PROCESSES'] = int(os.environ.get('PDF_PROCESSES', 1))
+
+from models import db, Receita, CategoriaDespesa, SubcategoriaDespesa, TipoPagamento, Despesa, Usuario, missing_indexes
+from migrations import VERSAO_ATUAL, schema_version, pending_migrations, upgrade
+from pdf_generator import generate_pdf_report, report_cache_key, pdf_response
+from pdf_cache import PdfCache, LIMITE_PADRAO as PDF_LIMITE_PADRAO
+from report_jobs import ReportJobs, TRABALHOS_SIMULTANEOS_PADRAO, CONCLUIDO
+from report_formats import parse_formats, export_report, stream_report, streaming_response
+from report_engine import ReportFilters, compute_summary
+from projection import projection_from_args
+from rollup import rebuild_monthly_summary
+from installments import expand_installments, next_purchase_ids, insert_expenses, update_installment_group, delete_installments
+from batch import create_receitas, create_despesas
+from importer import import_statement, format_from_filename, TAMANHO_LOTE_PADRAO
+from pagination import receitas_page, despesas_page, receita_categories
+from reference_data import CategoryResolver, ReferenceCache, TTL_PADRAO as REFERENCIA_TTL_PADRAO
+from data_version import data_version, reference_version, user_version
+import pdf_parallel
+from user_cache import UserCache, TTL_PADRAO
 
 db.init_app(app)
 
+# POSTs que só leem o banco: não precisam reservar a escrita do SQLite
+ROTAS_SO_LEITURA = {'login', 'enfileirar_relatorio_pdf'}
+
+def _transacao_de_escrita():
+    return (has_request_context() and request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and request.endpoint not in ROTAS_SO_LEITURA)
+
+# No SQLite: WAL (relatórios leem enquanto outra requisição grava) e escrita reservada no início da transação
+with app.app_context():
+    configure_engine(db.engine, escrita=_transacao_de_escrita)
+
+if app.config['PDF_PROCESSES'] > 1 and not pdf_parallel.DISPONIVEL:
+    app.logger.warning('PDF_PROCESSES=%s, mas a pypdf não está instalada: os relatórios PDF serão montados num processo só.',
+                       app.config['PDF_PROCESSES'])
+
+# Categorias, subcategorias e tipos de pagamento mudam pouco: ficam em memória até serem alterados
+reference_cache = ReferenceCache(ttl=int(os.environ.get('REFERENCE_CACHE_TTL', REFERENCIA_TTL_PADRAO)),
+                                 marcador=reference_version)
+
+# PDFs já gerados ficam em disco até os dados mudarem ou serem descartados pelo limite de tamanho
+pdf_cache = PdfCache(os.path.join(app.config['CACHE_DIR'], 'pdf'),
+                     limite_bytes=int(os.environ.get('PDF_CACHE_MAX_MB', PDF_LIMITE_PADRAO // (1024 * 1024))) * 1024 * 1024)
+
+# Relatórios grandes podem ser gerados em segundo plano, sem prender o worker da requisição
+report_jobs = ReportJobs(app, os.path.join(app.config['CACHE_DIR'], 'trabalhos'),
+                         max_workers=int(os.environ.get('PDF_JOBS_WORKERS', TRABALHOS_SIMULTANEOS_PADRAO)),
+                         cache=pdf_cache)
+
+# Usuários logados ficam em memória para as rotas não consultarem o banco a cada requisição
+user_cache = UserCache(ttl=int(os.environ.get('USER_CACHE_TTL', TTL_PADRAO)), versao=user_version.current)
+
+# Criar e alterar tabelas fica com `flask --app app migrar` (ou `python app.py`): ao subir, só a versão é conferida.
+# Registrado antes de load_user para que nenhuma consulta chegue a um banco desatualizado.
+with app.app_context():
+    banco_desatualizado = schema_version(db.engine) < VERSAO_ATUAL
+
+@app.before_request
+def exigir_banco_atualizado():
+    global banco_desatualizado
+    if banco_desatualizado and request.endpoint != 'static':
+        # relida a cada requisição só enquanto estiver atrasada (alguém pode rodar `migrar` com o servidor no ar)
+        banco_desatualizado = schema_version(db.engine) < VERSAO_ATUAL
+        if banco_desatualizado:
+            return 'Banco de dados desatualizado: rode `flask --app app migrar`.', 503
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -34,7 +102,7 @@ def login_required(f):
 def load_user():
     user_id = session.get('user_id')
     if user_id:
-        g.user = Usuario.query.get(user_id)
+        g.user = user_cache.get(user_id, lambda id: db.session.get(Usuario, id))
     else:
         g.user = None
 
@@ -101,6 +169,7 @@ def adicionar_usuario():
         
         db.session.add(novo_usuario)
         db.session.commit()
+        user_cache.invalidate(novo_usuario.id)
         
         return jsonify({'success': True, 'message': 'Usuário criado com sucesso!'})
     except Exception as e:
@@ -117,6 +186,7 @@ def deletar_usuario(username):
         if not usuario:
             return jsonify({'success': False, 'message': 'Usuário não encontrado!'})
         
+        user_cache.invalidate(usuario.id)
         db.session.delete(usuario)
         db.session.commit()
         
@@ -138,11 +208,22 @@ def alterar_senha():
         
         usuario.set_password(nova_senha)
         db.session.commit()
+        user_cache.invalidate(usuario.id)
         
         return jsonify({'success': True, 'message': 'Senha alterada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/usuarios/cache')
+@admin_required
+def estatisticas_cache_usuarios():
+    return jsonify(user_cache.stats())
+
+@app.route('/api/relatorio/pdf/cache')
+@admin_required
+def estatisticas_cache_pdf():
+    return jsonify(pdf_cache.stats())
+
 @app.route('/')
 @login_required
 def index():
@@ -151,180 +232,73 @@ def index():
 @app.route('/receitas')
 @login_required
 def receitas():
-    receitas_list = Receita.query.order_by(Receita.data.desc()).all()
-    return render_template('receitas.html', receitas=receitas_list)
+    # Só a primeira página é renderizada; as seguintes vêm de /api/receitas sob demanda
+    return render_template('receitas.html',
+                       pagina=receitas_page(request.args),
+                       categorias=receita_categories())
 
 @app.route('/despesas')
 @login_required
 def despesas():
-    despesas_list = Despesa.query.order_by(Despesa.data.desc()).all()
-    categorias_list = CategoriaDespesa.query.all()
-    tipos_pagamento_list = TipoPagamento.query.filter_by(ativo=True).all()
+    # Só a primeira página é renderizada; as seguintes vêm de /api/despesas sob demanda
+    referencia = reference_cache.get()
     return render_template('despesas.html', 
-                       despesas=despesas_list, 
-                       categorias=categorias_list,
-                       tipos_pagamento=tipos_pagamento_list)
+                       pagina=despesas_page(request.args), 
+                       categorias=referencia.categorias,
+                       tipos_pagamento=referencia.tipos_ativos)
 
 @app.route('/relatorios')
 @login_required
 def relatorios():
-    categorias_list = CategoriaDespesa.query.all()
-    tipos_pagamento_list = TipoPagamento.query.filter_by(ativo=True).all()
+    referencia = reference_cache.get()
     return render_template('relatorios.html', 
-                       categorias=categorias_list,
-                       tipos_pagamento=tipos_pagamento_list)
+                       categorias=referencia.categorias,
+                       tipos_pagamento=referencia.tipos_ativos)
 
 @app.route('/categorias')
 @login_required
 def categorias():
-    categorias_list = CategoriaDespesa.query.all()
-    return render_template('categorias.html', categorias=categorias_list)
+    return render_template('categorias.html', categorias=reference_cache.get().categorias)
 
 @app.route('/tipos-pagamento')
 @login_required
 def tipos_pagamento():
-    tipos_list = TipoPagamento.query.order_by(TipoPagamento.nome).all()
-    return render_template('tipos_pagamento.html', tipos_pagamento=tipos_list)
+    return render_template('tipos_pagamento.html', tipos_pagamento=reference_cache.get().tipos_pagamento)
+
+def _resposta_condicional(etag, gerar):
+    """Responde 304 sem chamar `gerar()` (nem tocar no banco) quando o navegador já tem a versão `etag`."""
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = gerar()
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _json_condicional(dados, etag):
+    """Resposta JSON com ETag; devolve 304 sem corpo quando o navegador já tem essa versão."""
+    return _resposta_condicional(etag, lambda: jsonify(dados))
 
 # API Routes
 @app.route('/api/relatorios/resumo')
 @login_required
 def relatorio_resumo():
     try:
-        categoria = request.args.get('categoria')
-        subcategoria = request.args.get('subcategoria')
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-        status = request.args.get('status')
-        tipo_pagamento_id = request.args.get('tipo_pagamento_id')
-
-        # Parse date filters to date objects when provided
-        data_inicio_obj = None
-        data_fim_obj = None
-        if data_inicio:
-            data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-        if data_fim:
-            data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-
-        # Total receitas
-        receitas_q = db.session.query(func.sum(Receita.valor))
-        if categoria:
-            receitas_q = receitas_q.filter(Receita.categoria == categoria)
-        if data_inicio_obj:
-            receitas_q = receitas_q.filter(Receita.data >= data_inicio_obj)
-        if data_fim_obj:
-            receitas_q = receitas_q.filter(Receita.data <= data_fim_obj)
-        if status:
-            if status == 'efetivado':
-                receitas_q = receitas_q.filter(Receita.efetivado == True)
-            elif status == 'pendente':
-                receitas_q = receitas_q.filter(Receita.efetivado == False)
-        total_receitas = receitas_q.scalar() or 0
-
-        # Total despesas
-        despesas_q = db.session.query(func.sum(Despesa.valor))
-        if categoria:
-            despesas_q = despesas_q.filter(Despesa.categoria == categoria)
-        if subcategoria:
-            despesas_q = despesas_q.filter(Despesa.subcategoria == subcategoria)
-        if data_inicio_obj:
-            despesas_q = despesas_q.filter(Despesa.data >= data_inicio_obj)
-        if data_fim_obj:
-            despesas_q = despesas_q.filter(Despesa.data <= data_fim_obj)
-        if tipo_pagamento_id:
-            despesas_q = despesas_q.filter(Despesa.tipo_pagamento_id == int(tipo_pagamento_id))
-        if status:
-            if status == 'efetivado':
-                despesas_q = despesas_q.filter(Despesa.efetivado == True)
-            elif status == 'pendente':
-                despesas_q = despesas_q.filter(Despesa.efetivado == False)
-        total_despesas = despesas_q.scalar() or 0
-
-        # Saldo atual
-        saldo_atual = total_receitas - total_despesas
-
-        # Receitas por categoria
-        receitas_categoria_q = db.session.query(
-            Receita.categoria,
-            func.sum(Receita.valor).label('total')
-        )
-        if categoria:
-            receitas_categoria_q = receitas_categoria_q.filter(Receita.categoria == categoria)
-        if data_inicio_obj:
-            receitas_categoria_q = receitas_categoria_q.filter(Receita.data >= data_inicio_obj)
-        if data_fim_obj:
-            receitas_categoria_q = receitas_categoria_q.filter(Receita.data <= data_fim_obj)
-        if status:
-            if status == 'efetivado':
-                receitas_categoria_q = receitas_categoria_q.filter(Receita.efetivado == True)
-            elif status == 'pendente':
-                receitas_categoria_q = receitas_categoria_q.filter(Receita.efetivado == False)
-        receitas_categoria = receitas_categoria_q.group_by(Receita.categoria).all()
-
-        # Despesas por categoria
-        despesas_categoria_q = db.session.query(
-            Despesa.categoria,
-            func.sum(Despesa.valor).label('total')
-        )
-        if categoria:
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.categoria == categoria)
-        if subcategoria:
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.subcategoria == subcategoria)
-        if data_inicio_obj:
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.data >= data_inicio_obj)
-        if data_fim_obj:
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.data <= data_fim_obj)
-        if status:
-            if status == 'efetivado':
-                despesas_categoria_q = despesas_categoria_q.filter(Despesa.efetivado == True)
-            elif status == 'pendente':
-                despesas_categoria_q = despesas_categoria_q.filter(Despesa.efetivado == False)
-        if tipo_pagamento_id:
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.tipo_pagamento_id == int(tipo_pagamento_id))
-        despesas_categoria = despesas_categoria_q.group_by(Despesa.categoria).all()
-
-        # Últimas transações
-        ultimas_receitas_q = db.session.query(Receita).order_by(Receita.data.desc())
-        if categoria:
-            ultimas_receitas_q = ultimas_receitas_q.filter(Receita.categoria == categoria)
-        if data_inicio_obj:
-            ultimas_receitas_q = ultimas_receitas_q.filter(Receita.data >= data_inicio_obj)
-        if data_fim_obj:
-            ultimas_receitas_q = ultimas_receitas_q.filter(Receita.data <= data_fim_obj)
-        if status:
-            if status == 'efetivado':
-                ultimas_receitas_q = ultimas_receitas_q.filter(Receita.efetivado == True)
-            elif status == 'pendente':
-                ultimas_receitas_q = ultimas_receitas_q.filter(Receita.efetivado == False)
-        ultimas_receitas = ultimas_receitas_q.limit(5).all()
-
-        ultimas_despesas_q = db.session.query(Despesa).order_by(Despesa.data.desc())
-        if categoria:
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.categoria == categoria)
-        if subcategoria:
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.subcategoria == subcategoria)
-        if data_inicio_obj:
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.data >= data_inicio_obj)
-        if data_fim_obj:
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.data <= data_fim_obj)
-        if tipo_pagamento_id:
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.tipo_pagamento_id == int(tipo_pagamento_id))
-        if status:
-            if status == 'efetivado':
-                ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.efetivado == True)
-            elif status == 'pendente':
-                ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.efetivado == False)
-        ultimas_despesas = ultimas_despesas_q.limit(5).all()
-        
-        return jsonify({
-            'total_receitas': total_receitas,
-            'total_despesas': total_despesas,
-            'saldo_atual': saldo_atual,
-            'receitas_categoria': [{'categoria': r.categoria, 'total': r.total} for r in receitas_categoria],
-            'despesas_categoria': [{'categoria': d.categoria, 'total': d.total} for d in despesas_categoria],
-            'ultimas_receitas': [{'descricao': r.descricao, 'valor': r.valor, 'data': r.data.strftime('%d/%m/%Y'), 'categoria': r.categoria, 'efetivado': bool(r.efetivado)} for r in ultimas_receitas],
-            'ultimas_despesas': [{'descricao': d.descricao, 'valor': d.valor, 'data': d.data.strftime('%d/%m/%Y'), 'categoria': d.categoria, 'subcategoria': d.subcategoria, 'efetivado': bool(d.efetivado)} for d in ultimas_despesas]
-        })
+        filtros = ReportFilters.from_args(request.args)
+        etag = data_version.etag('resumo', filtros.cache_key())
+        return _resposta_condicional(etag, lambda: jsonify(compute_summary(filtros)))
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/api/projecao')
+@login_required
+def projecao_saldo():
+    # ?inicio=AAAA-MM-DD&meses=60&granularidade=dia|mes&saldo_inicial=...; o padrão começa hoje
+    try:
+        etag = data_version.etag('projecao', f'{date.today()}|{request.query_string.decode()}')
+        return _resposta_condicional(etag, lambda: jsonify(projection_from_args(request.args)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)})
 
@@ -343,11 +317,133 @@ def gerar_relatorio_pdf():
             'TipoPagamento': TipoPagamento
         }
         
-        return generate_pdf_report(app, request, make_response, db, models)
+        etag = data_version.etag('pdf', report_cache_key(request.args))
+        return _resposta_condicional(etag, lambda: generate_pdf_report(app, request, make_response, db, models,
+                                                                       cache=pdf_cache))
     except Exception as e:
         app.logger.exception('Erro ao gerar PDF:')
         return jsonify({'error': f'Erro ao gerar PDF: {str(e)}'}), 500
 
+@app.route('/api/relatorio/exportar')
+@login_required
+def exportar_relatorio():
+    # ?formato=pdf|csv|xlsx|json, ou vários separados por vírgula (um .zip): o banco é lido uma vez só
+    try:
+        formatos = parse_formats(request.args.get('formato'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        models = {
+            'Receita': Receita,
+            'Despesa': Despesa,
+            'TipoPagamento': TipoPagamento
+        }
+
+        def gerar():
+            arquivo, nome, mimetype = export_report(request.args, formatos, db, models)
+            return pdf_response(make_response, arquivo, nome, mimetype)
+
+        etag = data_version.etag('exportar', ','.join(formatos) + '|' + report_cache_key(request.args))
+        return _resposta_condicional(etag, gerar)
+    except Exception as e:
+        app.logger.exception('Erro ao exportar relatório:')
+        return jsonify({'error': f'Erro ao exportar relatório: {str(e)}'}), 500
+
+def _exportacao_em_fluxo(formato):
+    # Mesmos filtros (e a mesma validação) de /api/relatorios/resumo
+    try:
+        ReportFilters.from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Filtro inválido: {str(e)}'}), 400
+    try:
+        models = {
+            'Receita': Receita,
+            'Despesa': Despesa,
+            'TipoPagamento': TipoPagamento
+        }
+
+        def gerar():
+            blocos, nome, mimetype = stream_report(request.args, formato, db, models)
+            return streaming_response(make_response, stream_with_context(blocos), nome, mimetype)
+
+        etag = data_version.etag(formato, report_cache_key(request.args))
+        return _resposta_condicional(etag, gerar)
+    except Exception as e:
+        app.logger.exception('Erro ao exportar relatório:')
+        return jsonify({'error': f'Erro ao exportar relatório: {str(e)}'}), 500
+
+@app.route('/api/relatorio/csv')
+@login_required
+def exportar_relatorio_csv():
+    return _exportacao_em_fluxo('csv')
+
+@app.route('/api/relatorio/xlsx')
+@login_required
+def exportar_relatorio_xlsx():
+    return _exportacao_em_fluxo('xlsx')
+
+def _estado_trabalho(trabalho):
+    estado = {campo: valor for campo, valor in trabalho.items() if campo != 'usuario_id'}
+    estado['status_url'] = url_for('status_relatorio_pdf', job_id=trabalho['id'])
+    if trabalho['status'] == CONCLUIDO:
+        estado['download_url'] = url_for('baixar_relatorio_pdf', job_id=trabalho['id'])
+    return estado
+
+def _trabalho_do_usuario(job_id):
+    trabalho = report_jobs.status(job_id)
+    if trabalho and trabalho['usuario_id'] != session['user_id']:
+        trabalho = None
+    return trabalho
+
+@app.route('/api/relatorio/pdf/jobs', methods=['POST'])
+@login_required
+def enfileirar_relatorio_pdf():
+    try:
+        models = {
+            'Receita': Receita,
+            'Despesa': Despesa,
+            'TipoPagamento': TipoPagamento
+        }
+        # Mesmos filtros do download direto, na query string ou no corpo JSON
+        filtros = request.get_json(silent=True) or request.args
+        trabalho = report_jobs.submit(filtros, db, models, usuario_id=session['user_id'])
+        return jsonify({'success': True, 'job': _estado_trabalho(trabalho)}), 202
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/api/relatorio/pdf/jobs/<job_id>')
+@login_required
+def status_relatorio_pdf(job_id):
+    trabalho = _trabalho_do_usuario(job_id)
+    if not trabalho:
+        return jsonify({'error': 'Relatório não encontrado'}), 404
+    return jsonify(_estado_trabalho(trabalho))
+
+@app.route('/api/relatorio/pdf/jobs/<job_id>/download')
+@login_required
+def baixar_relatorio_pdf(job_id):
+    resultado = report_jobs.open_result(job_id) if _trabalho_do_usuario(job_id) else None
+    if not resultado:
+        return jsonify({'error': 'Relatório não encontrado ou ainda em processamento'}), 404
+    arquivo, nome = resultado
+    return pdf_response(make_response, arquivo, nome)
+
+@app.route('/api/receitas')
+@login_required
+def listar_receitas():
+    try:
+        return jsonify(receitas_page(request.args))
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/api/despesas')
+@login_required
+def listar_despesas():
+    try:
+        return jsonify(despesas_page(request.args))
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
 @app.route('/api/receita', methods=['POST'])
 @login_required
 def adicionar_receita():
@@ -382,49 +478,30 @@ def adicionar_despesa():
         valor_previsto_total = float(data['valor_previsto'])
         # Se valor efetivo não foi informado, usa o valor previsto quando efetivado=True, senão usa 0
         valor_efetivo = float(data['valor']) if data.get('valor') else (valor_previsto_total if data.get('efetivado') else 0.0)
-        valor_previsto_parcela = round(valor_previsto_total / num_parcelas, 2)
-        valor_efetivo_parcela = round(valor_efetivo / num_parcelas, 2)
-        data_inicial = datetime.strptime(data['data'], '%Y-%m-%d').date()
-        efetivado = data.get('efetivado', False)
         
         compra_parcelada_id = None
         if num_parcelas > 1:
-            compra_parcelada_id = int(datetime.now().timestamp())
+            compra_parcelada_id = next_purchase_ids(1)[0]
         
-        for i in range(num_parcelas):
-            data_parcela = data_inicial.replace(year=data_inicial.year + ((data_inicial.month + i) - 1) // 12,
-                                           month=((data_inicial.month + i - 1) % 12) + 1)
-            
-            # Calcular valor previsto desta parcela
-            valor_previsto_desta = valor_previsto_parcela
-            if i == num_parcelas - 1:  # Ajustar última parcela para evitar centavos
-                valor_previsto_desta = round(valor_previsto_total - (valor_previsto_parcela * (num_parcelas - 1)), 2)
-            
-            # Calcular valor efetivo desta parcela
-            valor_efetivo_desta = valor_efetivo_parcela
-            if i == num_parcelas - 1:  # Ajustar última parcela
-                valor_efetivo_desta = round(valor_efetivo - (valor_efetivo_parcela * (num_parcelas - 1)), 2)
-            
-            descricao = data['descricao']
-            if num_parcelas > 1:
-                descricao = f"{descricao} ({i+1}/{num_parcelas})"
-            
-            despesa = Despesa(
-                descricao=descricao,
-                valor_previsto=valor_previsto_desta,
-                valor=valor_efetivo_desta,
-                data=data_parcela,
-                categoria=data['categoria'],
-                subcategoria=data.get('subcategoria'),
-                tipo_pagamento_id=data.get('tipo_pagamento_id'),
-                parcelas=num_parcelas,
-                parcela_atual=i+1,
-                compra_parcelada_id=compra_parcelada_id,
-                efetivado=efetivado
-            )
-            db.session.add(despesa)
+        categorias = CategoryResolver()
+        categoria_id, subcategoria_id = categorias.ids(data['categoria'], data.get('subcategoria'))
+        linhas = expand_installments(
+            descricao=data['descricao'],
+            valor_previsto=valor_previsto_total,
+            valor=valor_efetivo,
+            data=datetime.strptime(data['data'], '%Y-%m-%d').date(),
+            parcelas=num_parcelas,
+            compra_parcelada_id=compra_parcelada_id,
+            categoria_id=categoria_id,
+            subcategoria_id=subcategoria_id,
+            tipo_pagamento_id=data.get('tipo_pagamento_id'),
+            efetivado=data.get('efetivado', False)
+        )
+        insert_expenses(linhas)
         
         db.session.commit()
+        if categorias.criadas:
+            reference_cache.invalidate()
         return jsonify({
             'success': True, 
             'message': f'Despesa {("parcelada em " + str(num_parcelas) + "x") if num_parcelas > 1 else ""} adicionada com sucesso!'
@@ -433,6 +510,45 @@ def adicionar_despesa():
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/receitas/lote', methods=['POST'])
+@login_required
+def adicionar_receitas_lote():
+    try:
+        return jsonify(create_receitas(request.get_json()))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/api/despesas/lote', methods=['POST'])
+@login_required
+def adicionar_despesas_lote():
+    try:
+        resultado = create_despesas(request.get_json())
+        # categorias novas citadas no lote são criadas junto com as despesas
+        reference_cache.invalidate()
+        return jsonify(resultado)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/api/importar', methods=['POST'])
+@login_required
+def importar_extrato():
+    try:
+        arquivo = request.files['arquivo']
+        formato = request.form.get('formato') or format_from_filename(arquivo.filename)
+        # lido em fluxo direto do upload, sem carregar o arquivo inteiro em memória
+        texto = io.TextIOWrapper(arquivo.stream, encoding=request.form.get('encoding', 'utf-8-sig'), errors='replace', newline='')
+        resultado = import_statement(texto, formato, int(request.form.get('lote', TAMANHO_LOTE_PADRAO)))
+        reference_cache.invalidate()  # o extrato pode trazer categorias novas
+        return jsonify({
+            'success': True,
+            'message': f"{resultado['receitas']} receita(s) e {resultado['despesas']} despesa(s) importadas, {resultado['duplicadas']} já existente(s) e {resultado['erros']} linha(s) com erro.",
+            **resultado
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
 @app.route('/api/receita/<int:id>', methods=['DELETE', 'PUT'])
 @login_required
 def gerenciar_receita(id):
@@ -489,21 +605,12 @@ def gerenciar_despesa(id):
                     mensagem = 'Parcela deletada com sucesso!'
                 
                 elif opcao_delete == '2':  # Deletar esta e parcelas futuras
-                    parcelas_futuras = Despesa.query.filter(
-                        Despesa.compra_parcelada_id == compra_parcelada_id,
-                        Despesa.parcela_atual >= despesa.parcela_atual
-                    ).all()
-                    for p in parcelas_futuras:
-                        db.session.delete(p)
-                    mensagem = f'{len(parcelas_futuras)} parcela(s) futura(s) deletada(s) com sucesso!'
+                    quantidade = delete_installments(compra_parcelada_id, a_partir_da_parcela=despesa.parcela_atual)
+                    mensagem = f'{quantidade} parcela(s) futura(s) deletada(s) com sucesso!'
                 
                 elif opcao_delete == '3':  # Deletar todas as parcelas
-                    todas_parcelas = Despesa.query.filter_by(
-                        compra_parcelada_id=compra_parcelada_id
-                    ).all()
-                    for p in todas_parcelas:
-                        db.session.delete(p)
-                    mensagem = f'Todas as {len(todas_parcelas)} parcela(s) foram deletadas com sucesso!'
+                    quantidade = delete_installments(compra_parcelada_id)
+                    mensagem = f'Todas as {quantidade} parcela(s) foram deletadas com sucesso!'
                 
                 else:
                     return jsonify({'success': False, 'message': 'Opção inválida!'})
@@ -519,19 +626,15 @@ def gerenciar_despesa(id):
             data = request.get_json()
             compra_parcelada_id = data.get('compra_parcelada_id')
             
+            parcelas_atualizadas = 1
             # Se tem ID de compra parcelada, pergunta se quer atualizar todas as parcelas
             if compra_parcelada_id and data.get('atualizar_todas_parcelas'):
-                despesas = Despesa.query.filter_by(compra_parcelada_id=compra_parcelada_id).all()
-                for d in despesas:
-                    if 'efetivado' in data:
-                        d.efetivado = data['efetivado']
-                        # Se marcado como efetivado e não tem valor, usa o previsto
-                        if d.efetivado and (not d.valor or d.valor == 0):
-                            d.valor = d.valor_previsto
-                    if 'valor' in data:
-                        # Calcula proporcionalmente baseado no valor_previsto
-                        proporcao = d.valor_previsto / despesa.valor_previsto if despesa.valor_previsto != 0 else 0
-                        d.valor = float(data['valor']) * proporcao
+                parcelas_atualizadas = update_installment_group(
+                    compra_parcelada_id,
+                    referencia=despesa,
+                    efetivado=data['efetivado'] if 'efetivado' in data else None,
+                    valor=data['valor'] if 'valor' in data else None
+                )
             else:
                 # Atualiza apenas a despesa atual
                 if 'efetivado' in data:
@@ -550,7 +653,8 @@ def gerenciar_despesa(id):
                     'id': despesa.id,
                     'efetivado': despesa.efetivado,
                     'valor': despesa.valor,
-                    'valor_previsto': despesa.valor_previsto
+                    'valor_previsto': despesa.valor_previsto,
+                    'parcelas_atualizadas': parcelas_atualizadas
                 }
             })
     
@@ -569,6 +673,7 @@ def adicionar_categoria():
         )
         db.session.add(categoria)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Categoria adicionada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -578,8 +683,13 @@ def adicionar_categoria():
 def deletar_categoria(id):
     try:
         categoria = CategoriaDespesa.query.get_or_404(id)
+        # as despesas guardam só o id: apagar a categoria apagaria a classificação delas
+        em_uso = Despesa.query.filter_by(categoria_id=id).count()
+        if em_uso:
+            return jsonify({'success': False, 'message': f'Categoria usada em {em_uso} despesa(s); não pode ser deletada.'})
         db.session.delete(categoria)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Categoria deletada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -596,6 +706,7 @@ def adicionar_subcategoria():
         )
         db.session.add(subcategoria)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Subcategoria adicionada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -605,8 +716,12 @@ def adicionar_subcategoria():
 def deletar_subcategoria(id):
     try:
         subcategoria = SubcategoriaDespesa.query.get_or_404(id)
+        em_uso = Despesa.query.filter_by(subcategoria_id=id).count()
+        if em_uso:
+            return jsonify({'success': False, 'message': f'Subcategoria usada em {em_uso} despesa(s); não pode ser deletada.'})
         db.session.delete(subcategoria)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Subcategoria deletada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -615,8 +730,18 @@ def deletar_subcategoria(id):
 @login_required
 def obter_subcategorias(categoria_id):
     try:
-        subcategorias = SubcategoriaDespesa.query.filter_by(categoria_id=categoria_id).all()
-        return jsonify([{'id': s.id, 'nome': s.nome} for s in subcategorias])
+        referencia = reference_cache.get()
+        subcategorias = referencia.subcategorias(categoria_id)
+        return _json_condicional([{'id': s['id'], 'nome': s['nome']} for s in subcategorias], referencia.etag)
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/api/categorias/arvore')
+@login_required
+def obter_arvore_categorias():
+    try:
+        referencia = reference_cache.get()
+        return _json_condicional(referencia.category_tree(), referencia.etag)
     except Exception as e:
         return jsonify({'error': str(e)})
 
@@ -631,6 +756,7 @@ def adicionar_tipo_pagamento():
         )
         db.session.add(tipo)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Tipo de pagamento adicionado com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -644,6 +770,7 @@ def deletar_tipo_pagamento(id):
             return jsonify({'success': False, 'message': 'Não é possível excluir um tipo de pagamento que está sendo usado em despesas.'})
         db.session.delete(tipo)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Tipo de pagamento deletado com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -655,6 +782,7 @@ def alternar_status_tipo_pagamento(id):
         tipo = TipoPagamento.query.get_or_404(id)
         tipo.ativo = not tipo.ativo
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Status alterado com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -663,74 +791,61 @@ def alternar_status_tipo_pagamento(id):
 @login_required
 def obter_tipos_pagamento():
     try:
-        tipos = TipoPagamento.query.filter_by(ativo=True).all()
-        return jsonify([{'id': t.id, 'nome': t.nome} for t in tipos])
+        referencia = reference_cache.get()
+        return _json_condicional([{'id': t['id'], 'nome': t['nome']} for t in referencia.tipos_ativos], referencia.etag)
     except Exception as e:
         return jsonify({'error': str(e)})
 
-def _ensure_columns():
-    """Verifica se todas as colunas necessárias existem nas tabelas e as adiciona se necessário."""
-    try:
-        inspector = inspect(db.engine)
-        
-        # Colunas para a tabela despesa
-        if 'despesa' in inspector.get_table_names():
-            cols_despesa = [c['name'] for c in inspector.get_columns('despesa')]
-            colunas_despesa = {
-                'subcategoria': 'VARCHAR(100)',
-                'parcelas': 'INTEGER DEFAULT 1',
-                'parcela_atual': 'INTEGER DEFAULT 1',
-                'compra_parcelada_id': 'INTEGER',
-                'tipo_pagamento_id': 'INTEGER',
-                'valor_previsto': 'FLOAT',
-                'efetivado': 'BOOLEAN DEFAULT 0'
-            }
-            
-            for col_name, col_type in colunas_despesa.items():
-                if col_name not in cols_despesa:
-                    with db.engine.begin() as conn:
-                        conn.execute(text(f"ALTER TABLE despesa ADD COLUMN {col_name} {col_type}"))
-                    print(f"Coluna '{col_name}' adicionada na tabela 'despesa'.")
-                    
-                    # Se for coluna valor_previsto, copiar valor inicial da coluna valor
-                    if col_name == 'valor_previsto':
-                        with db.engine.begin() as conn:
-                            conn.execute(text("UPDATE despesa SET valor_previsto = valor WHERE valor_previsto IS NULL"))
-            
-            if 'tipo_pagamento_id' in cols_despesa:
-                try:
-                    with db.engine.begin() as conn:
-                        conn.execute(text("DROP INDEX IF EXISTS ix_despesa_tipo_pagamento_id"))
-                        conn.execute(text("CREATE INDEX ix_despesa_tipo_pagamento_id ON despesa (tipo_pagamento_id)"))
-                except Exception as e:
-                    print('Aviso: Falha ao criar índice tipo_pagamento_id:', e)
-        
-        # Colunas para a tabela receita
-        if 'receita' in inspector.get_table_names():
-            cols_receita = [c['name'] for c in inspector.get_columns('receita')]
-            colunas_receita = {
-                'valor_previsto': 'FLOAT',
-                'efetivado': 'BOOLEAN DEFAULT 0'
-            }
-            
-            for col_name, col_type in colunas_receita.items():
-                if col_name not in cols_receita:
-                    with db.engine.begin() as conn:
-                        conn.execute(text(f"ALTER TABLE receita ADD COLUMN {col_name} {col_type}"))
-                    print(f"Coluna '{col_name}' adicionada na tabela 'receita'.")
-                    
-                    # Se for coluna valor_previsto, copiar valor inicial da coluna valor
-                    if col_name == 'valor_previsto':
-                        with db.engine.begin() as conn:
-                            conn.execute(text("UPDATE receita SET valor_previsto = valor WHERE valor_previsto IS NULL"))
-                    
-    except Exception as e:
-        print('Falha ao garantir colunas:', e)
-
-with app.app_context():
-    db.create_all()
-    _ensure_columns()
-    Usuario.init_default_user()
+@app.cli.command('migrar')
+@click.option('--verificar', is_flag=True, help='Só mostra a versão do banco e as migrações pendentes.')
+def migrar(verificar):
+    """Cria ou atualiza as tabelas do banco até a versão desta aplicação."""
+    if verificar:
+        print(f"Banco na versão {schema_version(db.engine)}; aplicação na versão {VERSAO_ATUAL}.")
+        for versao, descricao in pending_migrations(db.engine):
+            print(f"Pendente: {versao} - {descricao}")
+        return
+    if not upgrade():
+        print(f"Banco já está na versão {VERSAO_ATUAL}.")
+
+@app.cli.command('reconstruir-resumo')
+def reconstruir_resumo():
+    """Recalcula a tabela ResumoMensal a partir de todas as receitas e despesas."""
+    with write_transactions():
+        linhas = rebuild_monthly_summary()
+        db.session.commit()
+    print(f"Resumo mensal reconstruído: {linhas} linha(s).")
+
+@app.cli.command('importar')
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'ofx']), help='Padrão: extensão do arquivo.')
+@click.option('--lote', default=TAMANHO_LOTE_PADRAO, show_default=True, help='Lançamentos gravados por commit.')
+@click.option('--encoding', default='utf-8-sig', show_default=True)
+def importar(caminho, formato, lote, encoding):
+    """Importa um extrato bancário CSV ou OFX."""
+    with write_transactions(), open(caminho, encoding=encoding, errors='replace', newline='') as arquivo:
+        resultado = import_statement(arquivo, formato or format_from_filename(caminho), lote)
+    reference_cache.invalidate()  # o extrato pode trazer categorias novas: avisa os workers do servidor
+    print(f"Linhas lidas: {resultado['lidas']}; receitas: {resultado['receitas']}; despesas: {resultado['despesas']}; "
+          f"já existentes: {resultado['duplicadas']}; erros: {resultado['erros']}")
+    for mensagem in resultado['mensagens']:
+        print(mensagem)
+
+@app.cli.command('verificar-indices')
+def verificar_indices():
+    """Lista os índices declarados nos modelos que ainda faltam no banco."""
+    faltando = missing_indexes(db.engine)
+    for tabela, nome in faltando:
+        print(f"Índice ausente: {tabela}.{nome}")
+    if not faltando:
+        print('Todos os índices estão presentes.')
+
+data_version.configure(os.path.join(app.config['CACHE_DIR'], 'versao_dados'))
+reference_version.configure(os.path.join(app.config['CACHE_DIR'], 'versao_referencia'))
+user_version.configure(os.path.join(app.config['CACHE_DIR'], 'versao_usuarios'))
 
 if __name__ == '__main__':
+    with app.app_context():
+        upgrade()
+    banco_desatualizado = False
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
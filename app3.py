@@ -1,20 +1,54 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response
-from datetime import datetime
-from sqlalchemy import func
-from sqlalchemy import inspect, text
-import io
-import io
+from flask import Flask, render_template, request, jsonify, make_response, stream_with_context, has_request_context
+import os
+from datetime import date, datetime
+
+from database import configure_engine, engine_options
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'sistema-financeiro-domestico-2025'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sistema_financeiro.db'
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pasta de arquivos compartilhados entre os workers (versão dos dados, caches em disco)
+app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(app.instance_path, 'cache'))
+# Processos usados para montar relatórios PDF grandes em paralelo (precisa da pypdf). Padrão 1: cada relatório
+# grande sobe um pool próprio, então só vale a pena com núcleos sobrando além dos workers (ver benchmark_pdf.py)
+app.config['PDF_PROCESSES'] = int(os.environ.get('PDF_PROCESSES', 1))
 
 from models import db, Receita, CategoriaDespesa, SubcategoriaDespesa, TipoPagamento, Despesa
-from pdf_generator import generate_pdf_report
+from migrations import VERSAO_ATUAL, schema_version, upgrade
+from pdf_generator import generate_pdf_report, report_cache_key, pdf_response
+from pdf_cache import PdfCache, LIMITE_PADRAO as PDF_LIMITE_PADRAO
+from report_formats import parse_formats, export_report, stream_report, streaming_response
+from report_engine import ReportFilters, compute_summary
+from projection import projection_from_args
+from installments import expand_installments, next_purchase_ids, insert_expenses, delete_installments
+from pagination import receitas_page, despesas_page, receita_categories
+from reference_data import CategoryResolver, ReferenceCache, TTL_PADRAO as REFERENCIA_TTL_PADRAO
+from data_version import data_version, reference_version
+import pdf_parallel
 
 db.init_app(app)
 
+def _transacao_de_escrita():
+    return has_request_context() and request.method not in ('GET', 'HEAD', 'OPTIONS')
+
+# No SQLite: WAL (relatórios leem enquanto outra requisição grava) e escrita reservada no início da transação
+with app.app_context():
+    configure_engine(db.engine, escrita=_transacao_de_escrita)
+
+if app.config['PDF_PROCESSES'] > 1 and not pdf_parallel.DISPONIVEL:
+    app.logger.warning('PDF_PROCESSES=%s, mas a pypdf não está instalada: os relatórios PDF serão montados num processo só.',
+                       app.config['PDF_PROCESSES'])
+
+# Categorias, subcategorias e tipos de pagamento mudam pouco: ficam em memória até serem alterados
+reference_cache = ReferenceCache(ttl=int(os.environ.get('REFERENCE_CACHE_TTL', REFERENCIA_TTL_PADRAO)),
+                                 marcador=reference_version)
+
+# PDFs já gerados ficam em disco até os dados mudarem ou serem descartados pelo limite de tamanho
+pdf_cache = PdfCache(os.path.join(app.config['CACHE_DIR'], 'pdf'),
+                     limite_bytes=int(os.environ.get('PDF_CACHE_MAX_MB', PDF_LIMITE_PADRAO // (1024 * 1024))) * 1024 * 1024)
+
 # Models importation
 from models import Receita, Despesa, CategoriaDespesa, SubcategoriaDespesa, TipoPagamento
 from pdf_generator import generate_pdf_report
@@ -26,146 +60,67 @@ def index():
 
 @app.route('/receitas')
 def receitas():
-    receitas_list = Receita.query.order_by(Receita.data.desc()).all()
-    return render_template('receitas.html', receitas=receitas_list)
+    # Só a primeira página é renderizada; as seguintes vêm de /api/receitas sob demanda
+    return render_template('receitas.html',
+                       pagina=receitas_page(request.args),
+                       categorias=receita_categories())
 
 @app.route('/despesas')
 def despesas():
-    despesas_list = Despesa.query.order_by(Despesa.data.desc()).all()
-    categorias_list = CategoriaDespesa.query.all()
-    tipos_pagamento_list = TipoPagamento.query.filter_by(ativo=True).all()
+    # Só a primeira página é renderizada; as seguintes vêm de /api/despesas sob demanda
+    referencia = reference_cache.get()
     return render_template('despesas.html', 
-                       despesas=despesas_list, 
-                       categorias=categorias_list,
-                       tipos_pagamento=tipos_pagamento_list)
+                       pagina=despesas_page(request.args), 
+                       categorias=referencia.categorias,
+                       tipos_pagamento=referencia.tipos_ativos)
 
 @app.route('/relatorios')
 def relatorios():
-    categorias_list = CategoriaDespesa.query.all()
-    tipos_pagamento_list = TipoPagamento.query.filter_by(ativo=True).all()
+    referencia = reference_cache.get()
     return render_template('relatorios.html', 
-                       categorias=categorias_list,
-                       tipos_pagamento=tipos_pagamento_list)
+                       categorias=referencia.categorias,
+                       tipos_pagamento=referencia.tipos_ativos)
 
 @app.route('/categorias')
 def categorias():
-    categorias_list = CategoriaDespesa.query.all()
-    return render_template('categorias.html', categorias=categorias_list)
+    return render_template('categorias.html', categorias=reference_cache.get().categorias)
 
 @app.route('/tipos-pagamento')
 def tipos_pagamento():
-    tipos_list = TipoPagamento.query.order_by(TipoPagamento.nome).all()
-    return render_template('tipos_pagamento.html', tipos_pagamento=tipos_list)
+    return render_template('tipos_pagamento.html', tipos_pagamento=reference_cache.get().tipos_pagamento)
+
+def _resposta_condicional(etag, gerar):
+    """Responde 304 sem chamar `gerar()` (nem tocar no banco) quando o navegador já tem a versão `etag`."""
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = gerar()
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _json_condicional(dados, etag):
+    """Resposta JSON com ETag; devolve 304 sem corpo quando o navegador já tem essa versão."""
+    return _resposta_condicional(etag, lambda: jsonify(dados))
 
 # API Routes
 @app.route('/api/relatorios/resumo')
 def relatorio_resumo():
     try:
-        categoria = request.args.get('categoria')
-        subcategoria = request.args.get('subcategoria')
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-        tipo_pagamento_id = request.args.get('tipo_pagamento_id')
-
-        # Total receitas
-        receitas_q = db.session.query(func.sum(Receita.valor))
-        if categoria:
-            receitas_q = receitas_q.filter(Receita.categoria == categoria)
-        if data_inicio:
-            receitas_q = receitas_q.filter(Receita.data >= data_inicio)
-        if data_fim:
-            receitas_q = receitas_q.filter(Receita.data <= data_fim)
-        total_receitas = receitas_q.scalar() or 0
-
-        # Total despesas
-        despesas_q = db.session.query(func.sum(Despesa.valor))
-        if categoria:
-            despesas_q = despesas_q.filter(Despesa.categoria == categoria)
-        if subcategoria:
-            despesas_q = despesas_q.filter(Despesa.subcategoria == subcategoria)
-        if data_inicio:
-            data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-            despesas_q = despesas_q.filter(Despesa.data >= data_inicio_obj)
-        if data_fim:
-            data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-            despesas_q = despesas_q.filter(Despesa.data <= data_fim_obj)
-        if tipo_pagamento_id:
-            despesas_q = despesas_q.filter(Despesa.tipo_pagamento_id == int(tipo_pagamento_id))
-        total_despesas = despesas_q.scalar() or 0
-
-        # Saldo atual
-        saldo_atual = total_receitas - total_despesas
-
-        # Receitas por categoria
-        receitas_categoria_q = db.session.query(
-            Receita.categoria,
-            func.sum(Receita.valor).label('total')
-        )
-        if categoria:
-            receitas_categoria_q = receitas_categoria_q.filter(Receita.categoria == categoria)
-        if data_inicio:
-            data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-            receitas_categoria_q = receitas_categoria_q.filter(Receita.data >= data_inicio_obj)
-        if data_fim:
-            data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-            receitas_categoria_q = receitas_categoria_q.filter(Receita.data <= data_fim_obj)
-        receitas_categoria = receitas_categoria_q.group_by(Receita.categoria).all()
-
-        # Despesas por categoria
-        despesas_categoria_q = db.session.query(
-            Despesa.categoria,
-            func.sum(Despesa.valor).label('total')
-        )
-        if categoria:
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.categoria == categoria)
-        if subcategoria:
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.subcategoria == subcategoria)
-        if data_inicio:
-            data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.data >= data_inicio_obj)
-        if data_fim:
-            data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.data <= data_fim_obj)
-        if tipo_pagamento_id:
-            despesas_categoria_q = despesas_categoria_q.filter(Despesa.tipo_pagamento_id == int(tipo_pagamento_id))
-        despesas_categoria = despesas_categoria_q.group_by(Despesa.categoria).all()
-
-        # Últimas transações
-        ultimas_receitas_q = db.session.query(Receita).order_by(Receita.data.desc())
-        if categoria:
-            ultimas_receitas_q = ultimas_receitas_q.filter(Receita.categoria == categoria)
-        if data_inicio:
-            data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-            ultimas_receitas_q = ultimas_receitas_q.filter(Receita.data >= data_inicio_obj)
-        if data_fim:
-            data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-            ultimas_receitas_q = ultimas_receitas_q.filter(Receita.data <= data_fim_obj)
-        ultimas_receitas = ultimas_receitas_q.limit(5).all()
-
-        ultimas_despesas_q = db.session.query(Despesa).order_by(Despesa.data.desc())
-        if categoria:
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.categoria == categoria)
-        if subcategoria:
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.subcategoria == subcategoria)
-        if data_inicio:
-            data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.data >= data_inicio_obj)
-        if data_fim:
-            data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.data <= data_fim_obj)
-        if tipo_pagamento_id:
-            ultimas_despesas_q = ultimas_despesas_q.filter(Despesa.tipo_pagamento_id == int(tipo_pagamento_id))
-        ultimas_despesas = ultimas_despesas_q.limit(5).all()
-        
-        return jsonify({
-            'total_receitas': total_receitas,
-            'total_despesas': total_despesas,
-            'saldo_atual': saldo_atual,
-            'receitas_categoria': [{'categoria': r.categoria, 'total': r.total} for r in receitas_categoria],
-            'despesas_categoria': [{'categoria': d.categoria, 'total': d.total} for d in despesas_categoria],
-            'ultimas_receitas': [{'descricao': r.descricao, 'valor': r.valor, 'data': r.data.strftime('%d/%m/%Y'), 'categoria': r.categoria} for r in ultimas_receitas],
-            'ultimas_despesas': [{'descricao': d.descricao, 'valor': d.valor, 'data': d.data.strftime('%d/%m/%Y'), 'categoria': d.categoria, 'subcategoria': d.subcategoria} for d in ultimas_despesas]
-        })
+        filtros = ReportFilters.from_args(request.args)
+        etag = data_version.etag('resumo', filtros.cache_key())
+        return _resposta_condicional(etag, lambda: jsonify(compute_summary(filtros)))
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/api/projecao')
+def projecao_saldo():
+    # ?inicio=AAAA-MM-DD&meses=60&granularidade=dia|mes&saldo_inicial=...; o padrão começa hoje
+    try:
+        etag = data_version.etag('projecao', f'{date.today()}|{request.query_string.decode()}')
+        return _resposta_condicional(etag, lambda: jsonify(projection_from_args(request.args)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)})
 
@@ -183,11 +138,86 @@ def gerar_relatorio_pdf():
             'TipoPagamento': TipoPagamento
         }
         
-        return generate_pdf_report(app, request, make_response, db, models)
+        etag = data_version.etag('pdf', report_cache_key(request.args))
+        return _resposta_condicional(etag, lambda: generate_pdf_report(app, request, make_response, db, models,
+                                                                       cache=pdf_cache))
     except Exception as e:
         app.logger.exception('Erro ao gerar PDF:')
         return jsonify({'error': f'Erro ao gerar PDF: {str(e)}'}), 500
 
+@app.route('/api/relatorio/exportar')
+def exportar_relatorio():
+    # ?formato=pdf|csv|xlsx|json, ou vários separados por vírgula (um .zip): o banco é lido uma vez só
+    try:
+        formatos = parse_formats(request.args.get('formato'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        models = {
+            'Receita': Receita,
+            'Despesa': Despesa,
+            'TipoPagamento': TipoPagamento
+        }
+
+        def gerar():
+            arquivo, nome, mimetype = export_report(request.args, formatos, db, models)
+            return pdf_response(make_response, arquivo, nome, mimetype)
+
+        etag = data_version.etag('exportar', ','.join(formatos) + '|' + report_cache_key(request.args))
+        return _resposta_condicional(etag, gerar)
+    except Exception as e:
+        app.logger.exception('Erro ao exportar relatório:')
+        return jsonify({'error': f'Erro ao exportar relatório: {str(e)}'}), 500
+
+def _exportacao_em_fluxo(formato):
+    # Mesmos filtros (e a mesma validação) de /api/relatorios/resumo
+    try:
+        ReportFilters.from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Filtro inválido: {str(e)}'}), 400
+    try:
+        models = {
+            'Receita': Receita,
+            'Despesa': Despesa,
+            'TipoPagamento': TipoPagamento
+        }
+
+        def gerar():
+            blocos, nome, mimetype = stream_report(request.args, formato, db, models)
+            return streaming_response(make_response, stream_with_context(blocos), nome, mimetype)
+
+        etag = data_version.etag(formato, report_cache_key(request.args))
+        return _resposta_condicional(etag, gerar)
+    except Exception as e:
+        app.logger.exception('Erro ao exportar relatório:')
+        return jsonify({'error': f'Erro ao exportar relatório: {str(e)}'}), 500
+
+@app.route('/api/relatorio/csv')
+def exportar_relatorio_csv():
+    return _exportacao_em_fluxo('csv')
+
+@app.route('/api/relatorio/xlsx')
+def exportar_relatorio_xlsx():
+    return _exportacao_em_fluxo('xlsx')
+
+@app.route('/api/relatorio/pdf/cache')
+def estatisticas_cache_pdf():
+    return jsonify(pdf_cache.stats())
+
+@app.route('/api/receitas')
+def listar_receitas():
+    try:
+        return jsonify(receitas_page(request.args))
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/api/despesas')
+def listar_despesas():
+    try:
+        return jsonify(despesas_page(request.args))
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
 @app.route('/api/receita', methods=['POST'])
 def adicionar_receita():
     try:
@@ -210,39 +240,29 @@ def adicionar_despesa():
         data = request.get_json()
         num_parcelas = int(data.get('parcelas', 1))
         valor_total = float(data['valor'])
-        valor_parcela = round(valor_total / num_parcelas, 2)
-        data_inicial = datetime.strptime(data['data'], '%Y-%m-%d').date()
         
         compra_parcelada_id = None
         if num_parcelas > 1:
-            compra_parcelada_id = int(datetime.now().timestamp())
+            compra_parcelada_id = next_purchase_ids(1)[0]
         
-        for i in range(num_parcelas):
-            data_parcela = data_inicial.replace(year=data_inicial.year + ((data_inicial.month + i) - 1) // 12,
-                                           month=((data_inicial.month + i - 1) % 12) + 1)
-            
-            valor_desta_parcela = valor_parcela
-            if i == num_parcelas - 1:
-                valor_desta_parcela = round(valor_total - (valor_parcela * (num_parcelas - 1)), 2)
-            
-            descricao = data['descricao']
-            if num_parcelas > 1:
-                descricao = f"{descricao} ({i+1}/{num_parcelas})"
-            
-            despesa = Despesa(
-                descricao=descricao,
-                valor=valor_desta_parcela,
-                data=data_parcela,
-                categoria=data['categoria'],
-                subcategoria=data.get('subcategoria'),
-                tipo_pagamento_id=data.get('tipo_pagamento_id'),
-                parcelas=num_parcelas,
-                parcela_atual=i+1,
-                compra_parcelada_id=compra_parcelada_id
-            )
-            db.session.add(despesa)
+        categorias = CategoryResolver()
+        categoria_id, subcategoria_id = categorias.ids(data['categoria'], data.get('subcategoria'))
+        linhas = expand_installments(
+            descricao=data['descricao'],
+            valor_previsto=valor_total,
+            valor=valor_total,
+            data=datetime.strptime(data['data'], '%Y-%m-%d').date(),
+            parcelas=num_parcelas,
+            compra_parcelada_id=compra_parcelada_id,
+            categoria_id=categoria_id,
+            subcategoria_id=subcategoria_id,
+            tipo_pagamento_id=data.get('tipo_pagamento_id')
+        )
+        insert_expenses(linhas)
         
         db.session.commit()
+        if categorias.criadas:
+            reference_cache.invalidate()
         return jsonify({
             'success': True, 
             'message': f'Despesa {("parcelada em " + str(num_parcelas) + "x") if num_parcelas > 1 else ""} adicionada com sucesso!'
@@ -276,21 +296,12 @@ def deletar_despesa(id):
                 mensagem = 'Parcela deletada com sucesso!'
             
             elif opcao_delete == '2':  # Deletar esta e parcelas futuras
-                parcelas_futuras = Despesa.query.filter(
-                    Despesa.compra_parcelada_id == compra_parcelada_id,
-                    Despesa.parcela_atual >= despesa.parcela_atual
-                ).all()
-                for p in parcelas_futuras:
-                    db.session.delete(p)
-                mensagem = f'{len(parcelas_futuras)} parcela(s) futura(s) deletada(s) com sucesso!'
+                quantidade = delete_installments(compra_parcelada_id, a_partir_da_parcela=despesa.parcela_atual)
+                mensagem = f'{quantidade} parcela(s) futura(s) deletada(s) com sucesso!'
             
             elif opcao_delete == '3':  # Deletar todas as parcelas
-                todas_parcelas = Despesa.query.filter_by(
-                    compra_parcelada_id=compra_parcelada_id
-                ).all()
-                for p in todas_parcelas:
-                    db.session.delete(p)
-                mensagem = f'Todas as {len(todas_parcelas)} parcela(s) foram deletadas com sucesso!'
+                quantidade = delete_installments(compra_parcelada_id)
+                mensagem = f'Todas as {quantidade} parcela(s) foram deletadas com sucesso!'
             
             else:
                 return jsonify({'success': False, 'message': 'Opção inválida!'})
@@ -316,6 +327,7 @@ def adicionar_categoria():
         )
         db.session.add(categoria)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Categoria adicionada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -324,8 +336,13 @@ def adicionar_categoria():
 def deletar_categoria(id):
     try:
         categoria = CategoriaDespesa.query.get_or_404(id)
+        # as despesas guardam só o id: apagar a categoria apagaria a classificação delas
+        em_uso = Despesa.query.filter_by(categoria_id=id).count()
+        if em_uso:
+            return jsonify({'success': False, 'message': f'Categoria usada em {em_uso} despesa(s); não pode ser deletada.'})
         db.session.delete(categoria)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Categoria deletada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -341,6 +358,7 @@ def adicionar_subcategoria():
         )
         db.session.add(subcategoria)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Subcategoria adicionada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -349,8 +367,12 @@ def adicionar_subcategoria():
 def deletar_subcategoria(id):
     try:
         subcategoria = SubcategoriaDespesa.query.get_or_404(id)
+        em_uso = Despesa.query.filter_by(subcategoria_id=id).count()
+        if em_uso:
+            return jsonify({'success': False, 'message': f'Subcategoria usada em {em_uso} despesa(s); não pode ser deletada.'})
         db.session.delete(subcategoria)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Subcategoria deletada com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -358,8 +380,17 @@ def deletar_subcategoria(id):
 @app.route('/api/subcategorias/<int:categoria_id>')
 def obter_subcategorias(categoria_id):
     try:
-        subcategorias = SubcategoriaDespesa.query.filter_by(categoria_id=categoria_id).all()
-        return jsonify([{'id': s.id, 'nome': s.nome} for s in subcategorias])
+        referencia = reference_cache.get()
+        subcategorias = referencia.subcategorias(categoria_id)
+        return _json_condicional([{'id': s['id'], 'nome': s['nome']} for s in subcategorias], referencia.etag)
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+@app.route('/api/categorias/arvore')
+def obter_arvore_categorias():
+    try:
+        referencia = reference_cache.get()
+        return _json_condicional(referencia.category_tree(), referencia.etag)
     except Exception as e:
         return jsonify({'error': str(e)})
 
@@ -373,6 +404,7 @@ def adicionar_tipo_pagamento():
         )
         db.session.add(tipo)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Tipo de pagamento adicionado com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -385,6 +417,7 @@ def deletar_tipo_pagamento(id):
             return jsonify({'success': False, 'message': 'Não é possível excluir um tipo de pagamento que está sendo usado em despesas.'})
         db.session.delete(tipo)
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Tipo de pagamento deletado com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -395,6 +428,7 @@ def alternar_status_tipo_pagamento(id):
         tipo = TipoPagamento.query.get_or_404(id)
         tipo.ativo = not tipo.ativo
         db.session.commit()
+        reference_cache.invalidate()
         return jsonify({'success': True, 'message': 'Status alterado com sucesso!'})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -402,49 +436,35 @@ def alternar_status_tipo_pagamento(id):
 @app.route('/api/tipos-pagamento')
 def obter_tipos_pagamento():
     try:
-        tipos = TipoPagamento.query.filter_by(ativo=True).all()
-        return jsonify([{'id': t.id, 'nome': t.nome} for t in tipos])
+        referencia = reference_cache.get()
+        return _json_condicional([{'id': t['id'], 'nome': t['nome']} for t in referencia.tipos_ativos], referencia.etag)
     except Exception as e:
         return jsonify({'error': str(e)})
 
-def _ensure_columns():
-    """Verifica se todas as colunas necessárias existem na tabela `despesa` e as adiciona se necessário."""
-    try:
-        inspector = inspect(db.engine)
-        if 'despesa' in inspector.get_table_names():
-            cols = [c['name'] for c in inspector.get_columns('despesa')]
-            
-            colunas = {
-                'subcategoria': 'VARCHAR(100)',
-                'parcelas': 'INTEGER DEFAULT 1',
-                'parcela_atual': 'INTEGER DEFAULT 1',
-                'compra_parcelada_id': 'INTEGER',
-                'tipo_pagamento_id': 'INTEGER'
-            }
-            
-            for col_name, col_type in colunas.items():
-                if col_name not in cols:
-                    with db.engine.begin() as conn:
-                        conn.execute(text(f"ALTER TABLE despesa ADD COLUMN {col_name} {col_type}"))
-                    print(f"Coluna '{col_name}' adicionada na tabela 'despesa'.")
-            
-            if 'tipo_pagamento_id' in cols:
-                try:
-                    with db.engine.begin() as conn:
-                        conn.execute(text("DROP INDEX IF EXISTS ix_despesa_tipo_pagamento_id"))
-                        conn.execute(text("""
-                            CREATE INDEX ix_despesa_tipo_pagamento_id 
-                            ON despesa (tipo_pagamento_id)
-                        """))
-                except Exception as e:
-                    print('Aviso: Falha ao criar índice tipo_pagamento_id:', e)
-                    
-    except Exception as e:
-        print('Falha ao garantir colunas:', e)
+@app.cli.command('migrar')
+def migrar():
+    """Cria ou atualiza as tabelas do banco até a versão desta aplicação."""
+    if not upgrade():
+        print(f"Banco já está na versão {VERSAO_ATUAL}.")
 
+data_version.configure(os.path.join(app.config['CACHE_DIR'], 'versao_dados'))
+reference_version.configure(os.path.join(app.config['CACHE_DIR'], 'versao_referencia'))
+
+# Criar e alterar tabelas fica com `flask --app app3 migrar` (ou `python app3.py`): ao subir, só a versão é conferida
 with app.app_context():
-    db.create_all()
-    _ensure_columns()
+    banco_desatualizado = schema_version(db.engine) < VERSAO_ATUAL
+
+@app.before_request
+def exigir_banco_atualizado():
+    global banco_desatualizado
+    if banco_desatualizado and request.endpoint != 'static':
+        # relida a cada requisição só enquanto estiver atrasada (alguém pode rodar `migrar` com o servidor no ar)
+        banco_desatualizado = schema_version(db.engine) < VERSAO_ATUAL
+        if banco_desatualizado:
+            return 'Banco de dados desatualizado: rode `flask --app app3 migrar`.', 503
 
 if __name__ == '__main__':
+    with app.app_context():
+        upgrade()
+    banco_desatualizado = False
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
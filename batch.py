@@ -0,0 +1,128 @@
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import db, Receita
+from installments import expand_installments, next_purchase_ids, insert_expenses
+from reference_data import CategoryResolver
+from rollup import add_to_monthly_summary
+
+LIMITE_LOTE = 1000
+
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def _valores(item):
+    """Valor previsto e efetivo como em /api/receita e /api/despesa: sem valor efetivo, usa o previsto se efetivado, senão 0."""
+    valor_previsto = float(item['valor_previsto'])
+    valor = float(item['valor']) if item.get('valor') else (valor_previsto if item.get('efetivado') else 0.0)
+    return valor_previsto, valor
+
+
+def _obrigatorio(item, campo):
+    if item.get(campo) in (None, ''):
+        raise ValueError(f"Campo '{campo}' é obrigatório")
+    return item[campo]
+
+
+def parse_receita(item):
+    """Linha da tabela `receita` a partir de um item do lote (ValueError se inválido)."""
+    descricao = _obrigatorio(item, 'descricao')
+    valor_previsto, valor = _valores(item)
+    return {
+        'descricao': descricao,
+        'valor_previsto': valor_previsto,
+        'valor': valor,
+        'data': _data(_obrigatorio(item, 'data')),
+        'categoria': item.get('categoria'),
+        'efetivado': bool(item.get('efetivado', False)),
+    }
+
+
+def parse_despesa(item):
+    """Linhas da tabela `despesa` (uma por parcela) a partir de um item do lote (ValueError se inválido).
+
+    O `compra_parcelada_id` e os ids de categoria são preenchidos depois, só quando o lote inteiro for válido.
+    """
+    descricao = _obrigatorio(item, 'descricao')
+    valor_previsto, valor = _valores(item)
+    parcelas = int(item.get('parcelas') or 1)
+    if parcelas < 1:
+        raise ValueError('Número de parcelas deve ser maior que zero')
+    tipo_pagamento_id = item.get('tipo_pagamento_id')
+    return expand_installments(
+        descricao=descricao,
+        valor_previsto=valor_previsto,
+        valor=valor,
+        data=_data(_obrigatorio(item, 'data')),
+        parcelas=parcelas,
+        tipo_pagamento_id=int(tipo_pagamento_id) if tipo_pagamento_id else None,
+        efetivado=bool(item.get('efetivado', False)),
+    )
+
+
+def _validar(itens, parser):
+    """Valida todos os itens antes de gravar qualquer um; devolve (linhas por item, resultados com erros)."""
+    if not isinstance(itens, list) or not itens:
+        raise ValueError('Envie uma lista de itens')
+    if len(itens) > LIMITE_LOTE:
+        raise ValueError(f'Máximo de {LIMITE_LOTE} itens por lote')
+
+    linhas, resultados = [], []
+    for indice, item in enumerate(itens):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Item deve ser um objeto')
+            linhas.append(parser(item))
+            resultados.append({'indice': indice, 'success': True})
+        except (KeyError, TypeError, ValueError) as e:
+            mensagem = f"Campo '{e.args[0]}' é obrigatório" if isinstance(e, KeyError) else str(e)
+            linhas.append(None)
+            resultados.append({'indice': indice, 'success': False, 'message': mensagem})
+    return linhas, resultados
+
+
+def create_receitas(itens):
+    """Grava um lote de receitas numa única transação (tudo ou nada) e devolve o resultado de cada item."""
+    linhas, resultados = _validar(itens, parse_receita)
+    if not all(resultado['success'] for resultado in resultados):
+        return {'success': False, 'message': 'Nenhuma receita foi gravada: corrija os itens inválidos.', 'resultados': resultados}
+
+    tabela = Receita.__table__
+    ids = db.session.execute(insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True), linhas).scalars().all()
+    add_to_monthly_summary(Receita, linhas)
+    db.session.commit()
+
+    for resultado, id in zip(resultados, ids):
+        resultado['id'] = id
+    return {'success': True, 'message': f'{len(ids)} receita(s) adicionada(s) com sucesso!', 'resultados': resultados}
+
+
+def create_despesas(itens):
+    """Grava um lote de despesas (com expansão das parcelas) numa única transação e devolve o resultado de cada item."""
+    compras, resultados = _validar(itens, parse_despesa)
+    if not all(resultado['success'] for resultado in resultados):
+        return {'success': False, 'message': 'Nenhuma despesa foi gravada: corrija os itens inválidos.', 'resultados': resultados}
+
+    categorias = CategoryResolver()
+    for item, parcelas in zip(itens, compras):
+        categoria_id, subcategoria_id = categorias.ids(item.get('categoria'), item.get('subcategoria'))
+        for linha in parcelas:
+            linha['categoria_id'] = categoria_id
+            linha['subcategoria_id'] = subcategoria_id
+
+    parceladas = [parcelas for parcelas in compras if len(parcelas) > 1]
+    for parcelas, compra_parcelada_id in zip(parceladas, next_purchase_ids(len(parceladas))):
+        for linha in parcelas:
+            linha['compra_parcelada_id'] = compra_parcelada_id
+
+    ids = iter(insert_expenses([linha for parcelas in compras for linha in parcelas]))
+    db.session.commit()
+
+    for resultado, parcelas in zip(resultados, compras):
+        resultado['ids'] = [next(ids) for _ in parcelas]
+        if parcelas[0]['compra_parcelada_id']:
+            resultado['compra_parcelada_id'] = parcelas[0]['compra_parcelada_id']
+    return {'success': True, 'message': f'{len(compras)} despesa(s) adicionada(s) com sucesso!', 'resultados': resultados}
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mede a velocidade de montagem do relatório PDF (linhas por segundo) com dados sintéticos.
+
+Uso: python benchmark_pdf.py [linhas] [repeticoes] [processos]
+
+Com `processos` > 1 mede também a montagem em partes paralelas (pdf_parallel, precisa da pypdf) e
+compara com a sequencial. Usa um banco SQLite temporário; o banco do sistema não é tocado.
+
+Medido num contêiner de 1 núcleo (python benchmark_pdf.py 9000 3 3):
+    sequencial   2.24 s    3 processos   5.56 s (0.40x)
+Sem núcleos livres, subir os processos (cada um reimporta o app) e juntar as partes custa mais do que
+se ganha; por isso PDF_PROCESSES é 1 por padrão.
+"""
+
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models import db, Receita, Despesa, TipoPagamento
+from pdf_generator import render_pdf_report
+from reference_data import CategoryResolver
+from rollup import rebuild_monthly_summary
+
+CATEGORIAS_DESPESA = ['Alimentação', 'Moradia', 'Transporte', 'Saúde', 'Lazer', 'Educação']
+SUBCATEGORIAS = ['Mercado', 'Restaurante', 'Aluguel', 'Combustível', 'Farmácia', None]
+CATEGORIAS_RECEITA = ['Salário', 'Freelance', 'Investimentos']
+PALAVRAS = ['compra', 'pagamento', 'conta', 'mensalidade', 'parcela', 'loja', 'serviço', 'assinatura']
+
+
+def _descricao(sorteio):
+    return ' '.join(sorteio.choice(PALAVRAS) for _ in range(sorteio.randint(1, 6))).capitalize()
+
+
+def popular(quantidade, semente=42):
+    """Cria `quantidade` lançamentos (20% receitas) espalhados por um ano."""
+    sorteio = random.Random(semente)
+    inicio = date(2024, 1, 1)
+    db.session.add_all([TipoPagamento(nome=nome) for nome in ('Dinheiro', 'PIX', 'Cartão')])
+    db.session.flush()
+    categorias = CategoryResolver()
+
+    receitas, despesas = [], []
+    for _ in range(quantidade):
+        data = inicio + timedelta(days=sorteio.randrange(366))
+        valor = round(sorteio.uniform(5, 2000), 2)
+        if sorteio.random() < 0.2:
+            receitas.append({'descricao': _descricao(sorteio), 'valor_previsto': valor, 'valor': valor, 'data': data,
+                             'categoria': sorteio.choice(CATEGORIAS_RECEITA), 'efetivado': True})
+        else:
+            parcelas = sorteio.choice([1, 1, 1, 3, 12])
+            categoria_id, subcategoria_id = categorias.ids(sorteio.choice(CATEGORIAS_DESPESA), sorteio.choice(SUBCATEGORIAS))
+            despesas.append({'descricao': _descricao(sorteio), 'valor_previsto': valor, 'valor': valor, 'data': data,
+                             'categoria_id': categoria_id, 'subcategoria_id': subcategoria_id,
+                             'tipo_pagamento_id': sorteio.randint(1, 3), 'efetivado': True,
+                             'parcelas': parcelas, 'parcela_atual': sorteio.randint(1, parcelas)})
+    if receitas:
+        db.session.execute(insert(Receita.__table__), receitas)
+    if despesas:
+        db.session.execute(insert(Despesa.__table__), despesas)
+    rebuild_monthly_summary()
+    db.session.commit()
+
+
+def medir(repeticoes, processos=1):
+    models = {'Receita': Receita, 'Despesa': Despesa, 'TipoPagamento': TipoPagamento}
+    tempos = []
+    for _ in range(repeticoes):
+        arquivo = io.BytesIO()
+        inicio = time.perf_counter()
+        render_pdf_report(arquivo, {}, db, models, processos=processos)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), len(arquivo.getvalue())
+
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    processos = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    with tempfile.TemporaryDirectory() as pasta:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(pasta, 'benchmark.db')
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            popular(linhas)
+            tempo, tamanho = medir(repeticoes)
+            paralelo = medir(repeticoes, processos)[0] if processos > 1 else None
+            db.session.remove()
+            db.engine.dispose()
+
+    print("=" * 60)
+    print(f"Linhas:          {linhas}")
+    print(f"Melhor tempo:    {tempo:.2f} s (de {repeticoes})")
+    print(f"Linhas/segundo:  {linhas / tempo:,.0f}")
+    print(f"Tamanho do PDF:  {tamanho / 1024:,.0f} KB")
+    if paralelo is not None:
+        print(f"{processos} processos:    {paralelo:.2f} s ({tempo / paralelo:.2f}x a sequencial)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
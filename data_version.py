@@ -0,0 +1,102 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Usuario
+
+CHAVE_ALTERADO = 'dados_alterados'
+CHAVE_USUARIOS = 'usuarios_alterados'
+
+
+class DataVersion:
+    """Versão global dos dados financeiros, trocada a cada commit que altera lançamentos ou cadastros.
+
+    Com `caminho` configurado a versão fica num arquivo marcador, compartilhado por todos os workers;
+    cada troca grava um valor novo e único (não um incremento), então duas trocas simultâneas
+    nunca resultam na mesma versão. Sem arquivo, vale só para o processo atual.
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho
+        self._local = '0'
+        self._lock = threading.Lock()
+
+    def configure(self, caminho):
+        self.caminho = caminho
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        if not os.path.exists(caminho):
+            self.bump()
+
+    def current(self):
+        if not self.caminho:
+            return self._local
+        try:
+            with open(self.caminho, encoding='ascii') as arquivo:
+                return arquivo.read().strip()
+        except FileNotFoundError:
+            return '0'
+
+    def bump(self):
+        valor = f'{time.time_ns()}-{os.getpid()}-{threading.get_ident()}'
+        if not self.caminho:
+            with self._lock:
+                self._local = valor
+            return valor
+        # grava ao lado e troca atomicamente: quem lê nunca vê o arquivo pela metade
+        pasta = os.path.dirname(self.caminho)
+        fd, temporario = tempfile.mkstemp(dir=pasta, prefix='.versao-')
+        with os.fdopen(fd, 'w', encoding='ascii') as arquivo:
+            arquivo.write(valor)
+        os.replace(temporario, self.caminho)
+        return valor
+
+    def etag(self, *partes):
+        """ETag de uma resposta que depende só da versão dos dados e das `partes` (ex.: filtros normalizados)."""
+        chave = '|'.join([self.current(), *map(str, partes)])
+        return hashlib.sha1(chave.encode('utf-8')).hexdigest()
+
+
+data_version = DataVersion()
+# Usuários têm versão própria: criar, remover ou alterar um usuário não invalida relatórios e PDFs,
+# só o cache de usuários logados (user_cache) de todos os workers
+user_version = DataVersion()
+# Categorias, subcategorias e tipos de pagamento: trocada por ReferenceCache.invalidate() para os outros workers
+reference_version = DataVersion()
+
+
+@event.listens_for(Session, 'before_flush')
+def _marcar_flush(session, flush_context, instances):
+    objetos = (*session.new, *session.dirty, *session.deleted)
+    if any(type(obj) is not Usuario for obj in objetos):
+        session.info[CHAVE_ALTERADO] = True
+    if any(type(obj) is Usuario for obj in objetos):
+        session.info[CHAVE_USUARIOS] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _marcar_dml(orm_execute_state):
+    # INSERT/UPDATE/DELETE em lote executados pela sessão, fora do unit of work
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[CHAVE_ALTERADO] = True
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is Usuario:
+            orm_execute_state.session.info[CHAVE_USUARIOS] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _trocar_versao(session):
+    if session.info.pop(CHAVE_ALTERADO, False):
+        data_version.bump()
+    if session.info.pop(CHAVE_USUARIOS, False):
+        user_version.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca(session):
+    session.info.pop(CHAVE_ALTERADO, None)
+    session.info.pop(CHAVE_USUARIOS, None)
@@ -0,0 +1,126 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+# Espera do SQLite por um bloqueio antes de desistir (cada tentativa)
+BUSY_TIMEOUT_MS = 5000
+# Tentativas de abrir uma transação de escrita quando o banco continua bloqueado, com espera crescente
+TENTATIVAS_BLOQUEIO = 3
+ESPERA_INICIAL = 0.1  # segundos; dobra a cada tentativa
+
+# Aplicados a cada conexão nova. Com WAL leitores não esperam escritores (e vice-versa), e
+# synchronous=NORMAL só perde as últimas transações numa queda de energia, sem corromper o banco.
+PRAGMAS_SQLITE = {
+    'busy_timeout': BUSY_TIMEOUT_MS,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # KiB (negativo), ~20 MB por conexão
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+# Pool de conexões dos bancos servidor (PostgreSQL): variável de ambiente -> (opção do create_engine, conversão, padrão).
+# Cada worker tem o seu pool: o total de conexões é (pool_size + max_overflow) vezes os workers de todos os nós.
+OPCOES_DO_POOL = {
+    'DB_POOL_SIZE': ('pool_size', int, 5),
+    'DB_MAX_OVERFLOW': ('max_overflow', int, 10),
+    'DB_POOL_TIMEOUT': ('pool_timeout', int, 30),  # segundos esperando uma conexão livre
+    'DB_POOL_RECYCLE': ('pool_recycle', int, 1800),  # segundos; abaixo do tempo ocioso que o servidor/proxy tolera
+    'DB_POOL_PRE_PING': ('pool_pre_ping', lambda texto: texto.strip().lower() in ('1', 'true', 'sim', 'yes'), True),
+}
+
+
+def database_url(url):
+    """URL do banco com o driver explícito: `postgres://` (formato de Heroku, Render...) e `postgresql://` usam o psycopg 3."""
+    for prefixo in ('postgres://', 'postgresql://'):
+        if url.startswith(prefixo):
+            return 'postgresql+psycopg://' + url[len(prefixo):]
+    return url
+
+
+def engine_options(url, ambiente=os.environ):
+    """Opções do create_engine (SQLALCHEMY_ENGINE_OPTIONS) para `url`; o pool é configurado por OPCOES_DO_POOL.
+
+    O SQLite fica com os padrões do SQLAlchemy: as conexões são arquivos locais, não há o que reciclar.
+    """
+    if url.startswith('sqlite'):
+        return {}
+    opcoes = {}
+    for variavel, (opcao, converter, padrao) in OPCOES_DO_POOL.items():
+        valor = ambiente.get(variavel)
+        opcoes[opcao] = converter(valor) if valor not in (None, '') else padrao
+    return opcoes
+
+
+_local = threading.local()
+
+
+@contextmanager
+def write_transactions():
+    """Dentro do bloco, as transações desta thread no SQLite abrem como de escrita (BEGIN IMMEDIATE, com as repetições).
+
+    Para quem grava fora de uma requisição: comandos do CLI, migrações e scripts.
+    """
+    anterior = getattr(_local, 'escrita', False)
+    _local.escrita = True
+    try:
+        yield
+    finally:
+        _local.escrita = anterior
+
+
+def _bloqueado(erro):
+    mensagem = str(getattr(erro, 'orig', erro)).lower()
+    return 'database is locked' in mensagem or 'database table is locked' in mensagem
+
+
+def _em_memoria(engine):
+    return engine.url.database in (None, '', ':memory:')
+
+
+def configure_engine(engine, escrita=None):
+    """Ajusta o engine conforme o banco; hoje só o SQLite precisa (os demais ficam como estão).
+
+    No SQLite, cada conexão recebe PRAGMAS_SQLITE e as transações passam a ser abertas aqui:
+    quando `escrita()` é verdadeiro (por exemplo, numa requisição POST) com BEGIN IMMEDIATE, que
+    reserva a escrita logo no início e espera pelo busy_timeout, em vez de falhar no meio da
+    transação ao tentar passar de leitura para escrita; o mesmo vale dentro de `write_transactions()`.
+    As demais com BEGIN comum. Um BEGIN IMMEDIATE que esgota o busy_timeout é repetido com espera
+    crescente (TENTATIVAS_BLOQUEIO).
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = dict(PRAGMAS_SQLITE)
+    if _em_memoria(engine):
+        # sem arquivo não há WAL nem mmap
+        del pragmas['journal_mode'], pragmas['mmap_size']
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(conexao_dbapi, registro):
+        # o driver deixa de abrir transações por conta própria: o BEGIN é emitido em _ao_iniciar
+        conexao_dbapi.isolation_level = None
+        cursor = conexao_dbapi.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nome}={valor}')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def _ao_iniciar(conexao):
+        if not (getattr(_local, 'escrita', False) or (escrita and escrita())):
+            conexao.exec_driver_sql('BEGIN')
+            return
+        for tentativa in range(TENTATIVAS_BLOQUEIO):
+            try:
+                conexao.exec_driver_sql('BEGIN IMMEDIATE')
+                return
+            except OperationalError as erro:
+                if not _bloqueado(erro) or tentativa == TENTATIVAS_BLOQUEIO - 1:
+                    raise
+            # nada foi feito na transação ainda: basta esperar e tentar de novo
+            time.sleep(ESPERA_INICIAL * 2 ** tentativa * (1 + random.random()))
@@ -0,0 +1,237 @@
+import csv
+import hashlib
+import re
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from models import db, Receita, Despesa, TipoPagamento
+from installments import expand_installments, insert_expenses
+from reference_data import CategoryResolver
+from rollup import add_to_monthly_summary
+
+TAMANHO_LOTE_PADRAO = 1000
+MAXIMO_ERROS_RELATADOS = 50
+
+# Nomes de coluna aceitos no cabeçalho do CSV (sem acento e em minúsculas) -> campo do lançamento
+COLUNAS_CSV = {
+    'data': 'data',
+    'descricao': 'descricao', 'historico': 'descricao', 'memo': 'descricao',
+    'valor': 'valor',
+    'tipo': 'tipo',
+    'categoria': 'categoria',
+    'subcategoria': 'subcategoria',
+    'tipo_pagamento': 'tipo_pagamento', 'forma_pagamento': 'tipo_pagamento', 'pagamento': 'tipo_pagamento',
+    'efetivado': 'efetivado',
+    'id': 'id_externo', 'fitid': 'id_externo',
+}
+_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _sem_acento(texto):
+    return texto.strip().lower().translate(str.maketrans('áàãâéêíóôõúç', 'aaaaeeiooouc'))
+
+
+def _valor(texto):
+    """Aceita `1234.56`, `-1.234,56` e `R$ 10,00`."""
+    texto = texto.replace('R$', '').replace(' ', '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    return float(texto)
+
+
+def _data(texto):
+    texto = texto.strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y', '%Y%m%d'):
+        try:
+            return datetime.strptime(texto[:10] if formato != '%Y%m%d' else texto[:8], formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f'Data inválida: {texto}')
+
+
+def _lancamento(campos):
+    """Normaliza um registro lido do arquivo; o sinal do valor decide receita/despesa quando não há coluna `tipo`."""
+    valor = _valor(campos.get('valor') or '')
+    tipo = _sem_acento(campos.get('tipo') or '')
+    if tipo not in ('receita', 'despesa'):
+        tipo = 'despesa' if valor < 0 else 'receita'
+    descricao = (campos.get('descricao') or '').strip()
+    if not descricao:
+        raise ValueError('Descrição vazia')
+    efetivado = _sem_acento(campos.get('efetivado') or 'sim') not in ('0', 'nao', 'false', 'pendente')
+    return {
+        'tipo': tipo,
+        'data': _data(campos.get('data') or ''),
+        'descricao': descricao[:200],
+        'valor': round(abs(valor), 2),
+        'categoria': (campos.get('categoria') or '').strip() or None,
+        'subcategoria': (campos.get('subcategoria') or '').strip() or None,
+        'tipo_pagamento': (campos.get('tipo_pagamento') or '').strip() or None,
+        'efetivado': efetivado,
+        'id_externo': (campos.get('id_externo') or '').strip() or None,
+    }
+
+
+def read_csv(arquivo):
+    """Gera `(linha, lançamento ou exceção)` lendo o CSV linha a linha (separador `;` ou `,` detectado no cabeçalho)."""
+    cabecalho = arquivo.readline()
+    separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    colunas = [COLUNAS_CSV.get(_sem_acento(nome)) for nome in next(csv.reader([cabecalho], delimiter=separador))]
+    if 'valor' not in colunas or 'data' not in colunas:
+        raise ValueError("O CSV precisa das colunas 'data' e 'valor'")
+
+    leitor = csv.reader(arquivo, delimiter=separador)
+    for registro in leitor:
+        if not any(registro):
+            continue
+        try:
+            campos = {coluna: valor for coluna, valor in zip(colunas, registro) if coluna}
+            yield leitor.line_num + 1, _lancamento(campos)
+        except ValueError as e:
+            yield leitor.line_num + 1, e
+
+
+def read_ofx(arquivo):
+    """Gera `(linha, lançamento ou exceção)` para cada <STMTTRN> do OFX (SGML ou XML), sem carregar o arquivo inteiro."""
+    atual = None
+    inicio = 0
+    for numero, linha in enumerate(arquivo, 1):
+        for fechamento, tag, valor in _TAG_OFX.findall(linha):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if not fechamento:
+                    atual, inicio = {}, numero
+                    continue
+                if atual is not None:
+                    try:
+                        yield inicio, _lancamento({
+                            'data': atual.get('DTPOSTED', ''),
+                            'valor': atual.get('TRNAMT', ''),
+                            'descricao': atual.get('MEMO') or atual.get('NAME', ''),
+                            'id_externo': atual.get('FITID'),
+                        })
+                    except ValueError as e:
+                        yield inicio, e
+                atual = None
+            elif atual is not None and not fechamento:
+                atual[tag] = valor.strip()
+
+
+def _hash(lancamento, ocorrencia):
+    """Identidade do lançamento para não importar duas vezes o mesmo extrato.
+
+    Sem id externo (FITID), lançamentos idênticos no mesmo dia se diferenciam pela ordem em que aparecem.
+    """
+    if lancamento['id_externo']:
+        chave = f"{lancamento['id_externo']}|{lancamento['data']}|{lancamento['valor']:.2f}"
+    else:
+        chave = f"{lancamento['tipo']}|{lancamento['data']}|{lancamento['valor']:.2f}|{lancamento['descricao']}|{ocorrencia}"
+    return hashlib.sha256(chave.encode('utf-8')).hexdigest()
+
+
+def _ocorrencia(ocorrencias, lancamento):
+    """Quantas vezes o lançamento já apareceu no arquivo, contando este (1 na primeira vez).
+
+    Contado no arquivo inteiro: extratos nem sempre vêm ordenados por data, e zerar o contador quando
+    a data muda daria o mesmo hash a lançamentos iguais separados por outro dia. Para a memória não
+    crescer com o tamanho da descrição, a chave é um resumo de 8 bytes; com id externo a ordem não
+    entra no hash e nada é guardado.
+    """
+    if lancamento['id_externo']:
+        return None
+    chave = hashlib.blake2b(
+        f"{lancamento['tipo']}|{lancamento['data']}|{lancamento['valor']:.2f}|{lancamento['descricao']}".encode('utf-8'),
+        digest_size=8).digest()
+    ocorrencias[chave] = ocorrencias.get(chave, 0) + 1
+    return ocorrencias[chave]
+
+
+class _Importacao:
+    """Acumula lançamentos e grava em lotes, cada um com seu commit."""
+
+    def __init__(self, tamanho_lote):
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.lote = []
+        # Pesquisas por nome em memória: uma consulta por importação, não por linha
+        self.tipos_pagamento = {nome.strip().lower(): id for id, nome in db.session.execute(select(TipoPagamento.id, TipoPagamento.nome))}
+        self.categorias = CategoryResolver()
+        self.resultado = {'lidas': 0, 'receitas': 0, 'despesas': 0, 'duplicadas': 0, 'erros': 0, 'mensagens': []}
+
+    def erro(self, linha, mensagem):
+        self.resultado['erros'] += 1
+        if len(self.resultado['mensagens']) < MAXIMO_ERROS_RELATADOS:
+            self.resultado['mensagens'].append(f'Linha {linha}: {mensagem}')
+
+    def adicionar(self, lancamento):
+        self.lote.append(lancamento)
+        if len(self.lote) >= self.tamanho_lote:
+            self.gravar()
+
+    def gravar(self):
+        if not self.lote:
+            return
+        hashes = [l['hash'] for l in self.lote]
+        existentes = set(db.session.execute(select(Receita.hash_importacao).where(Receita.hash_importacao.in_(hashes))).scalars())
+        existentes.update(db.session.execute(select(Despesa.hash_importacao).where(Despesa.hash_importacao.in_(hashes))).scalars())
+
+        receitas, despesas = [], []
+        for l in self.lote:
+            if l['hash'] in existentes:
+                self.resultado['duplicadas'] += 1
+                continue
+            existentes.add(l['hash'])
+            if l['tipo'] == 'receita':
+                receitas.append({'descricao': l['descricao'], 'valor_previsto': l['valor'], 'valor': l['valor'] if l['efetivado'] else 0.0,
+                                 'data': l['data'], 'categoria': l['categoria'], 'efetivado': l['efetivado'],
+                                 'hash_importacao': l['hash']})
+            else:
+                categoria_id, subcategoria_id = self.categorias.ids(l['categoria'], l['subcategoria'])
+                linha, = expand_installments(
+                    descricao=l['descricao'], valor_previsto=l['valor'], valor=l['valor'] if l['efetivado'] else 0.0,
+                    data=l['data'], categoria_id=categoria_id, subcategoria_id=subcategoria_id,
+                    tipo_pagamento_id=self.tipos_pagamento.get((l['tipo_pagamento'] or '').lower()),
+                    efetivado=l['efetivado'])
+                linha['hash_importacao'] = l['hash']
+                despesas.append(linha)
+
+        if receitas:
+            db.session.execute(insert(Receita.__table__), receitas)
+            add_to_monthly_summary(Receita, receitas)
+        insert_expenses(despesas)
+        db.session.commit()
+        self.resultado['receitas'] += len(receitas)
+        self.resultado['despesas'] += len(despesas)
+        self.lote = []
+
+
+def format_from_filename(nome):
+    """Formato do extrato pela extensão do arquivo (`csv` ou `ofx`)."""
+    return (nome or '').rsplit('.', 1)[-1].lower()
+
+
+def import_statement(arquivo, formato, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Importa um extrato CSV ou OFX de um arquivo texto, gravando e confirmando a cada `tamanho_lote` lançamentos.
+
+    Linhas já importadas antes (mesmo `hash_importacao`) são ignoradas e linhas inválidas são contadas
+    como erro sem interromper o restante. Devolve o resumo da importação.
+    """
+    leitores = {'csv': read_csv, 'ofx': read_ofx}
+    if formato not in leitores:
+        raise ValueError(f'Formato não suportado: {formato}')
+
+    importacao = _Importacao(tamanho_lote)
+    ocorrencias = {}
+    try:
+        for linha, lancamento in leitores[formato](arquivo):
+            importacao.resultado['lidas'] += 1
+            if isinstance(lancamento, Exception):
+                importacao.erro(linha, str(lancamento))
+                continue
+            lancamento['hash'] = _hash(lancamento, _ocorrencia(ocorrencias, lancamento))
+            importacao.adicionar(lancamento)
+        importacao.gravar()
+    except Exception:
+        db.session.rollback()
+        raise
+    return importacao.resultado
@@ -5,6 +5,7 @@ Script para inicializar o banco de dados
 """
 
 from app import app, db, Despesa, Receita, CategoriaDespesa, SubcategoriaDespesa, TipoPagamento
+from migrations import upgrade
 
 def inicializar_banco():
     with app.app_context():
@@ -12,7 +13,7 @@ def inicializar_banco():
             print("Criando banco de dados...")
             
             # Criar todas as tabelas
-            db.create_all()
+            upgrade()
             
             # Adicionar tipos de pagamento padrão
             if TipoPagamento.query.count() == 0:
@@ -0,0 +1,129 @@
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+from sqlalchemy import BigInteger, case, cast, delete, func, insert, literal, or_, select, type_coerce, update
+
+from models import db, Despesa
+from money import Dinheiro, to_cents
+from rollup import add_to_monthly_summary, monthly_summary_adjusted
+
+# Chave do advisory lock do PostgreSQL que serializa a reserva de ids de compras parceladas
+TRAVA_COMPRAS_PARCELADAS = 2024_0001
+
+
+def _data_parcela(data_inicial, i):
+    """Mesma data `i` meses depois da primeira parcela; dias 29 a 31 caem no último dia dos meses mais curtos."""
+    return data_inicial + relativedelta(months=i)
+
+
+def _dividir(total, parcelas):
+    """Valor de cada parcela arredondado aos centavos; a última absorve a diferença do arredondamento.
+
+    A conta é feita em centavos inteiros, então a soma das parcelas é exatamente o total.
+    """
+    centavos = to_cents(total)
+    parcela = (2 * centavos + parcelas) // (2 * parcelas)  # divisão arredondada (meio centavo para cima)
+    ultima = centavos - parcela * (parcelas - 1)
+    return [Dinheiro.de_centavos(parcela)] * (parcelas - 1) + [Dinheiro.de_centavos(ultima)]
+
+
+def expand_installments(descricao, valor_previsto, valor, data, parcelas=1, compra_parcelada_id=None,
+                        categoria_id=None, subcategoria_id=None, tipo_pagamento_id=None, efetivado=False):
+    """Linhas da tabela `despesa` (uma por parcela) para uma compra, sem tocar no banco.
+
+    `valor_previsto` e `valor` são os totais da compra; compras parceladas precisam de `compra_parcelada_id`.
+    """
+    previstos = _dividir(valor_previsto, parcelas)
+    efetivos = _dividir(valor, parcelas)
+    return [
+        {
+            'descricao': f"{descricao} ({i+1}/{parcelas})" if parcelas > 1 else descricao,
+            'valor_previsto': previstos[i],
+            'valor': efetivos[i],
+            'data': _data_parcela(data, i),
+            'categoria_id': categoria_id,
+            'subcategoria_id': subcategoria_id,
+            'tipo_pagamento_id': tipo_pagamento_id,
+            'parcelas': parcelas,
+            'parcela_atual': i + 1,
+            'compra_parcelada_id': compra_parcelada_id,
+            'efetivado': efetivado,
+        }
+        for i in range(parcelas)
+    ]
+
+
+def next_purchase_ids(quantidade):
+    """Ids de `compra_parcelada_id` para `quantidade` compras novas.
+
+    Mantém o formato de timestamp usado até aqui, mas continua a partir do maior id existente
+    para que várias compras criadas no mesmo segundo não caiam no mesmo grupo.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Vários nós no mesmo banco: sem a trava, duas requisições leriam o mesmo máximo. Ela vale até o
+        # fim da transação (o INSERT das parcelas); no SQLite o BEGIN IMMEDIATE já serializa as escritas.
+        db.session.execute(select(func.pg_advisory_xact_lock(TRAVA_COMPRAS_PARCELADAS)))
+    maior = db.session.execute(select(func.max(Despesa.compra_parcelada_id))).scalar() or 0
+    inicio = max(maior + 1, int(datetime.now().timestamp()))
+    return list(range(inicio, inicio + quantidade))
+
+
+def insert_expenses(linhas):
+    """Grava as linhas num único INSERT em lote e devolve os ids gerados, na ordem das linhas.
+
+    O INSERT não passa pelos eventos da sessão, então o ResumoMensal é ajustado aqui. Não faz commit.
+    """
+    if not linhas:
+        return []
+    # INSERT do Core na tabela: o bulk do ORM quebra o lote a cada variação de colunas nulas
+    tabela = Despesa.__table__
+    resultado = db.session.execute(insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True), linhas)
+    ids = resultado.scalars().all()
+    add_to_monthly_summary(Despesa, linhas)
+    return ids
+
+
+def update_installment_group(compra_parcelada_id, referencia, efetivado=None, valor=None):
+    """Atualiza todas as parcelas de uma compra num único UPDATE e devolve quantas foram alteradas.
+
+    `efetivado` marca o status (e, ao efetivar, copia o valor previsto para parcelas sem valor);
+    `valor` é o valor informado para a parcela `referencia`, repartido entre as demais
+    proporcionalmente ao valor previsto de cada uma.
+    """
+    valores = {}
+    if efetivado is not None:
+        valores['efetivado'] = efetivado
+        if efetivado:
+            valores['valor'] = case((or_(Despesa.valor.is_(None), Despesa.valor == 0), Despesa.valor_previsto),
+                                    else_=Despesa.valor)
+    if valor is not None:
+        if referencia.valor_previsto:
+            # proporção calculada sobre os centavos gravados e arredondada ao centavo no próprio UPDATE
+            fator = to_cents(valor) / to_cents(referencia.valor_previsto)
+            centavos = func.round(type_coerce(Despesa.valor_previsto, BigInteger) * literal(fator))
+            valores['valor'] = cast(centavos, BigInteger)
+        else:
+            valores['valor'] = 0.0
+    if not valores:
+        return 0
+
+    criterio = Despesa.compra_parcelada_id == compra_parcelada_id
+    with monthly_summary_adjusted(Despesa, criterio):
+        resultado = db.session.execute(update(Despesa).where(criterio).values(**valores)
+                                       .execution_options(synchronize_session=False))
+    return resultado.rowcount
+
+
+def delete_installments(compra_parcelada_id, a_partir_da_parcela=None):
+    """Remove as parcelas de uma compra (todas, ou da parcela informada em diante) num único DELETE.
+
+    Devolve quantas foram removidas.
+    """
+    criterios = [Despesa.compra_parcelada_id == compra_parcelada_id]
+    if a_partir_da_parcela is not None:
+        criterios.append(Despesa.parcela_atual >= a_partir_da_parcela)
+    with monthly_summary_adjusted(Despesa, *criterios):
+        resultado = db.session.execute(delete(Despesa).where(*criterios)
+                                       .execution_options(synchronize_session=False))
+    return resultado.rowcount
@@ -6,6 +6,7 @@ Script para limpar e recriar o banco de dados
 
 import os
 from app import app, db, Despesa, Receita, CategoriaDespesa, SubcategoriaDespesa, TipoPagamento
+from migrations import upgrade
 
 def limpar_e_recriar_banco():
     with app.app_context():
@@ -15,9 +16,15 @@ def limpar_e_recriar_banco():
             if os.path.exists(db_path):
                 os.remove(db_path)
                 print("Banco antigo removido.")
+            # Arquivos do modo WAL: se sobrarem, seriam aplicados ao banco novo
+            for sufixo in ('-wal', '-shm'):
+                if os.path.exists(db_path + sufixo):
+                    os.remove(db_path + sufixo)
+            # conexões já abertas (versão conferida ao importar o app) ainda apontam para o arquivo apagado
+            db.engine.dispose()
             
             # Criar todas as tabelas
-            db.create_all()
+            upgrade()
             print("Banco de dados criado com sucesso!")
             
         except Exception as e:
@@ -0,0 +1,103 @@
+from sqlalchemy import func, inspect, select
+from sqlalchemy.exc import DBAPIError
+
+from database import write_transactions
+from models import (db, SchemaVersion, Usuario, add_missing_columns, ensure_indexes, migrate_category_ids,
+                    migrate_money_columns)
+from rollup import rebuild_monthly_summary
+
+# Chave do advisory lock do PostgreSQL que impede dois `migrar` ao mesmo tempo
+TRAVA_MIGRACOES = 2024_0002
+
+
+def _tabelas_e_colunas(engine):
+    existentes = set(inspect(engine).get_table_names())
+    db.metadata.create_all(engine)
+    mensagens = [f"Tabela '{nome}' criada." for nome in db.metadata.tables if nome not in existentes]
+    return mensagens + [f"Coluna '{coluna}' adicionada na tabela '{tabela}'." for tabela, coluna in add_missing_columns(engine)]
+
+
+def _dinheiro_em_centavos(engine):
+    return [f"Valores da tabela '{tabela}' convertidos para centavos." for tabela in migrate_money_columns(engine)]
+
+
+def _categorias_por_id(engine):
+    return [f"Categorias da tabela '{tabela}' convertidas para ids." for tabela in migrate_category_ids(engine)]
+
+
+def _resumo_mensal(engine):
+    # refeito a partir das linhas já convertidas (centavos exatos, agrupado pelos ids)
+    linhas = rebuild_monthly_summary()
+    db.session.commit()
+    return [f'Resumo mensal reconstruído: {linhas} linha(s).']
+
+
+def _indices(engine):
+    # depois das colunas existirem: cria só os que faltam
+    return [f"Índice '{nome}' criado." for nome in ensure_indexes(engine)]
+
+
+def _usuario_admin(engine):
+    Usuario.init_default_user()
+    return []
+
+
+# Passos em ordem; a versão é a posição na lista (a partir de 1). Mudanças novas entram sempre no fim.
+# Cada passo confere o banco antes de alterar: bancos de antes desta tabela (versão 0) passam por todos
+# sem refazer o que já existe, e um passo interrompido pode ser repetido.
+MIGRACOES = [
+    ('Tabelas e colunas', _tabelas_e_colunas),
+    ('Dinheiro em centavos', _dinheiro_em_centavos),
+    ('Categorias das despesas por id', _categorias_por_id),
+    ('Resumo mensal', _resumo_mensal),
+    ('Índices', _indices),
+    ('Usuário admin padrão', _usuario_admin),
+]
+VERSAO_ATUAL = len(MIGRACOES)
+
+
+def schema_version(engine):
+    """Versão do banco: a maior registrada em `schema_version`, ou 0 se a tabela ainda não existe.
+
+    É uma consulta só; a inspeção do banco fica para quando ela falha.
+    """
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(SchemaVersion.versao))).scalar() or 0
+    except DBAPIError:
+        if inspect(engine).has_table(SchemaVersion.__tablename__):
+            raise
+        return 0
+
+
+def pending_migrations(engine):
+    """`(versão, descrição)` das migrações que faltam aplicar, em ordem."""
+    return [(versao, MIGRACOES[versao - 1][0]) for versao in range(schema_version(engine) + 1, VERSAO_ATUAL + 1)]
+
+
+def upgrade(avisar=print):
+    """Aplica as migrações pendentes em ordem, registrando cada uma; devolve as versões aplicadas.
+
+    Precisa do app_context (o resumo e o usuário padrão passam pela sessão). No SQLite as transações
+    já abrem reservando a escrita, para não falhar no meio com o servidor no ar.
+    """
+    engine = db.engine
+    with write_transactions(), engine.connect() as trava:
+        if engine.dialect.name == 'postgresql':
+            # vários nós/workers podem rodar o comando no deploy: o segundo espera e não encontra nada pendente
+            trava.execute(select(func.pg_advisory_lock(TRAVA_MIGRACOES)))
+        try:
+            SchemaVersion.__table__.create(engine, checkfirst=True)
+            aplicadas = []
+            for versao, descricao in pending_migrations(engine):
+                for mensagem in MIGRACOES[versao - 1][1](engine):
+                    avisar(mensagem)
+                db.session.add(SchemaVersion(versao=versao, descricao=descricao))
+                db.session.commit()
+                avisar(f'Versão {versao} aplicada: {descricao}.')
+                aplicadas.append(versao)
+            return aplicadas
+        finally:
+            if engine.dialect.name == 'postgresql':
+                trava.execute(select(func.pg_advisory_unlock(TRAVA_MIGRACOES)))
+                trava.commit()
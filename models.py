@@ -1,6 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import MetaData, Table, inspect, literal, text
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from money import Centavos
+
 db = SQLAlchemy()
 
 class Usuario(db.Model):
@@ -28,23 +31,34 @@ class Usuario(db.Model):
 class Receita(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     descricao = db.Column(db.String(200), nullable=False)
-    valor = db.Column(db.Float, nullable=False, default=0.0)  # Valor efetivo (manter not null, usar 0 como padrão)
-    valor_previsto = db.Column(db.Float, nullable=False)  # Valor previsto é obrigatório
+    # Dinheiro em centavos inteiros no banco (ver money); no Python, em reais
+    valor = db.Column('valor_centavos', Centavos, key='valor', nullable=False, default=0)  # Valor efetivo (manter not null, usar 0 como padrão)
+    valor_previsto = db.Column('valor_previsto_centavos', Centavos, key='valor_previsto', nullable=False)  # Valor previsto é obrigatório
     data = db.Column(db.Date, nullable=False)
     categoria = db.Column(db.String(100))
     efetivado = db.Column(db.Boolean, default=False)  # True quando o valor foi realmente recebido
+    hash_importacao = db.Column(db.String(64))  # Identifica lançamentos vindos de extratos importados
+
+    __table_args__ = (
+        db.Index('ix_receita_data', 'data'),
+        db.Index('ix_receita_categoria_data', 'categoria', 'data'),
+        db.Index('ix_receita_efetivado_data', 'efetivado', 'data'),
+        db.Index('ix_receita_hash_importacao', 'hash_importacao'),
+    )
 
 class CategoriaDespesa(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     descricao = db.Column(db.Text)
     subcategorias = db.relationship('SubcategoriaDespesa', backref='categoria', lazy=True)
+    despesas = db.relationship('Despesa', backref='categoria', lazy=True)
 
 class SubcategoriaDespesa(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     descricao = db.Column(db.Text)
     categoria_id = db.Column(db.Integer, db.ForeignKey('categoria_despesa.id'), nullable=False)
+    despesas = db.relationship('Despesa', backref='subcategoria', lazy=True)
 
 class TipoPagamento(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -56,13 +70,198 @@ class TipoPagamento(db.Model):
 class Despesa(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     descricao = db.Column(db.String(200), nullable=False)
-    valor = db.Column(db.Float, nullable=False, default=0.0)  # Valor efetivo (manter not null, usar 0 como padrão)
-    valor_previsto = db.Column(db.Float, nullable=False)  # Valor previsto é obrigatório
+    # Dinheiro em centavos inteiros no banco (ver money); no Python, em reais
+    valor = db.Column('valor_centavos', Centavos, key='valor', nullable=False, default=0)  # Valor efetivo (manter not null, usar 0 como padrão)
+    valor_previsto = db.Column('valor_previsto_centavos', Centavos, key='valor_previsto', nullable=False)  # Valor previsto é obrigatório
     data = db.Column(db.Date, nullable=False)
-    categoria = db.Column(db.String(100))
-    subcategoria = db.Column(db.String(100))
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categoria_despesa.id'))
+    subcategoria_id = db.Column(db.Integer, db.ForeignKey('subcategoria_despesa.id'))
     parcelas = db.Column(db.Integer, default=1)
     parcela_atual = db.Column(db.Integer, default=1)
     compra_parcelada_id = db.Column(db.Integer, nullable=True)
     tipo_pagamento_id = db.Column(db.Integer, db.ForeignKey('tipo_pagamento.id'))
-    efetivado = db.Column(db.Boolean, default=False)  # True quando o pagamento foi realmente efetuado  # True quando o pagamento foi realmente efetuado
\ No newline at end of file
+    efetivado = db.Column(db.Boolean, default=False)  # True quando o pagamento foi realmente efetuado
+    hash_importacao = db.Column(db.String(64))  # Identifica lançamentos vindos de extratos importados
+
+    __table_args__ = (
+        db.Index('ix_despesa_data', 'data'),
+        db.Index('ix_despesa_categoria_id_data', 'categoria_id', 'data'),
+        db.Index('ix_despesa_subcategoria_id_data', 'subcategoria_id', 'data'),
+        db.Index('ix_despesa_efetivado_data', 'efetivado', 'data'),
+        db.Index('ix_despesa_compra_parcelada', 'compra_parcelada_id', 'parcela_atual'),
+        db.Index('ix_despesa_tipo_pagamento_id', 'tipo_pagamento_id'),
+        db.Index('ix_despesa_hash_importacao', 'hash_importacao'),
+    )
+
+
+class ResumoMensal(db.Model):
+    """Totais mensais por categoria, subcategoria, forma de pagamento e status (mantidos por rollup.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(10), nullable=False)  # 'receita' ou 'despesa'
+    mes = db.Column(db.Date, nullable=False)  # primeiro dia do mês
+    categoria = db.Column(db.String(100))  # receitas (texto livre)
+    categoria_id = db.Column(db.Integer)  # despesas
+    subcategoria_id = db.Column(db.Integer)  # despesas
+    tipo_pagamento_id = db.Column(db.Integer)
+    efetivado = db.Column(db.Boolean)
+    total_valor = db.Column('total_valor_centavos', Centavos, key='total_valor', nullable=False, default=0)
+    total_previsto = db.Column('total_previsto_centavos', Centavos, key='total_previsto', nullable=False, default=0)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_resumo_mensal_tipo_mes', 'tipo', 'mes'),
+    )
+
+
+class SchemaVersion(db.Model):
+    """Uma linha por migração aplicada (migrations.MIGRACOES); a versão do banco é a maior."""
+    versao = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    descricao = db.Column(db.String(200), nullable=False)
+    aplicada_em = db.Column(db.DateTime, nullable=False, server_default=db.func.current_timestamp())
+
+def missing_indexes(engine):
+    """Lista os índices declarados nos modelos que ainda não existem no banco, como `(tabela, índice)`."""
+    inspector = inspect(engine)
+    tabelas = set(inspector.get_table_names())
+    faltando = []
+    for tabela in db.metadata.sorted_tables:
+        if tabela.name not in tabelas:
+            continue
+        existentes = {i['name'] for i in inspector.get_indexes(tabela.name)}
+        faltando.extend((tabela.name, i.name) for i in tabela.indexes if i.name not in existentes)
+    return faltando
+
+
+def ensure_indexes(engine):
+    """Cria apenas os índices que faltam (sem apagar e recriar os existentes)."""
+    criados = []
+    for tabela, nome in missing_indexes(engine):
+        indice = next(i for i in db.metadata.tables[tabela].indexes if i.name == nome)
+        indice.create(bind=engine, checkfirst=True)
+        criados.append(nome)
+    return criados
+
+
+# Colunas criadas depois da primeira versão do banco: tabela -> {coluna: valor das linhas já existentes}
+COLUNAS_ADICIONADAS = {
+    'despesa': {'parcelas': 1, 'parcela_atual': 1, 'compra_parcelada_id': None, 'tipo_pagamento_id': None,
+                'efetivado': False, 'hash_importacao': None},
+    'receita': {'efetivado': False, 'hash_importacao': None},
+}
+
+
+def add_missing_columns(engine):
+    """Cria as colunas de COLUNAS_ADICIONADAS que faltam; devolve `(tabela, coluna)` das criadas.
+
+    Tipo e padrão saem do modelo, escritos no dialeto do banco (`BOOLEAN DEFAULT 0` no SQLite,
+    `BOOLEAN DEFAULT false` no PostgreSQL).
+    """
+    inspector = inspect(engine)
+    tabelas = set(inspector.get_table_names())
+    criadas = []
+    for tabela, colunas in COLUNAS_ADICIONADAS.items():
+        if tabela not in tabelas:
+            continue
+        existentes = {c['name'] for c in inspector.get_columns(tabela)}
+        for nome, padrao in colunas.items():
+            if nome in existentes:
+                continue
+            tipo = db.metadata.tables[tabela].c[nome].type
+            ddl = f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo.compile(dialect=engine.dialect)}"
+            if padrao is not None:
+                ddl += f" DEFAULT {literal(padrao, tipo).compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})}"
+            with engine.begin() as conn:
+                conn.execute(text(ddl))
+            criadas.append((tabela, nome))
+    return criadas
+
+
+# Colunas de dinheiro que bancos antigos gravavam em reais (FLOAT): tabela -> {coluna antiga: coluna em centavos}
+COLUNAS_EM_CENTAVOS = {
+    'receita': {'valor': 'valor_centavos', 'valor_previsto': 'valor_previsto_centavos'},
+    'despesa': {'valor': 'valor_centavos', 'valor_previsto': 'valor_previsto_centavos'},
+    'resumo_mensal': {'total_valor': 'total_valor_centavos', 'total_previsto': 'total_previsto_centavos'},
+}
+
+
+def migrate_money_columns(engine):
+    """Converte as colunas de dinheiro em reais (FLOAT) para centavos inteiros; devolve as tabelas convertidas.
+
+    Cada tabela é convertida numa transação curta: cria a coluna em centavos, preenche a partir da
+    antiga e remove a antiga (DROP COLUMN exige SQLite 3.35+). Sem `valor_previsto` (bancos muito
+    antigos), o previsto parte do `valor`, como antes.
+    """
+    inspector = inspect(engine)
+    tabelas = set(inspector.get_table_names())
+    convertidas = []
+    for tabela, colunas in COLUNAS_EM_CENTAVOS.items():
+        if tabela not in tabelas:
+            continue
+        existentes = {c['name'] for c in inspector.get_columns(tabela)}
+        novas = {antiga: nova for antiga, nova in colunas.items() if nova not in existentes}
+        if not novas:
+            continue
+        antigas = [antiga for antiga in colunas if antiga in existentes]
+        with engine.begin() as conn:
+            for antiga, nova in novas.items():
+                conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {nova} BIGINT NOT NULL DEFAULT 0"))
+                origem = antiga if antiga in existentes else next(iter(antigas), None)
+                if origem:
+                    # arredonda o valor decimal, como to_cents: ROUND(valor * 100) erraria casos como 1.005,
+                    # cujo produto em float fica em 100.4999...
+                    conn.execute(text(f"UPDATE {tabela} SET {nova} = "
+                                      f"CAST(ROUND(ROUND(CAST(COALESCE({origem}, 0) AS NUMERIC), 2) * 100) AS BIGINT)"))
+            for antiga in antigas:
+                conn.execute(text(f"ALTER TABLE {tabela} DROP COLUMN {antiga}"))
+        convertidas.append(tabela)
+    return convertidas
+
+
+def migrate_category_ids(engine):
+    """Troca a categoria e a subcategoria em texto da tabela `despesa` pelos ids; devolve as tabelas convertidas.
+
+    Nomes que não existem em CategoriaDespesa/SubcategoriaDespesa (lançamentos importados, categorias
+    já apagadas) viram categorias novas, para nenhuma despesa perder a classificação; subcategorias
+    de despesas sem categoria são descartadas. O ResumoMensal, agrupado pelos textos, é recriado
+    vazio e precisa ser reconstruído (rollup.rebuild_monthly_summary).
+    """
+    inspector = inspect(engine)
+    tabelas = set(inspector.get_table_names())
+    if 'despesa' not in tabelas:
+        return []
+    existentes = {c['name'] for c in inspector.get_columns('despesa')}
+    if 'categoria_id' in existentes:
+        return []
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE despesa ADD COLUMN categoria_id INTEGER REFERENCES categoria_despesa (id)"))
+        conn.execute(text("ALTER TABLE despesa ADD COLUMN subcategoria_id INTEGER REFERENCES subcategoria_despesa (id)"))
+        if 'categoria' in existentes:
+            conn.execute(text(
+                "INSERT INTO categoria_despesa (nome) SELECT DISTINCT d.categoria FROM despesa d "
+                "WHERE d.categoria IS NOT NULL AND NOT EXISTS "
+                "(SELECT 1 FROM categoria_despesa c WHERE c.nome = d.categoria)"))
+            conn.execute(text(
+                "UPDATE despesa SET categoria_id = "
+                "(SELECT MIN(c.id) FROM categoria_despesa c WHERE c.nome = despesa.categoria)"))
+        if 'subcategoria' in existentes:
+            conn.execute(text(
+                "INSERT INTO subcategoria_despesa (nome, categoria_id) "
+                "SELECT DISTINCT d.subcategoria, d.categoria_id FROM despesa d "
+                "WHERE d.subcategoria IS NOT NULL AND d.categoria_id IS NOT NULL AND NOT EXISTS "
+                "(SELECT 1 FROM subcategoria_despesa s WHERE s.categoria_id = d.categoria_id AND s.nome = d.subcategoria)"))
+            conn.execute(text(
+                "UPDATE despesa SET subcategoria_id = (SELECT MIN(s.id) FROM subcategoria_despesa s "
+                "WHERE s.categoria_id = despesa.categoria_id AND s.nome = despesa.subcategoria)"))
+        # índices sobre os textos impedem o DROP COLUMN no SQLite; os novos são criados por ensure_indexes.
+        # Refletidos do banco, são apagados com o DROP INDEX do dialeto (que em alguns exige a tabela).
+        for indice in Table('despesa', MetaData(), autoload_with=conn).indexes:
+            if {c.name for c in indice.columns} & {'categoria', 'subcategoria'}:
+                indice.drop(conn)
+        for coluna in ('categoria', 'subcategoria'):
+            if coluna in existentes:
+                conn.execute(text(f"ALTER TABLE despesa DROP COLUMN {coluna}"))
+        if 'resumo_mensal' in tabelas:
+            ResumoMensal.__table__.drop(conn)
+            ResumoMensal.__table__.create(conn)
+    return ['despesa', 'resumo_mensal'] if 'resumo_mensal' in tabelas else ['despesa']
@@ -0,0 +1,74 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy.types import BigInteger, TypeDecorator
+
+_CENTAVO = Decimal('0.01')
+
+
+def to_cents(valor):
+    """Reais (float, int, texto ou Decimal) em centavos inteiros; meio centavo arredonda para longe do zero."""
+    if valor is None:
+        return None
+    if isinstance(valor, Dinheiro):
+        return valor.centavos
+    if isinstance(valor, int):
+        return valor * 100
+    # str() usa a representação mais curta do float: 0.1 + 0.2 vira 0.30, não 0.29
+    return int(Decimal(str(valor)).quantize(_CENTAVO, ROUND_HALF_UP) * 100)
+
+
+def formatar(valor):
+    """Valor como aparece no PDF: `R$ 1,234.56`."""
+    return f'R$ {valor:,.2f}'
+
+
+class Dinheiro(float):
+    """Quantia em reais lida de uma coluna em centavos.
+
+    É um float (vai para o JSON e para as planilhas como número, sem conversão), mas somas e
+    subtrações entre quantias são feitas em centavos inteiros, então os totais não acumulam erro.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def de_centavos(cls, centavos):
+        return cls(centavos / 100)
+
+    @property
+    def centavos(self):
+        return round(self * 100)
+
+    def __add__(self, outro):
+        if isinstance(outro, (int, float)):
+            return Dinheiro.de_centavos(self.centavos + to_cents(outro))
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, outro):
+        if isinstance(outro, (int, float)):
+            return Dinheiro.de_centavos(self.centavos - to_cents(outro))
+        return NotImplemented
+
+    def __rsub__(self, outro):
+        if isinstance(outro, (int, float)):
+            return Dinheiro.de_centavos(to_cents(outro) - self.centavos)
+        return NotImplemented
+
+
+class Centavos(TypeDecorator):
+    """Coluna de dinheiro gravada em centavos inteiros.
+
+    No Python o valor continua em reais: o que é gravado ou comparado passa por `to_cents` e o que
+    é lido (inclusive SUM e CASE sobre a coluna) volta como Dinheiro.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else Dinheiro(value / 100)
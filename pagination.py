@@ -0,0 +1,122 @@
+from datetime import datetime
+
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.orm import joinedload
+
+from models import db, Receita, Despesa
+from report_engine import ReportFilters
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+
+def encode_cursor(data, id):
+    """Cursor opaco para a próxima página: `AAAA-MM-DD_id` da última linha entregue."""
+    return f'{data.isoformat()}_{id}'
+
+
+def decode_cursor(cursor):
+    try:
+        data, id = cursor.split('_', 1)
+        return datetime.strptime(data, '%Y-%m-%d').date(), int(id)
+    except ValueError:
+        raise ValueError(f'Cursor inválido: {cursor}')
+
+
+def _limite(args):
+    limite = int(args.get('limite', LIMITE_PADRAO))
+    return max(0, min(limite, LIMITE_MAXIMO))
+
+
+def _pagina(model, stmt, args):
+    """Aplica o keyset `(data, id)` decrescente e busca uma linha a mais para saber se há próxima página."""
+    limite = _limite(args)
+    cursor = args.get('cursor')
+    if cursor:
+        stmt = stmt.where(tuple_(model.data, model.id) < decode_cursor(cursor))
+    stmt = stmt.order_by(model.data.desc(), model.id.desc()).limit(limite + 1)
+    linhas = db.session.execute(stmt).scalars().all() if limite else []
+
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = encode_cursor(linhas[-1].data, linhas[-1].id)
+    return linhas, proximo_cursor
+
+
+def receita_to_dict(r):
+    return {
+        'id': r.id,
+        'descricao': r.descricao,
+        'valor': r.valor,
+        'valor_previsto': r.valor_previsto,
+        'data': r.data.strftime('%d/%m/%Y'),
+        'categoria': r.categoria,
+        'efetivado': bool(r.efetivado)
+    }
+
+
+def despesa_to_dict(d):
+    return {
+        'id': d.id,
+        'descricao': d.descricao,
+        'valor': d.valor,
+        'valor_previsto': d.valor_previsto,
+        'data': d.data.strftime('%d/%m/%Y'),
+        'categoria': d.categoria.nome if d.categoria else None,
+        'subcategoria': d.subcategoria.nome if d.subcategoria else None,
+        'tipo_pagamento': d.tipo_pagamento.nome if d.tipo_pagamento else None,
+        'parcelas': d.parcelas,
+        'parcela_atual': d.parcela_atual,
+        'compra_parcelada_id': d.compra_parcelada_id,
+        'efetivado': bool(d.efetivado)
+    }
+
+
+def receitas_page(args):
+    """Uma página de receitas (mais recentes primeiro) com filtros de categoria, status e mês aplicados no SQL.
+
+    Na primeira página (sem cursor) inclui o resumo usado no card de total:
+    soma do valor efetivo, ou do previsto quando ainda não há valor efetivo.
+    """
+    filtros = ReportFilters.from_args(args)
+    criterios = filtros.receita_criteria()
+    linhas, proximo_cursor = _pagina(Receita, select(Receita).where(*criterios), args)
+    pagina = {'itens': [receita_to_dict(r) for r in linhas], 'proximo_cursor': proximo_cursor}
+
+    if not args.get('cursor'):
+        valor = case((Receita.valor > 0, Receita.valor), else_=Receita.valor_previsto)
+        total, quantidade = db.session.execute(
+            select(func.coalesce(func.sum(valor), 0), func.count(Receita.id))
+            .where(*criterios, valor > 0)
+        ).one()
+        pagina['resumo'] = {'total': total, 'quantidade': quantidade}
+    return pagina
+
+
+def despesas_page(args):
+    """Uma página de despesas (mais recentes primeiro) com filtros de categoria, subcategoria, status e mês no SQL.
+
+    Na primeira página (sem cursor) inclui o resumo usado no card de total (soma do valor previsto).
+    """
+    filtros = ReportFilters.from_args(args)
+    criterios = filtros.despesa_criteria()
+    stmt = (select(Despesa)
+            .options(joinedload(Despesa.tipo_pagamento), joinedload(Despesa.categoria), joinedload(Despesa.subcategoria))
+            .where(*criterios))
+    linhas, proximo_cursor = _pagina(Despesa, stmt, args)
+    pagina = {'itens': [despesa_to_dict(d) for d in linhas], 'proximo_cursor': proximo_cursor}
+
+    if not args.get('cursor'):
+        total, quantidade = db.session.execute(
+            select(func.coalesce(func.sum(Despesa.valor_previsto), 0), func.count(Despesa.id))
+            .where(*criterios)
+        ).one()
+        pagina['resumo'] = {'total': total, 'quantidade': quantidade}
+    return pagina
+
+
+def receita_categories():
+    """Categorias distintas já usadas em receitas (para o filtro da página)."""
+    stmt = select(Receita.categoria).where(Receita.categoria.isnot(None)).distinct().order_by(Receita.categoria)
+    return db.session.execute(stmt).scalars().all()
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from data_version import data_version
+
+LIMITE_PADRAO = 100 * 1024 * 1024  # bytes
+
+
+class PdfCache:
+    """Cache em disco dos PDFs já renderizados, com descarte do menos usado (LRU) acima de `limite_bytes`.
+
+    A chave inclui a versão dos dados (data_version), então qualquer gravação em receitas, despesas
+    ou cadastros faz o relatório ser gerado de novo; as entradas antigas saem pelo LRU. A pasta pode
+    ser compartilhada entre workers; os contadores de acerto são de cada processo.
+    """
+
+    def __init__(self, pasta, limite_bytes=LIMITE_PADRAO):
+        self.pasta = pasta
+        self.limite_bytes = limite_bytes
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    def _chave(self, chave_relatorio):
+        return hashlib.sha1(f'{data_version.current()}|{chave_relatorio}'.encode('utf-8')).hexdigest()
+
+    def _caminhos(self, chave):
+        base = os.path.join(self.pasta, chave)
+        return base + '.pdf', base + '.json'
+
+    def get(self, chave_relatorio, detalhes=None):
+        """`(arquivo aberto, nome do download)` do PDF em cache, ou None.
+
+        O dict `detalhes`, se informado, recebe o que foi guardado junto com o PDF no `put`.
+        """
+        caminho_pdf, caminho_meta = self._caminhos(self._chave(chave_relatorio))
+        try:
+            with open(caminho_meta, encoding='utf-8') as meta:
+                guardado = json.load(meta)
+            nome = guardado.pop('nome')
+            arquivo = open(caminho_pdf, 'rb')
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.falhas += 1
+            return None
+        # mtime marca o último uso: é por ele que o LRU escolhe o que descartar
+        os.utime(caminho_pdf)
+        with self._lock:
+            self.acertos += 1
+        if detalhes is not None:
+            detalhes.update(guardado)
+        return arquivo, nome
+
+    def put(self, chave_relatorio, renderizar, detalhes=None):
+        """Renderiza com `renderizar(arquivo) -> nome do download`, guarda e devolve `(arquivo aberto, nome)`.
+
+        `detalhes()`, se informado, é chamado depois de renderizar e o dict devolvido fica guardado com o PDF.
+        """
+        chave = self._chave(chave_relatorio)
+        caminho_pdf, caminho_meta = self._caminhos(chave)
+        fd, temporario = tempfile.mkstemp(dir=self.pasta, prefix='.pdf-')
+        try:
+            with os.fdopen(fd, 'wb') as arquivo:
+                nome = renderizar(arquivo)
+            with open(caminho_meta, 'w', encoding='utf-8') as meta:
+                json.dump({**(detalhes() if detalhes else {}), 'nome': nome}, meta)
+            os.replace(temporario, caminho_pdf)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        arquivo = open(caminho_pdf, 'rb')
+        self._descartar_antigos(manter=caminho_pdf)
+        return arquivo, nome
+
+    def _entradas(self):
+        entradas = []
+        with os.scandir(self.pasta) as itens:
+            for item in itens:
+                if item.name.endswith('.pdf') and not item.name.startswith('.'):
+                    try:
+                        estado = item.stat()
+                    except FileNotFoundError:
+                        continue
+                    entradas.append((estado.st_mtime, estado.st_size, item.path))
+        return entradas
+
+    def _descartar_antigos(self, manter):
+        entradas = sorted(self._entradas())
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in entradas:
+            if total <= self.limite_bytes:
+                break
+            if caminho == manter:
+                continue
+            for arquivo in (caminho, caminho[:-len('.pdf')] + '.json'):
+                try:
+                    os.remove(arquivo)
+                except FileNotFoundError:
+                    pass
+            total -= tamanho
+
+    def stats(self):
+        entradas = self._entradas()
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / total, 4) if total else 0.0,
+                'entradas': len(entradas),
+                'bytes': sum(tamanho for _, tamanho, _ in entradas),
+                'limite_bytes': self.limite_bytes,
+            }
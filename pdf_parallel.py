@@ -0,0 +1,171 @@
+import math
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from sqlalchemy import select
+
+from database import configure_engine, engine_options
+from models import db as _db, Receita, Despesa, TipoPagamento
+from pdf_generator import render_segment
+from report_engine import ReportFilters, compute_totals
+import report_theme as tema
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+except ImportError:  # dependência opcional: sem ela o relatório é montado num processo só
+    PdfReader = PdfWriter = None
+
+# Sem a pypdf, PDF_PROCESSES > 1 não tem efeito (o app avisa ao subir)
+DISPONIVEL = PdfWriter is not None
+
+# Abaixo disso o custo de subir os processos não compensa
+LINHAS_MINIMAS_POR_SEGMENTO = 2000
+
+_MODELS = {'Receita': Receita, 'Despesa': Despesa, 'TipoPagamento': TipoPagamento}
+
+
+def _iniciar_processo(url_banco):
+    """Cada processo do pool tem seu próprio app/conexão; nada do processo pai é herdado (spawn)."""
+    from flask import Flask
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url_banco
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url_banco)
+    _db.init_app(app)
+    app.app_context().push()
+    configure_engine(_db.engine)
+
+
+def _renderizar_parte(caminho, args, segmento, gerado_em):
+    contagem = {'linhas_processadas': 0, 'paginas': 0}
+
+    def avisar(**campos):
+        contagem.update((campo, valor) for campo, valor in campos.items() if campo in contagem)
+
+    with open(caminho, 'wb') as arquivo:
+        nome = render_segment(arquivo, args, _db, _MODELS, avisar, segmento, gerado_em, numerar_paginas=False)
+    return nome, contagem['linhas_processadas'], contagem['paginas']
+
+
+def _intervalos(model, criterios, quantidade, tamanho, linhas_por_tabela):
+    """Divide as linhas de `model` em intervalos de chaves `(data, id)` com até `tamanho` linhas cada.
+
+    `tamanho` é arredondado para um número inteiro de sub-tabelas, para as tabelas saírem iguais
+    às do relatório montado num processo só. Devolve `(intervalo, incompleto)`; só o último
+    intervalo pode ter menos de `tamanho` linhas.
+    """
+    tamanho = math.ceil(tamanho / linhas_por_tabela) * linhas_por_tabela
+    base = select(model.data, model.id).where(*criterios).order_by(model.data, model.id)
+    cortes = [tuple(_db.session.execute(base.offset(deslocamento).limit(1)).one())
+              for deslocamento in range(tamanho, quantidade, tamanho)]
+    limites = [None, *cortes, None]
+    return [((inicio, fim), quantidade - i * tamanho < tamanho)
+            for i, (inicio, fim) in enumerate(zip(limites, limites[1:]))]
+
+
+def _segmentos(filtros, totais, tamanho):
+    """Partes do relatório: o cabeçalho vai com a primeira, e um resto pequeno de receitas vai junto
+    com o começo das despesas, como ficaria no relatório montado de uma vez."""
+    vazio = {'cabecalho': False, 'receitas': None, 'titulo_receitas': False, 'fim_receitas': False,
+             'despesas': None, 'titulo_despesas': False}
+    segmentos = []
+    if totais['quantidade_receitas']:
+        intervalos = _intervalos(Receita, filtros.receita_criteria(), totais['quantidade_receitas'], tamanho,
+                                 tema.LINHAS_POR_TABELA_RECEITAS)
+        for i, (intervalo, incompleto) in enumerate(intervalos):
+            segmentos.append(dict(vazio, receitas=intervalo, titulo_receitas=i == 0,
+                                  fim_receitas=i == len(intervalos) - 1))
+        resto_pequeno = incompleto
+    else:
+        resto_pequeno = True
+    if totais['quantidade_despesas']:
+        intervalos = _intervalos(Despesa, filtros.despesa_criteria(), totais['quantidade_despesas'], tamanho,
+                                 tema.LINHAS_POR_TABELA_DESPESAS)
+        for i, (intervalo, _) in enumerate(intervalos):
+            if i == 0 and resto_pequeno and segmentos:
+                segmentos[-1].update(despesas=intervalo, titulo_despesas=True)
+            else:
+                segmentos.append(dict(vazio, despesas=intervalo, titulo_despesas=i == 0))
+    if not segmentos:
+        segmentos.append(dict(vazio))
+    segmentos[0]['cabecalho'] = True
+    return segmentos
+
+
+def _numerar_paginas(paginas):
+    """Escreve "Página N" no rodapé de cada página já juntada, onde o add_footer escreveria.
+
+    Acrescenta o texto direto ao conteúdo de cada página: bem mais barato que sobrepor uma
+    página inteira com `merge_page`, que reinterpreta o conteúdo todo.
+    """
+    width, height = tema.PAGINA
+    fonte = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+        NameObject('/Encoding'): NameObject('/WinAnsiEncoding'),
+    })
+    for numero, pagina in enumerate(paginas, 1):
+        texto = f'Página {numero}'
+        x = width / 2 - stringWidth(texto, 'Helvetica', 8) / 2
+        recursos = pagina['/Resources'].get_object()
+        fontes = recursos.setdefault(NameObject('/Font'), DictionaryObject()).get_object()
+        fontes[NameObject('/FNumeracao')] = fonte
+        comando = f'BT /FNumeracao 8 Tf 1 0 0 1 {x:.2f} 30 Tm ('.encode('ascii') + texto.encode('cp1252') + b') Tj ET\n'
+        conteudo = DecodedStreamObject()
+        # q/Q isolam o estado gráfico deixado pelo conteúdo original
+        conteudo.set_data(b'q\n' + pagina.get_contents().get_data() + b'\nQ\n' + comando)
+        pagina.replace_contents(conteudo)
+        pagina.compress_content_streams()
+
+
+def render_in_segments(arquivo, args, db, models, processos, avisar):
+    """Monta o relatório em partes num pool de processos e junta tudo com numeração contínua.
+
+    Devolve o nome do download, ou None quando não vale a pena (pypdf ausente, relatório pequeno,
+    banco em memória): aí quem chamou monta o relatório num processo só.
+    """
+    url_banco = db.engine.url
+    if PdfWriter is None or (url_banco.get_backend_name() == 'sqlite' and url_banco.database in (None, '', ':memory:')):
+        return None
+    filtros = ReportFilters.from_args(args, strict=False)
+    totais = compute_totals(filtros)
+    total_linhas = totais['quantidade_receitas'] + totais['quantidade_despesas']
+    if total_linhas < 2 * LINHAS_MINIMAS_POR_SEGMENTO:
+        return None
+    avisar(total_linhas=total_linhas)
+    args = dict(args.items())  # vai para outros processos: só texto, sem o objeto da requisição
+
+    tamanho = max(LINHAS_MINIMAS_POR_SEGMENTO, math.ceil(total_linhas / processos))
+    segmentos = _segmentos(filtros, totais, tamanho)
+    gerado_em = datetime.now()
+
+    with tempfile.TemporaryDirectory(prefix='relatorio-') as pasta:
+        caminhos = [os.path.join(pasta, f'{i}.pdf') for i in range(len(segmentos))]
+        nome = None
+        linhas = paginas = 0
+        with ProcessPoolExecutor(max_workers=min(processos, len(segmentos)),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_iniciar_processo,
+                                 initargs=(url_banco.render_as_string(hide_password=False),)) as pool:
+            futuros = {pool.submit(_renderizar_parte, caminho, args, segmento, gerado_em): i
+                       for i, (caminho, segmento) in enumerate(zip(caminhos, segmentos))}
+            for futuro in as_completed(futuros):
+                nome_parte, linhas_parte, paginas_parte = futuro.result()
+                if futuros[futuro] == 0:
+                    nome = nome_parte
+                linhas += linhas_parte
+                paginas += paginas_parte
+                avisar(linhas_processadas=linhas, paginas=paginas)
+
+        writer = PdfWriter()
+        for caminho in caminhos:
+            for pagina in PdfReader(caminho).pages:
+                writer.add_page(pagina)
+        _numerar_paginas(writer.pages)
+        writer.write(arquivo)
+    return nome
@@ -0,0 +1,147 @@
+import calendar
+from datetime import date, datetime
+from itertools import accumulate
+
+from sqlalchemy import case, false, func, literal, null, or_, select, union_all
+
+from models import db, Receita, Despesa
+from money import to_cents
+
+try:
+    import numpy as np
+except ImportError:  # dependência opcional: sem ela as somas são feitas em Python puro
+    np = None
+
+HORIZONTE_PADRAO = 12  # meses
+HORIZONTE_MAXIMO = 120
+GRANULARIDADES = ('dia', 'mes')
+
+
+def _fim_do_horizonte(inicio, meses):
+    """Último dia do `meses`-ésimo mês contado a partir do mês de `inicio`."""
+    indice = inicio.year * 12 + inicio.month - 1 + meses - 1
+    ano, mes = divmod(indice, 12)
+    return date(ano, mes + 1, calendar.monthrange(ano, mes + 1)[1])
+
+
+def _movimentos(model, inicio, fim):
+    """Movimento por dia de `model` no horizonte, mais o realizado antes de `inicio` (data nula).
+
+    Lançamentos efetivados entram pelo `valor`; pendentes pelo `valor_previsto`. Pendentes com data
+    anterior a `inicio` (atrasados) continuam esperados e entram no primeiro dia.
+    """
+    tipo = literal('receita' if model is Receita else 'despesa').label('tipo')
+    pendente = func.coalesce(model.efetivado, false()) == false()
+    previstos = (select(tipo, model.data.label('data'),
+                        func.sum(case((pendente, model.valor_previsto), else_=model.valor)).label('total'))
+                 .where(model.data <= fim, or_(model.data >= inicio, pendente))
+                 .group_by(model.data))
+    realizado = (select(tipo, null().label('data'), func.coalesce(func.sum(model.valor), 0).label('total'))
+                 .where(model.efetivado == True, model.data < inicio))
+    return previstos, realizado
+
+
+def _somar_por_periodo(indices, valores, quantidade):
+    """Soma dos centavos por período (floats inteiros no numpy: exatos até 2**53 centavos)."""
+    if np is not None:
+        return np.bincount(np.asarray(indices, dtype=np.intp), weights=np.asarray(valores, dtype=float),
+                           minlength=quantidade)
+    totais = [0] * quantidade
+    for indice, valor in zip(indices, valores):
+        totais[indice] += valor
+    return totais
+
+
+def _saldos(saldo_inicial, entradas, saidas):
+    """Saldo ao fim de cada período: soma acumulada das entradas menos saídas."""
+    if np is not None:
+        return saldo_inicial + np.cumsum(entradas - saidas)
+    return list(accumulate((e - s for e, s in zip(entradas, saidas)), initial=saldo_inicial))[1:]
+
+
+def _em_reais(centavos):
+    if np is not None:
+        return (np.asarray(centavos) / 100).tolist()
+    return [valor / 100 for valor in centavos]
+
+
+def compute_projection(inicio=None, meses=HORIZONTE_PADRAO, granularidade='mes', saldo_inicial=None):
+    """Projeta o saldo de `inicio` (hoje por padrão) até o fim do `meses`-ésimo mês.
+
+    Uma consulta agrupada por dia traz todo o horizonte (e o saldo realizado até `inicio`, se
+    `saldo_inicial` não for informado); o saldo de cada dia ou mês sai de somas acumuladas sobre
+    esses totais, sem uma consulta por período.
+    """
+    inicio = inicio or date.today()
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade}. Use {' ou '.join(GRANULARIDADES)}.")
+    if not 1 <= meses <= HORIZONTE_MAXIMO:
+        raise ValueError(f'O horizonte deve ter entre 1 e {HORIZONTE_MAXIMO} meses.')
+    fim = _fim_do_horizonte(inicio, meses)
+
+    partes = []
+    for model in (Receita, Despesa):
+        partes.extend(_movimentos(model, inicio, fim))
+    linhas = db.session.execute(union_all(*partes)).all()
+
+    # tudo em centavos inteiros até a saída
+    realizado = {'receita': 0, 'despesa': 0}
+    movimentos = {'receita': ([], []), 'despesa': ([], [])}
+    if granularidade == 'dia':
+        quantidade = (fim - inicio).days + 1
+        indice = lambda data: (data - inicio).days
+    else:
+        quantidade = meses
+        indice = lambda data: (data.year - inicio.year) * 12 + data.month - inicio.month
+    for row in linhas:
+        if row.data is None:
+            realizado[row.tipo] += row.total.centavos if row.total else 0
+        else:
+            indices, valores = movimentos[row.tipo]
+            indices.append(max(indice(row.data), 0))  # atrasados caem no primeiro período
+            valores.append(row.total.centavos if row.total else 0)
+
+    if saldo_inicial is None:
+        saldo_inicial = realizado['receita'] - realizado['despesa']
+    else:
+        saldo_inicial = to_cents(saldo_inicial)
+    entradas = _somar_por_periodo(*movimentos['receita'], quantidade)
+    saidas = _somar_por_periodo(*movimentos['despesa'], quantidade)
+    saldos = _saldos(saldo_inicial, entradas, saidas)
+
+    if granularidade == 'dia':
+        primeiro = inicio.toordinal()
+        rotulos = [date.fromordinal(primeiro + i).isoformat() for i in range(quantidade)]
+    else:
+        rotulos = [f'{ano:04d}-{mes + 1:02d}' for ano, mes in
+                   (divmod(inicio.year * 12 + inicio.month - 1 + i, 12) for i in range(quantidade))]
+    saldos = _em_reais(saldos)
+    menor = min(range(quantidade), key=saldos.__getitem__)
+
+    # séries em colunas (um item por período), no formato que os gráficos consomem
+    return {
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'granularidade': granularidade,
+        'saldo_inicial': saldo_inicial / 100,
+        'saldo_final': saldos[-1],
+        'total_entradas': int(sum(entradas)) / 100,
+        'total_saidas': int(sum(saidas)) / 100,
+        'menor_saldo': {'periodo': rotulos[menor], 'saldo': saldos[menor]},
+        'periodos': rotulos,
+        'entradas': _em_reais(entradas),
+        'saidas': _em_reais(saidas),
+        'saldos': saldos,
+    }
+
+
+def projection_from_args(args):
+    """Lê `inicio` (AAAA-MM-DD), `meses`, `granularidade` e `saldo_inicial` de `request.args`."""
+    inicio = args.get('inicio')
+    saldo_inicial = args.get('saldo_inicial')
+    return compute_projection(
+        inicio=datetime.strptime(inicio, '%Y-%m-%d').date() if inicio else None,
+        meses=int(args.get('meses') or HORIZONTE_PADRAO),
+        granularidade=args.get('granularidade') or 'mes',
+        saldo_inicial=float(saldo_inicial) if saldo_inicial else None,
+    )
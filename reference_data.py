@@ -0,0 +1,146 @@
+import hashlib
+import json
+import threading
+import time
+
+from sqlalchemy import select
+
+from models import db, CategoriaDespesa, SubcategoriaDespesa, TipoPagamento
+
+TTL_PADRAO = 60  # segundos; com o marcador compartilhado é só uma garantia a mais
+
+
+class ReferenceData:
+    """Retrato imutável de categorias, subcategorias e tipos de pagamento.
+
+    Guarda dicts simples (não objetos do ORM), que os templates acessam como `categoria.nome`
+    e que podem ser compartilhados entre requisições sem sessão aberta.
+    """
+
+    def __init__(self, categorias, tipos_pagamento):
+        self.categorias = categorias  # ordem de id, cada uma com a lista `subcategorias`
+        self.tipos_pagamento = sorted(tipos_pagamento, key=lambda t: t['nome'])
+        self.tipos_ativos = [t for t in tipos_pagamento if t['ativo']]  # ordem de id
+        self._subcategorias = {c['id']: c['subcategorias'] for c in categorias}
+        conteudo = json.dumps([categorias, tipos_pagamento], sort_keys=True, default=str)
+        self.etag = hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+    def subcategorias(self, categoria_id):
+        return self._subcategorias.get(categoria_id, [])
+
+    def category_tree(self):
+        """Categorias com suas subcategorias, para montar os filtros no navegador de uma vez só."""
+        return [
+            {'id': c['id'], 'nome': c['nome'],
+             'subcategorias': [{'id': s['id'], 'nome': s['nome']} for s in c['subcategorias']]}
+            for c in self.categorias
+        ]
+
+
+def _carregar():
+    subcategorias = {}
+    for s in db.session.execute(select(SubcategoriaDespesa.id, SubcategoriaDespesa.nome, SubcategoriaDespesa.descricao,
+                                       SubcategoriaDespesa.categoria_id).order_by(SubcategoriaDespesa.id)):
+        subcategorias.setdefault(s.categoria_id, []).append(dict(s._mapping))
+    categorias = [
+        dict(c._mapping, subcategorias=subcategorias.get(c.id, []))
+        for c in db.session.execute(select(CategoriaDespesa.id, CategoriaDespesa.nome, CategoriaDespesa.descricao)
+                                    .order_by(CategoriaDespesa.id))
+    ]
+    tipos = [
+        dict(t._mapping)
+        for t in db.session.execute(select(TipoPagamento.id, TipoPagamento.nome, TipoPagamento.descricao, TipoPagamento.ativo)
+                                    .order_by(TipoPagamento.id))
+    ]
+    return ReferenceData(categorias, tipos)
+
+
+def _nome(texto):
+    return (texto or '').strip().lower()
+
+
+class CategoryResolver:
+    """Ids de categoria e subcategoria de despesa a partir dos nomes, criando as que ainda não existem.
+
+    As duas tabelas são lidas uma vez e as pesquisas seguintes ficam em memória, sem diferenciar
+    maiúsculas nem espaços nas pontas. Não faz commit; `criadas` conta as categorias e
+    subcategorias novas (quem usa o ReferenceCache precisa invalidá-lo).
+    """
+
+    def __init__(self):
+        self.categorias = {}
+        for id, nome in db.session.execute(select(CategoriaDespesa.id, CategoriaDespesa.nome).order_by(CategoriaDespesa.id)):
+            self.categorias.setdefault(_nome(nome), id)
+        self.subcategorias = {}
+        for id, nome, categoria_id in db.session.execute(select(SubcategoriaDespesa.id, SubcategoriaDespesa.nome,
+                                                                SubcategoriaDespesa.categoria_id)
+                                                         .order_by(SubcategoriaDespesa.id)):
+            self.subcategorias.setdefault((categoria_id, _nome(nome)), id)
+        self.criadas = 0
+
+    def _criar(self, objeto):
+        db.session.add(objeto)
+        db.session.flush()
+        self.criadas += 1
+        return objeto.id
+
+    def ids(self, categoria, subcategoria=None):
+        """`(categoria_id, subcategoria_id)`; nomes vazios dão None e subcategoria sem categoria é ignorada."""
+        if not _nome(categoria):
+            return None, None
+        categoria_id = self.categorias.get(_nome(categoria))
+        if categoria_id is None:
+            categoria_id = self.categorias[_nome(categoria)] = self._criar(CategoriaDespesa(nome=categoria.strip()))
+        if not _nome(subcategoria):
+            return categoria_id, None
+        chave = (categoria_id, _nome(subcategoria))
+        subcategoria_id = self.subcategorias.get(chave)
+        if subcategoria_id is None:
+            subcategoria_id = self.subcategorias[chave] = self._criar(
+                SubcategoriaDespesa(nome=subcategoria.strip(), categoria_id=categoria_id))
+        return categoria_id, subcategoria_id
+
+
+class ReferenceCache:
+    """Cache por processo dos dados de referência, versionado.
+
+    Cada `invalidate()` avança a versão; um retrato carregado enquanto outra alteração acontecia
+    não é guardado, para não sobrescrever a invalidação. Com `marcador` (um DataVersion com arquivo,
+    data_version.reference_version), `invalidate()` também troca a versão compartilhada e `get()`
+    recarrega quando ela muda, então a alteração vale na requisição seguinte em todos os workers;
+    o TTL fica só como garantia.
+    """
+
+    def __init__(self, ttl=TTL_PADRAO, relogio=time.monotonic, marcador=None):
+        self.ttl = ttl
+        self.relogio = relogio
+        self.marcador = marcador
+        self.versao = 0
+        self._dados = None
+        self._versao_compartilhada = None
+        self._expira_em = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        # lida antes de carregar: se mudar durante a carga, o retrato fica com a versão antiga e é recarregado
+        compartilhada = self.marcador.current() if self.marcador else None
+        with self._lock:
+            if (self._dados is not None and self._expira_em > self.relogio()
+                    and self._versao_compartilhada == compartilhada):
+                return self._dados
+            versao = self.versao
+
+        dados = _carregar()
+        with self._lock:
+            if versao == self.versao:
+                self._dados = dados
+                self._versao_compartilhada = compartilhada
+                self._expira_em = self.relogio() + self.ttl
+        return dados
+
+    def invalidate(self):
+        with self._lock:
+            self.versao += 1
+            self._dados = None
+        if self.marcador:
+            self.marcador.bump()
@@ -0,0 +1,291 @@
+import calendar
+import copy
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, String, and_, cast, func, literal, null, or_, select, union_all
+
+from models import db, Receita, Despesa, TipoPagamento, ResumoMensal, CategoriaDespesa, SubcategoriaDespesa
+from money import Dinheiro
+
+
+class ReportFilters:
+    """Filtros de relatório compilados uma única vez a partir dos parâmetros da requisição."""
+
+    def __init__(self, categoria=None, subcategoria=None, data_inicio=None, data_fim=None,
+                 status=None, tipo_pagamento_id=None):
+        self.categoria = categoria or None
+        self.subcategoria = subcategoria or None
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.status = status if status in ('efetivado', 'pendente') else None
+        self.tipo_pagamento_id = tipo_pagamento_id
+
+    @classmethod
+    def from_args(cls, args, strict=True):
+        """Lê os filtros de `request.args`.
+
+        Com `strict=False` datas e ids inválidos são ignorados (comportamento do PDF);
+        caso contrário o ValueError é propagado para a rota.
+        """
+        def _parse(valor, conversor):
+            if not valor:
+                return None
+            try:
+                return conversor(valor)
+            except ValueError:
+                if strict:
+                    raise
+                return None
+
+        def _data(valor):
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+
+        data_inicio = _parse(args.get('data_inicio'), _data)
+        data_fim = _parse(args.get('data_fim'), _data)
+
+        # `mes` (AAAA-MM) restringe o período ao mês informado
+        mes = _parse(args.get('mes'), lambda valor: datetime.strptime(valor, '%Y-%m').date())
+        if mes:
+            fim_mes = mes.replace(day=calendar.monthrange(mes.year, mes.month)[1])
+            data_inicio = max(data_inicio, mes) if data_inicio else mes
+            data_fim = min(data_fim, fim_mes) if data_fim else fim_mes
+
+        return cls(
+            categoria=args.get('categoria'),
+            subcategoria=args.get('subcategoria'),
+            data_inicio=data_inicio,
+            data_fim=data_fim,
+            status=args.get('status'),
+            tipo_pagamento_id=_parse(args.get('tipo_pagamento_id'), int),
+        )
+
+    def cache_key(self):
+        """Forma normalizada dos filtros, para compor ETags e chaves de cache."""
+        return (f'{self.categoria or ""}|{self.subcategoria or ""}|{self.data_inicio or ""}|{self.data_fim or ""}|'
+                f'{self.status or ""}|{self.tipo_pagamento_id or ""}')
+
+    def with_period(self, data_inicio, data_fim):
+        """Cópia dos filtros restrita a outro período."""
+        filtros = copy.copy(self)
+        filtros.data_inicio = data_inicio
+        filtros.data_fim = data_fim
+        return filtros
+
+    def _categorias_de_despesa(self):
+        """Filtros de categoria e subcategoria das despesas: os nomes são procurados só nas tabelas de
+        categorias (pequenas) e as despesas são filtradas pelos ids."""
+        criterios = []
+        if self.categoria:
+            criterios.append(('categoria_id', select(CategoriaDespesa.id).where(CategoriaDespesa.nome == self.categoria)))
+        if self.subcategoria:
+            criterios.append(('subcategoria_id',
+                              select(SubcategoriaDespesa.id).where(SubcategoriaDespesa.nome == self.subcategoria)))
+        return criterios
+
+    def _criterios_comuns(self, model):
+        criterios = []
+        if self.data_inicio:
+            criterios.append(model.data >= self.data_inicio)
+        if self.data_fim:
+            criterios.append(model.data <= self.data_fim)
+        if self.status == 'efetivado':
+            criterios.append(model.efetivado == True)
+        elif self.status == 'pendente':
+            criterios.append(model.efetivado == False)
+        return criterios
+
+    def receita_criteria(self):
+        """Cláusulas WHERE para Receita (subcategoria e forma de pagamento não se aplicam)."""
+        criterios = self._criterios_comuns(Receita)
+        if self.categoria:
+            criterios.append(Receita.categoria == self.categoria)
+        return criterios
+
+    def despesa_criteria(self):
+        """Cláusulas WHERE para Despesa."""
+        criterios = self._criterios_comuns(Despesa)
+        criterios.extend(getattr(Despesa, coluna).in_(ids) for coluna, ids in self._categorias_de_despesa())
+        if self.tipo_pagamento_id:
+            criterios.append(Despesa.tipo_pagamento_id == self.tipo_pagamento_id)
+        return criterios
+
+    def monthly_summary_criteria(self, mes_inicio, mes_fim):
+        """Cláusulas WHERE para o ResumoMensal entre dois meses (inclusive; None = sem limite)."""
+        criterios = []
+        if mes_inicio:
+            criterios.append(ResumoMensal.mes >= mes_inicio)
+        if mes_fim:
+            criterios.append(ResumoMensal.mes <= mes_fim)
+        if self.status == 'efetivado':
+            criterios.append(ResumoMensal.efetivado == True)
+        elif self.status == 'pendente':
+            criterios.append(ResumoMensal.efetivado == False)
+
+        criterios_receita = [ResumoMensal.tipo == 'receita']
+        if self.categoria:
+            criterios_receita.append(ResumoMensal.categoria == self.categoria)
+        criterios_despesa = [ResumoMensal.tipo == 'despesa']
+        criterios_despesa.extend(getattr(ResumoMensal, coluna).in_(ids) for coluna, ids in self._categorias_de_despesa())
+        if self.tipo_pagamento_id:
+            criterios_despesa.append(ResumoMensal.tipo_pagamento_id == self.tipo_pagamento_id)
+        criterios.append(or_(and_(*criterios_receita), and_(*criterios_despesa)))
+        return criterios
+
+
+def _fim_do_mes(data):
+    return data.replace(day=calendar.monthrange(data.year, data.month)[1])
+
+
+def _dividir_periodo(data_inicio, data_fim):
+    """Separa o período em meses completos (lidos do ResumoMensal) e bordas parciais (lidas das linhas brutas).
+
+    Retorna `(meses, bordas)`: `meses` é `(primeiro_mes, ultimo_mes)` — None em cada ponta significa sem
+    limite — ou None quando não há mês completo; `bordas` é a lista de intervalos `(inicio, fim)`.
+    """
+    if data_inicio and data_fim and data_inicio > data_fim:
+        return None, []
+
+    bordas = []
+    primeiro_mes = ultimo_mes = None
+    if data_inicio and data_inicio.day != 1:
+        fim_mes = _fim_do_mes(data_inicio)
+        bordas.append((data_inicio, min(fim_mes, data_fim) if data_fim else fim_mes))
+        primeiro_mes = fim_mes + timedelta(days=1)
+    else:
+        primeiro_mes = data_inicio
+
+    if data_fim and data_fim != _fim_do_mes(data_fim):
+        inicio_mes = data_fim.replace(day=1)
+        # no mesmo mês a borda inicial já cobre até data_fim
+        if not bordas or inicio_mes > bordas[0][1]:
+            bordas.append((max(inicio_mes, data_inicio) if data_inicio else inicio_mes, data_fim))
+        ultimo_mes = (inicio_mes - timedelta(days=1)).replace(day=1)
+    elif data_fim:
+        ultimo_mes = data_fim.replace(day=1)
+
+    if primeiro_mes and ultimo_mes and primeiro_mes > ultimo_mes:
+        return None, bordas
+    return (primeiro_mes, ultimo_mes), bordas
+
+
+def _com_nome_da_categoria(agregado):
+    """Linhas `(tipo, categoria, total)` de um agrupamento por categoria: o nome das categorias de
+    despesa vem de um join com CategoriaDespesa depois do GROUP BY (que agrupa pelo id)."""
+    return (select(agregado.c.tipo, func.coalesce(agregado.c.categoria, CategoriaDespesa.nome).label('categoria'),
+                   agregado.c.total)
+            .outerjoin(CategoriaDespesa, agregado.c.categoria_id == CategoriaDespesa.id))
+
+
+def _totais_resumo_mensal(filters, mes_inicio, mes_fim):
+    """Totais por categoria dos meses completos, lidos do ResumoMensal."""
+    agregado = (select(ResumoMensal.tipo, ResumoMensal.categoria, ResumoMensal.categoria_id,
+                       func.sum(ResumoMensal.total_valor).label('total'))
+                .where(*filters.monthly_summary_criteria(mes_inicio, mes_fim))
+                .group_by(ResumoMensal.tipo, ResumoMensal.categoria, ResumoMensal.categoria_id)
+                .having(func.sum(ResumoMensal.quantidade) > 0)
+                .subquery())
+    return db.session.execute(_com_nome_da_categoria(agregado)).all()
+
+
+def _totais_por_categoria(filters):
+    """Uma única varredura agrupada por tabela, unidas num só round-trip."""
+    receitas = (select(literal('receita').label('tipo'),
+                       Receita.categoria.label('categoria'),
+                       cast(null(), Integer).label('categoria_id'),
+                       func.sum(Receita.valor).label('total'))
+                .where(*filters.receita_criteria())
+                .group_by(Receita.categoria))
+    despesas = (select(literal('despesa').label('tipo'),
+                       cast(null(), String(100)).label('categoria'),
+                       Despesa.categoria_id,
+                       func.sum(Despesa.valor).label('total'))
+                .where(*filters.despesa_criteria())
+                .group_by(Despesa.categoria_id))
+    agregado = union_all(receitas, despesas).subquery()
+    return db.session.execute(_com_nome_da_categoria(agregado)).all()
+
+
+def _ultimas_transacoes(filters, limite):
+    """Últimas receitas e despesas num só round-trip (UNION ALL de duas subconsultas limitadas)."""
+    receitas = (select(literal('receita').label('tipo'),
+                       Receita.id, Receita.descricao, Receita.valor, Receita.data, Receita.categoria,
+                       cast(null(), String(100)).label('subcategoria'),
+                       Receita.efetivado)
+                .where(*filters.receita_criteria())
+                .order_by(Receita.data.desc(), Receita.id.desc())
+                .limit(limite)
+                .subquery())
+    despesas = (select(literal('despesa').label('tipo'),
+                       Despesa.id, Despesa.descricao, Despesa.valor, Despesa.data,
+                       CategoriaDespesa.nome.label('categoria'),
+                       SubcategoriaDespesa.nome.label('subcategoria'),
+                       Despesa.efetivado)
+                .outerjoin(CategoriaDespesa, Despesa.categoria_id == CategoriaDespesa.id)
+                .outerjoin(SubcategoriaDespesa, Despesa.subcategoria_id == SubcategoriaDespesa.id)
+                .where(*filters.despesa_criteria())
+                .order_by(Despesa.data.desc(), Despesa.id.desc())
+                .limit(limite)
+                .subquery())
+    rows = db.session.execute(union_all(select(receitas), select(despesas))).all()
+    rows.sort(key=lambda r: (r.data, r.id), reverse=True)
+    return ([r for r in rows if r.tipo == 'receita'],
+            [r for r in rows if r.tipo == 'despesa'])
+
+
+def compute_summary(filters, limite_ultimas=5):
+    """Calcula o resumo de `/api/relatorios/resumo` (totais, categorias e últimas transações)."""
+    # meses completos vêm do ResumoMensal; só as bordas parciais do período varrem as linhas brutas
+    meses, bordas = _dividir_periodo(filters.data_inicio, filters.data_fim)
+    linhas = _totais_resumo_mensal(filters, *meses) if meses else []
+    for inicio, fim in bordas:
+        linhas.extend(_totais_por_categoria(filters.with_period(inicio, fim)))
+
+    totais = defaultdict(Dinheiro)  # somas em centavos: o total não depende da ordem das linhas
+    for row in linhas:
+        totais[(row.tipo, row.categoria)] += row.total or 0
+
+    receitas_categoria = []
+    despesas_categoria = []
+    for (tipo, categoria), total in sorted(totais.items(), key=lambda item: (item[0][1] is not None, item[0][1] or '')):
+        destino = receitas_categoria if tipo == 'receita' else despesas_categoria
+        destino.append({'categoria': categoria, 'total': total})
+
+    total_receitas = sum(item['total'] or 0 for item in receitas_categoria)
+    total_despesas = sum(item['total'] or 0 for item in despesas_categoria)
+
+    ultimas_receitas, ultimas_despesas = _ultimas_transacoes(filters, limite_ultimas)
+
+    return {
+        'total_receitas': total_receitas,
+        'total_despesas': total_despesas,
+        'saldo_atual': total_receitas - total_despesas,
+        'receitas_categoria': receitas_categoria,
+        'despesas_categoria': despesas_categoria,
+        'ultimas_receitas': [{'descricao': r.descricao, 'valor': r.valor, 'data': r.data.strftime('%d/%m/%Y'), 'categoria': r.categoria, 'efetivado': bool(r.efetivado)} for r in ultimas_receitas],
+        'ultimas_despesas': [{'descricao': d.descricao, 'valor': d.valor, 'data': d.data.strftime('%d/%m/%Y'), 'categoria': d.categoria, 'subcategoria': d.subcategoria, 'efetivado': bool(d.efetivado)} for d in ultimas_despesas]
+    }
+
+
+def compute_totals(filters):
+    """Totais e quantidades de receitas e despesas numa única consulta."""
+    receitas = (select(literal('receita').label('tipo'),
+                       func.coalesce(func.sum(Receita.valor), 0).label('total'),
+                       func.count(Receita.id).label('quantidade'))
+                .where(*filters.receita_criteria()))
+    despesas = (select(literal('despesa').label('tipo'),
+                       func.coalesce(func.sum(Despesa.valor), 0).label('total'),
+                       func.count(Despesa.id).label('quantidade'))
+                .where(*filters.despesa_criteria()))
+    rows = {row.tipo: row for row in db.session.execute(union_all(receitas, despesas))}
+    return {
+        'total_receitas': rows['receita'].total,
+        'total_despesas': rows['despesa'].total,
+        'quantidade_receitas': rows['receita'].quantidade,
+        'quantidade_despesas': rows['despesa'].quantidade,
+    }
+
+
+def payment_type_names():
+    """Mapa id -> nome de todos os tipos de pagamento, carregado numa única consulta."""
+    return dict(db.session.execute(select(TipoPagamento.id, TipoPagamento.nome)).all())
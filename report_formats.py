@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+import tempfile
+import zipfile
+from collections import namedtuple
+
+from pdf_generator import LIMITE_PDF_EM_MEMORIA, render_pdf
+from report_model import build_report
+import xlsx_writer
+from xlsx_writer import XlsxWriter
+
+# Linhas acumuladas antes de entregar um bloco de bytes
+LINHAS_POR_BLOCO = 500
+
+# Colunas do CSV: os nomes são os que o importador (importer.COLUNAS_CSV) reconhece
+COLUNAS_CSV = ['data', 'tipo', 'descricao', 'categoria', 'subcategoria', 'forma_pagamento', 'parcela', 'valor',
+               'efetivado']
+
+
+class _Blocos:
+    """Destino de escrita que acumula os bytes até serem retirados (o zipfile só precisa de write/flush)."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def _parcela(d):
+    return f'{d.parcela_atual}/{d.parcelas}' if d.parcelas and d.parcelas > 1 else ''
+
+
+def _lancamentos(modelo):
+    """Receitas e despesas numa sequência só, como `(tipo, linha)`."""
+    for r in modelo.receitas:
+        yield 'receita', r
+    for d in modelo.despesas:
+        yield 'despesa', d
+
+
+def csv_chunks(modelo):
+    """CSV (separador `;`, vírgula decimal, datas dd/mm/aaaa) que abre direto no Excel em português e
+    pode ser importado de volta pelo importer."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+    buffer.write('\ufeff')  # BOM: o Excel só reconhece UTF-8 com ele
+    escritor.writerow(COLUNAS_CSV)
+    for numero, (tipo, linha) in enumerate(_lancamentos(modelo), 1):
+        despesa = tipo == 'despesa'
+        escritor.writerow([
+            linha.data.strftime('%d/%m/%Y'),
+            tipo,
+            linha.descricao,
+            linha.categoria or '',
+            (linha.subcategoria or '') if despesa else '',
+            (linha.forma_pagamento or '') if despesa else '',
+            _parcela(linha) if despesa else '',
+            f'{linha.valor:.2f}'.replace('.', ','),
+            'sim' if linha.efetivado else 'nao',
+        ])
+        if numero % LINHAS_POR_BLOCO == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def xlsx_chunks(modelo):
+    """Planilhas Resumo, Receitas e Despesas, com datas e valores como números do Excel."""
+    saida = _Blocos()
+    with XlsxWriter(saida) as planilha:
+        with planilha.add_sheet('Resumo', ['Relatório Financeiro', ''],
+                                estilos=[xlsx_writer.TEXTO, xlsx_writer.MOEDA], larguras=[22, 60]) as resumo:
+            resumo.append(['Filtros', ' | '.join(modelo.descricao_filtros) or 'Sem filtros aplicados'])
+            resumo.append(['Total Receitas', modelo.total_receitas])
+            resumo.append(['Total Despesas', modelo.total_despesas])
+            resumo.append(['Saldo', modelo.saldo])
+            resumo.append(['Gerado em', modelo.gerado_em.strftime('%d/%m/%Y %H:%M')])
+
+        with planilha.add_sheet('Receitas', ['Data', 'Descrição', 'Categoria', 'Valor', 'Efetivado'],
+                                estilos=[xlsx_writer.DATA, xlsx_writer.TEXTO, xlsx_writer.TEXTO,
+                                         xlsx_writer.MOEDA, xlsx_writer.TEXTO],
+                                larguras=[12, 50, 20, 14, 10]) as receitas:
+            for numero, r in enumerate(modelo.receitas, 1):
+                receitas.append([r.data, r.descricao, r.categoria, r.valor, r.efetivado])
+                if numero % LINHAS_POR_BLOCO == 0:
+                    yield saida.retirar()
+
+        with planilha.add_sheet('Despesas', ['Data', 'Descrição', 'Categoria', 'Subcategoria', 'Forma Pagto',
+                                             'Parcela', 'Valor', 'Efetivado'],
+                                estilos=[xlsx_writer.DATA, xlsx_writer.TEXTO, xlsx_writer.TEXTO, xlsx_writer.TEXTO,
+                                         xlsx_writer.TEXTO, xlsx_writer.TEXTO, xlsx_writer.MOEDA,
+                                         xlsx_writer.TEXTO],
+                                larguras=[12, 50, 20, 20, 16, 9, 14, 10]) as despesas:
+            for numero, d in enumerate(modelo.despesas, 1):
+                despesas.append([d.data, d.descricao, d.categoria, d.subcategoria, d.forma_pagamento,
+                                 _parcela(d) or None, d.valor, d.efetivado])
+                if numero % LINHAS_POR_BLOCO == 0:
+                    yield saida.retirar()
+    yield saida.retirar()
+
+
+def json_chunks(modelo):
+    """O modelo inteiro em JSON, com as datas no mesmo formato das demais rotas da API."""
+    cabecalho = json.dumps({
+        'filtros': modelo.descricao_filtros,
+        'gerado_em': modelo.gerado_em.isoformat(timespec='seconds'),
+        'total_receitas': modelo.total_receitas,
+        'total_despesas': modelo.total_despesas,
+        'saldo': modelo.saldo,
+        'quantidade_receitas': modelo.quantidade_receitas,
+        'quantidade_despesas': modelo.quantidade_despesas,
+    }, ensure_ascii=False)
+    # as listas de linhas são acrescentadas ao objeto sem montá-lo inteiro na memória
+    partes = [cabecalho[:-1], ', "receitas": [']
+    for numero, r in enumerate(modelo.receitas):
+        partes.append((', ' if numero else '') + json.dumps({
+            'data': r.data.strftime('%d/%m/%Y'), 'descricao': r.descricao, 'categoria': r.categoria,
+            'valor': r.valor, 'efetivado': r.efetivado}, ensure_ascii=False))
+        if len(partes) >= LINHAS_POR_BLOCO:
+            yield ''.join(partes).encode('utf-8')
+            partes.clear()
+    partes.append('], "despesas": [')
+    for numero, d in enumerate(modelo.despesas):
+        partes.append((', ' if numero else '') + json.dumps({
+            'data': d.data.strftime('%d/%m/%Y'), 'descricao': d.descricao, 'categoria': d.categoria,
+            'subcategoria': d.subcategoria, 'forma_pagamento': d.forma_pagamento,
+            'parcela_atual': d.parcela_atual, 'parcelas': d.parcelas,
+            'valor': d.valor, 'efetivado': d.efetivado}, ensure_ascii=False))
+        if len(partes) >= LINHAS_POR_BLOCO:
+            yield ''.join(partes).encode('utf-8')
+            partes.clear()
+    partes.append(']}')
+    yield ''.join(partes).encode('utf-8')
+
+
+def _gravar(blocos):
+    def renderizar(modelo, arquivo):
+        for bloco in blocos(modelo):
+            arquivo.write(bloco)
+    return renderizar
+
+
+Formato = namedtuple('Formato', ['extensao', 'mimetype', 'renderizar', 'blocos'])
+
+# Saídas disponíveis; `renderizar(modelo, arquivo)` grava o relatório em `arquivo` (binário) e
+# `blocos(modelo)`, quando existe, gera os bytes aos poucos para respostas transmitidas em fluxo
+FORMATOS = {
+    'pdf': Formato('pdf', 'application/pdf', render_pdf, None),
+    'csv': Formato('csv', 'text/csv', _gravar(csv_chunks), csv_chunks),
+    'xlsx': Formato('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                    _gravar(xlsx_chunks), xlsx_chunks),
+    'json': Formato('json', 'application/json', _gravar(json_chunks), json_chunks),
+}
+
+
+def render_report(modelo, formatos, arquivo):
+    """Grava o relatório em `arquivo` e devolve `(nome do download, mimetype)`.
+
+    Com um formato só, o arquivo é o próprio relatório; com vários, um .zip com um arquivo por
+    formato, todos renderizados do mesmo modelo (que precisa ter as linhas em lista; ver build_report).
+    """
+    if len(formatos) == 1:
+        formato = FORMATOS[formatos[0]]
+        formato.renderizar(modelo, arquivo)
+        return f'{modelo.nome}.{formato.extensao}', formato.mimetype
+
+    with zipfile.ZipFile(arquivo, 'w', zipfile.ZIP_DEFLATED) as pacote:
+        for nome_formato in formatos:
+            formato = FORMATOS[nome_formato]
+            with pacote.open(f'{modelo.nome}.{formato.extensao}', 'w') as destino:
+                formato.renderizar(modelo, destino)
+    return f'{modelo.nome}.zip', 'application/zip'
+
+
+def parse_formats(texto):
+    """Lê `?formato=csv,xlsx`; ValueError para formato desconhecido."""
+    formatos = list(dict.fromkeys(parte.strip().lower() for parte in (texto or 'pdf').split(',') if parte.strip()))
+    desconhecidos = [formato for formato in formatos if formato not in FORMATOS]
+    if not formatos or desconhecidos:
+        raise ValueError(f"Formato inválido: {', '.join(desconhecidos) or texto}. Use {', '.join(FORMATOS)}.")
+    return formatos
+
+
+def export_report(args, formatos, db, models):
+    """Consulta o banco uma vez e renderiza o relatório em `formatos`; devolve `(arquivo, nome, mimetype)`.
+
+    O arquivo é temporário (só vai para o disco quando fica grande) e fica posicionado no fim.
+    """
+    # um formato só lê as linhas enquanto renderiza; vários precisam delas em lista para reaproveitar
+    modelo = build_report(args, db, models, streaming=len(formatos) == 1)
+    arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_PDF_EM_MEMORIA)
+    try:
+        nome, mimetype = render_report(modelo, formatos, arquivo)
+    except Exception:
+        arquivo.close()
+        raise
+    return arquivo, nome, mimetype
+
+
+def stream_report(args, formato, db, models):
+    """Relatório em fluxo: devolve `(gerador de blocos, nome, mimetype)`.
+
+    Filtros e totais são lidos aqui, antes da resposta começar (um erro ainda vira resposta de erro);
+    as linhas vêm do banco em lotes de report_model.LINHAS_POR_LOTE por um cursor do lado do servidor
+    (yield_per) e cada bloco sai assim que fica pronto, então a memória não depende do tamanho da
+    exportação. O gerador precisa do contexto da requisição (stream_with_context) para usar a sessão.
+    """
+    formato = FORMATOS[formato]
+    modelo = build_report(args, db, models, streaming=True)
+    return formato.blocos(modelo), f'{modelo.nome}.{formato.extensao}', formato.mimetype
+
+
+def streaming_response(make_response, blocos, filename, mimetype):
+    """Resposta sem Content-Length que envia cada bloco conforme é gerado."""
+    response = make_response(blocos)
+    response.mimetype = mimetype
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # proxies como o nginx não devem segurar a resposta até o fim
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,171 @@
+import json
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pdf_generator import CAMPOS_DO_RELATORIO, render_pdf_report, report_cache_key
+
+TRABALHOS_SIMULTANEOS_PADRAO = 2
+VALIDADE_PADRAO = 3600  # segundos que um trabalho (e o PDF gerado) fica disponível
+# Na fila ou gerando há mais que isso (em múltiplos da validade), o worker que o rodava morreu
+LIMITE_EM_ANDAMENTO = 3
+INTERVALO_PROGRESSO = 0.5  # segundos entre gravações do progresso no arquivo de estado
+_ID_VALIDO = re.compile(r'^[0-9a-f]{32}$')
+
+PENDENTE = 'pendente'
+PROCESSANDO = 'processando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+
+class ReportJobs:
+    """Fila de relatórios PDF gerados em segundo plano, fora da thread da requisição.
+
+    Cada trabalho tem um arquivo de estado `<id>.json` e, quando pronto, o PDF `<id>.pdf` na
+    mesma pasta; assim qualquer worker consegue responder à consulta de progresso e ao download,
+    mesmo que o trabalho esteja rodando em outro. Trabalhos mais antigos que `validade` são
+    apagados a cada novo envio; os que continuam na fila ou gerando depois de `LIMITE_EM_ANDAMENTO`
+    vezes a validade viram erro e expiram a partir daí.
+    """
+
+    def __init__(self, app, pasta, max_workers=TRABALHOS_SIMULTANEOS_PADRAO, validade=VALIDADE_PADRAO, cache=None):
+        self.app = app
+        self.pasta = pasta
+        self.validade = validade
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='relatorio-pdf')
+        self._lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, job_id, extensao):
+        return os.path.join(self.pasta, f'{job_id}.{extensao}')
+
+    def _gravar(self, estado):
+        # grava ao lado e troca atomicamente: quem consulta nunca lê o estado pela metade
+        fd, temporario = tempfile.mkstemp(dir=self.pasta, prefix='.estado-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as arquivo:
+            json.dump(estado, arquivo)
+        os.replace(temporario, self._caminho(estado['id'], 'json'))
+
+    def submit(self, args, db, models, usuario_id=None):
+        """Enfileira o relatório com os filtros `args` e devolve o estado inicial do trabalho."""
+        self._limpar_expirados()
+        estado = {
+            'id': secrets.token_hex(16),
+            'status': PENDENTE,
+            'usuario_id': usuario_id,
+            'criado_em': datetime.now().isoformat(timespec='seconds'),
+            'concluido_em': None,
+            'total_linhas': None,
+            'linhas_processadas': 0,
+            'paginas': 0,
+            'nome': None,
+            'mensagem': None,
+        }
+        self._gravar(estado)
+        # cópia simples dos filtros (texto, como na query string): a requisição não existe mais quando o trabalho roda
+        filtros = {campo: str(valor) for campo, valor in dict(args).items() if valor is not None}
+        self._executor.submit(self._executar, dict(estado), filtros, db, models)
+        return estado
+
+    def status(self, job_id):
+        """Estado atual do trabalho, ou None se não existir (ou já tiver expirado)."""
+        if not _ID_VALIDO.match(job_id or ''):
+            return None
+        try:
+            with open(self._caminho(job_id, 'json'), encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+
+    def open_result(self, job_id):
+        """`(arquivo aberto, nome do download)` do PDF de um trabalho concluído, ou None."""
+        estado = self.status(job_id)
+        if not estado or estado['status'] != CONCLUIDO:
+            return None
+        try:
+            return open(self._caminho(job_id, 'pdf'), 'rb'), estado['nome']
+        except OSError:
+            return None
+
+    def _executar(self, estado, args, db, models):
+        ultima_gravacao = 0.0
+
+        def progresso(**campos):
+            nonlocal ultima_gravacao
+            estado.update(campos)
+            agora = time.monotonic()
+            if agora - ultima_gravacao >= INTERVALO_PROGRESSO:
+                ultima_gravacao = agora
+                self._gravar(estado)
+
+        processos = self.app.config.get('PDF_PROCESSES', 1)
+        with self.app.app_context():
+            estado['status'] = PROCESSANDO
+            self._gravar(estado)
+            destino = self._caminho(estado['id'], 'pdf')
+            try:
+                if self.cache is not None:
+                    chave = report_cache_key(args)
+                    arquivo, nome = self._do_cache(chave, estado) or self.cache.put(
+                        chave, lambda saida: render_pdf_report(saida, args, db, models, progresso, processos),
+                        detalhes=lambda: {campo: estado[campo] for campo in CAMPOS_DO_RELATORIO})
+                    with arquivo, open(destino, 'wb') as saida:
+                        shutil.copyfileobj(arquivo, saida)
+                else:
+                    with open(destino, 'wb') as saida:
+                        nome = render_pdf_report(saida, args, db, models, progresso, processos)
+                estado.update(status=CONCLUIDO, nome=nome)
+                if estado['total_linhas'] is not None:
+                    estado['linhas_processadas'] = estado['total_linhas']
+            except Exception as e:
+                self.app.logger.exception('Erro ao gerar PDF em segundo plano:')
+                if os.path.exists(destino):
+                    os.remove(destino)
+                estado.update(status=ERRO, mensagem=str(e))
+            finally:
+                db.session.remove()
+            estado['concluido_em'] = datetime.now().isoformat(timespec='seconds')
+            self._gravar(estado)
+
+    def _do_cache(self, chave, estado):
+        resultado = self.cache.get(chave, detalhes=estado)
+        if resultado and estado['total_linhas'] is None:
+            # guardado sem o resumo (antes de o download direto passar a guardá-lo): gera de novo
+            resultado[0].close()
+            return None
+        return resultado
+
+    def _manter(self, nome_arquivo, criado_antes_de):
+        """Se o arquivo de um trabalho expirado fica: o trabalho ainda está na fila ou gerando.
+
+        O arquivo de estado só é regravado quando há progresso, então a idade dele não basta; mas um
+        trabalho criado antes de `criado_antes_de` nunca vai terminar e vira erro, expirando dali em diante.
+        """
+        job_id, _, extensao = nome_arquivo.partition('.')
+        estado = self.status(job_id) if extensao in ('json', 'pdf') else None
+        if estado is None or estado['status'] not in (PENDENTE, PROCESSANDO):
+            return False
+        if datetime.fromisoformat(estado['criado_em']) >= criado_antes_de:
+            return True
+        estado.update(status=ERRO, mensagem='O relatório não terminou a tempo; gere novamente.',
+                      concluido_em=datetime.now().isoformat(timespec='seconds'))
+        self._gravar(estado)
+        return extensao == 'json'  # o estado regravado expira normalmente; o PDF pela metade sai já
+
+    def _limpar_expirados(self):
+        limite = time.time() - self.validade
+        criado_antes_de = datetime.now() - timedelta(seconds=self.validade * LIMITE_EM_ANDAMENTO)
+        with self._lock, os.scandir(self.pasta) as itens:
+            for item in itens:
+                try:
+                    if item.stat().st_mtime < limite and not self._manter(item.name, criado_antes_de):
+                        os.remove(item.path)
+                except FileNotFoundError:
+                    pass
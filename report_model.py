@@ -0,0 +1,144 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+
+from models import CategoriaDespesa, SubcategoriaDespesa
+from report_engine import ReportFilters, compute_totals, payment_type_names
+
+# Linhas lidas do banco por vez (yield_per)
+LINHAS_POR_LOTE = 500
+
+# Intervalo `(início, fim)` em chaves `(data, id)`: início incluído, fim excluído, None para sem limite
+TODAS = (None, None)
+
+# Linhas do relatório só com valores simples: a formatação fica com cada renderizador
+LinhaReceita = namedtuple('LinhaReceita', ['data', 'descricao', 'categoria', 'valor', 'efetivado'])
+LinhaDespesa = namedtuple('LinhaDespesa', ['data', 'descricao', 'categoria', 'subcategoria', 'forma_pagamento',
+                                           'parcela_atual', 'parcelas', 'valor', 'efetivado'])
+
+
+class ReportModel:
+    """Relatório já resolvido: filtros aplicados, totais e linhas, sem depender da requisição.
+
+    É o que os renderizadores (PDF, CSV, XLSX, JSON; ver report_formats) consomem, então
+    exportar os mesmos filtros em vários formatos consulta o banco uma vez só.
+    """
+
+    def __init__(self, filtros, descricao_filtros, nome, totais, receitas, despesas, gerado_em):
+        self.filtros = filtros
+        self.descricao_filtros = descricao_filtros
+        self.nome = nome
+        self.total_receitas = totais['total_receitas']
+        self.total_despesas = totais['total_despesas']
+        self.quantidade_receitas = totais['quantidade_receitas']
+        self.quantidade_despesas = totais['quantidade_despesas']
+        self.receitas = receitas
+        self.despesas = despesas
+        self.gerado_em = gerado_em
+
+    @property
+    def saldo(self):
+        return self.total_receitas - self.total_despesas
+
+    @property
+    def total_linhas(self):
+        return self.quantidade_receitas + self.quantidade_despesas
+
+
+def _no_intervalo(stmt, model, intervalo):
+    inicio, fim = intervalo
+    if inicio is not None:
+        stmt = stmt.where(tuple_(model.data, model.id) >= inicio)
+    if fim is not None:
+        stmt = stmt.where(tuple_(model.data, model.id) < fim)
+    return stmt
+
+
+def _descricao_filtros(args, tipo_pagamento_nome):
+    """Filtros como aparecem no subtítulo do relatório."""
+    categoria = args.get('categoria')
+    subcategoria = args.get('subcategoria')
+    data_inicio = args.get('data_inicio')
+    data_fim = args.get('data_fim')
+    filtros_texto = []
+    if categoria:
+        filtros_texto.append(f'Categoria: {categoria}')
+    if subcategoria:
+        filtros_texto.append(f'Subcategoria: {subcategoria}')
+    if data_inicio:
+        filtros_texto.append(f'Período: {data_inicio}')
+        if data_fim:
+            filtros_texto[-1] += f' a {data_fim}'
+    elif data_fim:
+        filtros_texto.append(f'Até: {data_fim}')
+    if tipo_pagamento_nome:
+        filtros_texto.append(f'Forma de Pagamento: {tipo_pagamento_nome}')
+    return filtros_texto
+
+
+def _nome(args, tipo_pagamento_nome):
+    """Nome do arquivo para download, sem extensão."""
+    filename = 'relatorio_financeiro'
+    for campo in ('categoria', 'subcategoria', 'data_inicio', 'data_fim'):
+        if args.get(campo):
+            filename += f'_{args.get(campo)}'
+    if tipo_pagamento_nome:
+        filename += f'_{tipo_pagamento_nome}'
+    return filename
+
+
+def build_report(args, db, models, receitas=TODAS, despesas=TODAS, streaming=False, gerado_em=None):
+    """Lê do banco o relatório com os filtros `args` e devolve o ReportModel.
+
+    `receitas`/`despesas` limitam as linhas a um intervalo de chaves `(data, id)` (ver pdf_parallel);
+    None deixa a seção sem linhas. Com `streaming=True` as linhas são geradores lidos em lotes
+    enquanto o renderizador avança: memória constante, mas servem para um único formato.
+    Sem ele ficam em listas e o mesmo modelo pode ser renderizado quantas vezes for preciso.
+    """
+    filtros = ReportFilters.from_args(args, strict=False)
+    tipo_pagamento_nome = payment_type_names().get(filtros.tipo_pagamento_id) if filtros.tipo_pagamento_id else None
+    # Totais calculados no banco, sem carregar as linhas
+    totais = compute_totals(filtros)
+
+    Receita = models['Receita']
+    Despesa = models['Despesa']
+
+    def linhas_receitas():
+        if receitas is None or not totais['quantidade_receitas']:
+            return
+        # colunas na ordem de LinhaReceita: cada linha do banco vira a tupla sem cópia campo a campo
+        stmt = (_no_intervalo(select(Receita.data, Receita.descricao, Receita.categoria, Receita.valor,
+                                     Receita.efetivado),
+                              Receita, receitas)
+                .where(*filtros.receita_criteria())
+                .order_by(Receita.data, Receita.id)
+                .execution_options(yield_per=LINHAS_POR_LOTE))
+        yield from map(LinhaReceita._make, db.session.execute(stmt))
+
+    def linhas_despesas():
+        if despesas is None or not totais['quantidade_despesas']:
+            return
+        TipoPagamento = models['TipoPagamento']
+        # nomes de categoria, subcategoria e forma de pagamento só para exibição, pelos ids
+        stmt = (_no_intervalo(select(Despesa.data, Despesa.descricao, CategoriaDespesa.nome, SubcategoriaDespesa.nome,
+                                     TipoPagamento.nome, Despesa.parcela_atual, Despesa.parcelas,
+                                     Despesa.valor, Despesa.efetivado)
+                              .outerjoin(CategoriaDespesa, Despesa.categoria_id == CategoriaDespesa.id)
+                              .outerjoin(SubcategoriaDespesa, Despesa.subcategoria_id == SubcategoriaDespesa.id)
+                              .outerjoin(TipoPagamento, Despesa.tipo_pagamento_id == TipoPagamento.id),
+                              Despesa, despesas)
+                .where(*filtros.despesa_criteria())
+                .order_by(Despesa.data, Despesa.id)
+                .execution_options(yield_per=LINHAS_POR_LOTE))
+        yield from map(LinhaDespesa._make, db.session.execute(stmt))
+
+    return ReportModel(
+        filtros=filtros,
+        descricao_filtros=_descricao_filtros(args, tipo_pagamento_nome),
+        nome=_nome(args, tipo_pagamento_nome),
+        totais=totais,
+        receitas=linhas_receitas() if streaming else list(linhas_receitas()),
+        despesas=linhas_despesas() if streaming else list(linhas_despesas()),
+        gerado_em=gerado_em or datetime.now(),
+    )
@@ -0,0 +1,144 @@
+"""Estilos dos relatórios PDF, montados uma vez na importação e reaproveitados por todas as requisições.
+
+Os TableStyle e ParagraphStyle do reportlab não guardam estado do documento, então podem ser
+compartilhados entre threads e relatórios.
+"""
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import TableStyle
+
+# Página do relatório (pdf_generator)
+PAGINA = landscape(A4)  # width=841.89, height=595.27
+MARGEM = 50
+LARGURA_UTIL = PAGINA[0] - 2 * MARGEM
+# Altura livre do Frame do SimpleDocTemplate: a página sem as margens e sem o padding de 6pt do Frame
+ALTURA_UTIL = PAGINA[1] - 2 * MARGEM - 12
+
+AZUL = colors.HexColor('#2C3E50')
+CINZA = colors.HexColor('#7F8C8D')
+VERMELHO = colors.HexColor('#C0392B')
+
+# Entrelinha padrão das células do reportlab; com ela e os paddings a altura das linhas é fixa e
+# pode ser informada à Table, que então não mede célula por célula
+ENTRELINHA_CELULA = 12
+
+_amostra = getSampleStyleSheet()
+NORMAL = _amostra['Normal']
+
+TITULO = ParagraphStyle(
+    'CustomTitle',
+    parent=_amostra['Heading1'],
+    fontSize=20,
+    textColor=AZUL,
+    spaceAfter=12,
+    alignment=TA_CENTER
+)
+
+SUBTITULO = ParagraphStyle(
+    'CustomSubtitle',
+    parent=NORMAL,
+    fontSize=10,
+    textColor=CINZA,
+    spaceAfter=20,
+    alignment=TA_CENTER
+)
+
+SECAO = ParagraphStyle(
+    'CustomHeading',
+    parent=_amostra['Heading2'],
+    fontSize=14,
+    textColor=AZUL,
+    spaceAfter=10,
+    spaceBefore=20
+)
+
+RESUMO = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495E')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#ECF0F1')),
+    ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 11),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#ECF0F1')]),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+])
+# Linha do saldo em verde ou vermelho
+RESUMO_POSITIVO = TableStyle([('BACKGROUND', (0, -1), (-1, -1), colors.green)], parent=RESUMO)
+RESUMO_NEGATIVO = TableStyle([('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#E74C3C'))], parent=RESUMO)
+COLUNAS_RESUMO = [200, 150]
+
+PADDING_RECEITAS = 6
+ALTURA_LINHA_RECEITAS = ENTRELINHA_CELULA + 2 * PADDING_RECEITAS
+RECEITAS = TableStyle([
+    # Cabeçalho
+    ('BACKGROUND', (0, 0), (-1, 0), AZUL),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    # Linhas de dados: um único fundo para a sub-tabela inteira, não um por linha; cor preta, fonte
+    # Helvetica e alinhamento à esquerda já são o padrão das células e não viram comandos por célula
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#EBEDEF')),
+    ('ALIGN', (-1, 1), (-1, -1), 'RIGHT'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    # Grid
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('LINEBELOW', (0, 0), (-1, 0), 2, AZUL),
+    # Espaçamento
+    ('TOPPADDING', (0, 0), (-1, -1), PADDING_RECEITAS),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), PADDING_RECEITAS),
+    ('LEFTPADDING', (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+COLUNAS_RECEITAS = [80, LARGURA_UTIL - 300, 120, 100]
+
+PADDING_DESPESAS = 5
+ALTURA_LINHA_DESPESAS = ENTRELINHA_CELULA + 2 * PADDING_DESPESAS
+DESPESAS = TableStyle([
+    # Cabeçalho (cada coluna com o seu título; sem SPAN, que obriga a Table a recalcular as células mescladas)
+    ('BACKGROUND', (0, 0), (-1, 0), VERMELHO),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    # Linhas de dados (ver RECEITAS)
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#FADBD8')),
+    ('ALIGN', (5, 1), (5, -1), 'CENTER'),
+    ('ALIGN', (-1, 1), (-1, -1), 'RIGHT'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    # Grid
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('LINEBELOW', (0, 0), (-1, 0), 2, VERMELHO),
+    # Espaçamento
+    ('TOPPADDING', (0, 0), (-1, -1), PADDING_DESPESAS),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), PADDING_DESPESAS),
+    ('LEFTPADDING', (0, 0), (-1, -1), 6),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+COLUNAS_DESPESAS = [70, LARGURA_UTIL * 0.25, LARGURA_UTIL * 0.15,
+                    LARGURA_UTIL * 0.15, LARGURA_UTIL * 0.12, 50, 90]
+
+
+def _linhas_por_pagina(altura_linha):
+    """Linhas de dados que cabem numa página junto com o cabeçalho repetido."""
+    return int((ALTURA_UTIL - altura_linha) // altura_linha)
+
+
+# Sub-tabelas do tamanho de uma página inteira: o reportlab nunca precisa dividir uma tabela
+# (o que refaria o cálculo e o estilo de cada pedaço), só a primeira após o cabeçalho do relatório
+LINHAS_POR_TABELA_RECEITAS = _linhas_por_pagina(ALTURA_LINHA_RECEITAS)
+LINHAS_POR_TABELA_DESPESAS = _linhas_por_pagina(ALTURA_LINHA_DESPESAS)
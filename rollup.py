@@ -0,0 +1,188 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+
+from sqlalchemy import and_, delete, event, extract, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import db, Receita, Despesa, ResumoMensal
+from money import Dinheiro, to_cents
+
+# Colunas lidas de cada modelo; as dimensões ausentes ficam nulas (receitas têm a categoria em texto,
+# despesas os ids de categoria, subcategoria e forma de pagamento)
+CAMPOS = {
+    Receita: ('data', 'categoria', 'efetivado', 'valor', 'valor_previsto'),
+    Despesa: ('data', 'categoria_id', 'subcategoria_id', 'tipo_pagamento_id', 'efetivado', 'valor', 'valor_previsto'),
+}
+DIMENSOES = ('tipo', 'mes', 'categoria', 'categoria_id', 'subcategoria_id', 'tipo_pagamento_id', 'efetivado')
+CHAVE_DELTAS = 'resumo_mensal_deltas'
+
+
+def _tipo(model):
+    return 'receita' if model is Receita else 'despesa'
+
+
+def _chave(model, valores):
+    return (_tipo(model), valores['data'].replace(day=1), valores.get('categoria'), valores.get('categoria_id'),
+            valores.get('subcategoria_id'), valores.get('tipo_pagamento_id'), valores['efetivado'])
+
+
+def _acumular(deltas, model, valores, sinal):
+    delta = deltas[_chave(model, valores)]
+    delta[0] += sinal * (to_cents(valores['valor']) or 0)
+    delta[1] += sinal * (to_cents(valores['valor_previsto']) or 0)
+    delta[2] += sinal
+
+
+def _valores_no_banco(session, model, ids):
+    """Valores gravados antes deste flush (lidos do banco, não do histórico de atributos expirados)."""
+    colunas = [getattr(model, campo) for campo in CAMPOS[model]]
+    with session.no_autoflush:
+        linhas = session.execute(select(*colunas).where(model.id.in_(ids))).all()
+    return [row._asdict() for row in linhas]
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_alteracoes(session, flush_context, instances):
+    """Desconta do resumo os valores antigos de linhas alteradas/removidas e soma os novos valores das alteradas."""
+    deltas = defaultdict(lambda: [0, 0, 0])
+    session.info[CHAVE_DELTAS] = deltas
+
+    for model in CAMPOS:
+        alterados = [obj for obj in session.dirty if type(obj) is model and session.is_modified(obj)]
+        removidos = [obj for obj in session.deleted if type(obj) is model]
+        ids = [obj.id for obj in alterados + removidos if obj.id is not None]
+        if not ids:
+            continue
+        for valores in _valores_no_banco(session, model, ids):
+            _acumular(deltas, model, valores, -1)
+        for obj in alterados:
+            _acumular(deltas, model, {campo: getattr(obj, campo) for campo in CAMPOS[model]}, 1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _aplicar_alteracoes(session, flush_context):
+    """Soma as linhas novas (já com os defaults do INSERT) e grava os deltas no ResumoMensal."""
+    deltas = session.info.pop(CHAVE_DELTAS, None)
+    if deltas is None:
+        return
+    for obj in session.new:
+        if type(obj) in CAMPOS:
+            _acumular(deltas, type(obj), {campo: getattr(obj, campo) for campo in CAMPOS[type(obj)]}, 1)
+    if deltas:
+        _gravar(session.connection(), deltas)
+
+
+def add_to_monthly_summary(model, linhas, sinal=1):
+    """Aplica ao ResumoMensal linhas gravadas/removidas fora da sessão (INSERT ou DELETE em lote).
+
+    `linhas` são dicts com as colunas de CAMPOS; use `sinal=-1` para linhas removidas.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for valores in linhas:
+        _acumular(deltas, model, valores, sinal)
+    _gravar(db.session.connection(), deltas)
+
+
+def _gravar(conn, deltas):
+    """UPDATE da linha do resumo e INSERT quando ela ainda não existe (funciona em qualquer banco).
+
+    Os deltas de valor estão em centavos inteiros.
+    """
+    tabela = ResumoMensal.__table__
+    for chave, (valor, previsto, quantidade) in deltas.items():
+        if not (valor or previsto or quantidade):
+            continue
+        valor, previsto = Dinheiro.de_centavos(valor), Dinheiro.de_centavos(previsto)
+        criterios = [tabela.c[dimensao].is_not_distinct_from(v) for dimensao, v in zip(DIMENSOES, chave)]
+        resultado = conn.execute(
+            update(tabela).where(*criterios).values(
+                total_valor=tabela.c.total_valor + valor,
+                total_previsto=tabela.c.total_previsto + previsto,
+                quantidade=tabela.c.quantidade + quantidade,
+            )
+        )
+        if resultado.rowcount == 0:
+            conn.execute(insert(tabela).values(
+                **dict(zip(DIMENSOES, chave)),
+                total_valor=valor, total_previsto=previsto, quantidade=quantidade,
+            ))
+
+
+def rebuild_monthly_summary(meses=None):
+    """Recalcula o ResumoMensal a partir das linhas brutas: tudo, ou só os meses informados (primeiro dia de cada mês).
+
+    Use depois de operações em massa que não passam pela sessão (UPDATE/DELETE em lote, SQL manual).
+    Não faz commit; devolve a quantidade de linhas gravadas no resumo.
+    """
+    tabela = ResumoMensal.__table__
+    apagar = delete(tabela)
+    if meses is not None:
+        meses = sorted(set(meses))
+        if not meses:
+            return 0
+        apagar = apagar.where(tabela.c.mes.in_(meses))
+    db.session.execute(apagar)
+
+    linhas = []
+    for model in CAMPOS:
+        criterios = []
+        if meses is not None:
+            criterios.append(or_(*[and_(model.data >= m, model.data < _proximo_mes(m)) for m in meses]))
+        linhas.extend(_linhas_agregadas(model, criterios))
+    if linhas:
+        db.session.execute(insert(tabela), linhas)
+    return len(linhas)
+
+
+def _linhas_agregadas(model, criterios):
+    """Linhas no formato do ResumoMensal com os totais das linhas brutas de `model` que atendem aos critérios."""
+    ano = extract('year', model.data).label('ano')
+    mes = extract('month', model.data).label('mes')
+    dimensoes = [getattr(model, campo) for campo in DIMENSOES[2:] if campo in CAMPOS[model]]
+    stmt = (select(ano, mes, *dimensoes,
+                   func.coalesce(func.sum(model.valor), 0).label('total_valor'),
+                   func.coalesce(func.sum(model.valor_previsto), 0).label('total_previsto'),
+                   func.count(model.id).label('quantidade'))
+            .where(*criterios)
+            .group_by(ano, mes, *dimensoes))
+    for row in db.session.execute(stmt):
+        yield {
+            'tipo': _tipo(model),
+            'mes': date(int(row.ano), int(row.mes), 1),
+            'categoria': row._mapping.get('categoria'),
+            'categoria_id': row._mapping.get('categoria_id'),
+            'subcategoria_id': row._mapping.get('subcategoria_id'),
+            'tipo_pagamento_id': row._mapping.get('tipo_pagamento_id'),
+            'efetivado': row.efetivado,
+            'total_valor': row.total_valor,
+            'total_previsto': row.total_previsto,
+            'quantidade': row.quantidade,
+        }
+
+
+@contextmanager
+def monthly_summary_adjusted(model, *criterios):
+    """Mantém o ResumoMensal em UPDATE/DELETE em lote feitos dentro do bloco.
+
+    Desconta os totais das linhas que atendem aos critérios antes do bloco e soma os das que ainda os
+    atendem depois: duas consultas agrupadas, qualquer que seja o número de linhas. Os critérios não
+    devem depender das colunas alteradas pelo UPDATE.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+
+    def _somar(sinal):
+        for linha in _linhas_agregadas(model, criterios):
+            delta = deltas[tuple(linha[dimensao] for dimensao in DIMENSOES)]
+            delta[0] += sinal * linha['total_valor'].centavos
+            delta[1] += sinal * linha['total_previsto'].centavos
+            delta[2] += sinal * linha['quantidade']
+
+    _somar(-1)
+    yield
+    _somar(1)
+    _gravar(db.session.connection(), deltas)
+
+
+def _proximo_mes(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
@@ -8,6 +8,13 @@ function formatarMoeda(valor) {
     }).format(valor);
 }
 
+// Função para escapar texto antes de inseri-lo em HTML montado no cliente
+function escaparHtml(texto) {
+    const div = document.createElement('div');
+    div.textContent = texto == null ? '' : String(texto);
+    return div.innerHTML;
+}
+
 // Função para mostrar notificações
 function mostrarNotificacao(mensagem, tipo = 'success') {
     const alertDiv = document.createElement('div');
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para testar os valores em centavos: arredondamento, parcelas, somas e a migração de bancos antigos
+(não precisa do servidor)
+"""
+
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine, inspect, text
+
+from installments import _dividir
+from models import migrate_money_columns
+from money import Dinheiro, to_cents
+
+falhas = 0
+
+
+def verificar(descricao, obtido, esperado):
+    global falhas
+    if obtido == esperado and type(obtido) is type(esperado):
+        print(f"   [OK] {descricao}")
+    else:
+        falhas += 1
+        print(f"   [ERRO] {descricao}: esperado {esperado!r}, obtido {obtido!r}")
+
+
+print("=" * 60)
+print("TESTANDO VALORES EM CENTAVOS")
+print("=" * 60)
+print()
+
+print("1. Convertendo reais em centavos (meio centavo para longe do zero)...")
+verificar("0.1 + 0.2 -> 30", to_cents(0.1 + 0.2), 30)
+verificar("1000.005 -> 100001", to_cents(1000.005), 100001)
+verificar("-1000.005 -> -100001", to_cents(-1000.005), -100001)
+verificar("1.005 -> 101", to_cents(1.005), 101)
+verificar("'19.99' -> 1999", to_cents('19.99'), 1999)
+verificar("7 -> 700", to_cents(7), 700)
+verificar("None continua None", to_cents(None), None)
+print()
+
+print("2. Dividindo 100,00 em 3 parcelas...")
+parcelas = _dividir(100, 3)
+verificar("33,33 + 33,33 + 33,34", [p.centavos for p in parcelas], [3333, 3333, 3334])
+verificar("a soma é exatamente o total", sum(p.centavos for p in parcelas), 10000)
+verificar("10,00 em 4 parcelas: 2,50 cada", [p.centavos for p in _dividir(10, 4)], [250, 250, 250, 250])
+verificar("0,05 em 2 parcelas: 0,03 + 0,02", [p.centavos for p in _dividir(0.05, 2)], [3, 2])
+print()
+
+print("3. Somando e subtraindo Dinheiro...")
+verificar("Dinheiro(0.1) + 0.2 == 0.3", Dinheiro(0.1) + 0.2, Dinheiro(0.3))
+verificar("0.2 + Dinheiro(0.1) == 0.3", 0.2 + Dinheiro(0.1), Dinheiro(0.3))
+verificar("dez vezes 0,10 somam 1,00", sum([Dinheiro(0.1)] * 10), Dinheiro(1.0))
+verificar("Dinheiro(1.0) - 0.9 == 0.1", Dinheiro(1.0) - 0.9, Dinheiro(0.1))
+verificar("0.3 - Dinheiro(0.1) == 0.2", 0.3 - Dinheiro(0.1), Dinheiro(0.2))
+verificar("lido de 100001 centavos volta a 100001", to_cents(Dinheiro.de_centavos(100001)), 100001)
+print()
+
+print("4. Migrando um banco antigo (valores em reais, FLOAT)...")
+valores = [0.1 + 0.2, 1000.005, 1.005, 2.675, -0.125, None]
+caminho = os.path.join(tempfile.mkdtemp(), 'antigo.db')
+engine = create_engine('sqlite:///' + caminho)
+with engine.begin() as conn:
+    conn.execute(text("CREATE TABLE receita (id INTEGER PRIMARY KEY, valor FLOAT, valor_previsto FLOAT)"))
+    # bancos muito antigos não tinham valor_previsto
+    conn.execute(text("CREATE TABLE despesa (id INTEGER PRIMARY KEY, valor FLOAT)"))
+    for valor in valores:
+        conn.execute(text("INSERT INTO receita (valor, valor_previsto) VALUES (:v, :v)"), {'v': valor})
+        conn.execute(text("INSERT INTO despesa (valor) VALUES (:v)"), {'v': valor})
+
+verificar("tabelas convertidas", migrate_money_columns(engine), ['receita', 'despesa'])
+esperados = [to_cents(valor or 0) for valor in valores]
+with engine.connect() as conn:
+    for tabela in ('receita', 'despesa'):
+        linhas = conn.execute(text(f"SELECT valor_centavos, valor_previsto_centavos FROM {tabela} ORDER BY id")).all()
+        verificar(f"{tabela}: valor igual a to_cents", [linha[0] for linha in linhas], esperados)
+        verificar(f"{tabela}: previsto igual a to_cents", [linha[1] for linha in linhas], esperados)
+for tabela in ('receita', 'despesa'):
+    colunas = {c['name'] for c in inspect(engine).get_columns(tabela)}
+    verificar(f"{tabela}: colunas em reais removidas", colunas & {'valor', 'valor_previsto'}, set())
+verificar("rodar de novo não converte nada", migrate_money_columns(engine), [])
+engine.dispose()
+print()
+
+print("=" * 60)
+if falhas:
+    print(f"[ERRO] {falhas} verificação(ões) falharam")
+    sys.exit(1)
+print("[OK] Todas as verificações passaram")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para testar a importação de extratos num banco temporário (não precisa do servidor)
+"""
+
+import io
+import os
+import sys
+import tempfile
+
+pasta = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(pasta, 'teste.db')
+os.environ['CACHE_DIR'] = os.path.join(pasta, 'cache')
+
+import app
+from importer import import_statement
+from migrations import upgrade
+from models import db, Despesa
+
+falhas = 0
+
+# Fora de ordem: as duas compras iguais na padaria ficam separadas por outro dia
+EXTRATO_DESORDENADO = """Data;Histórico;Valor
+05/03/2024;Padaria;-12,50
+04/03/2024;Mercado;-80,00
+05/03/2024;Padaria;-12,50
+04/03/2024;Mercado;-80,00
+06/03/2024;Farmácia;-30,00
+"""
+
+
+def verificar(descricao, obtido, esperado):
+    global falhas
+    if obtido == esperado:
+        print(f"   [OK] {descricao}")
+    else:
+        falhas += 1
+        print(f"   [ERRO] {descricao}: esperado {esperado}, obtido {obtido}")
+
+
+def importar(texto):
+    return import_statement(io.StringIO(texto), 'csv', tamanho_lote=2)
+
+
+print("=" * 60)
+print("TESTANDO IMPORTACAO DE EXTRATOS")
+print("=" * 60)
+print()
+
+with app.app.app_context():
+    upgrade(avisar=lambda mensagem: None)
+
+    print("1. Importando extrato fora de ordem de data...")
+    resultado = importar(EXTRATO_DESORDENADO)
+    verificar("5 linhas lidas", resultado['lidas'], 5)
+    verificar("5 despesas gravadas", resultado['despesas'], 5)
+    verificar("nenhuma duplicada", resultado['duplicadas'], 0)
+    verificar("2 compras na padaria", Despesa.query.filter_by(descricao='Padaria').count(), 2)
+    verificar("2 compras no mercado", Despesa.query.filter_by(descricao='Mercado').count(), 2)
+    print()
+
+    print("2. Importando o mesmo extrato de novo...")
+    resultado = importar(EXTRATO_DESORDENADO)
+    verificar("nenhuma despesa nova", resultado['despesas'], 0)
+    verificar("5 duplicadas", resultado['duplicadas'], 5)
+    print()
+
+    print("3. Importando o extrato ordenado por data...")
+    linhas = EXTRATO_DESORDENADO.splitlines()
+    resultado = importar('\n'.join([linhas[0]] + sorted(linhas[1:], key=lambda l: l[:10])) + '\n')
+    verificar("mesmos lançamentos reconhecidos como duplicados", resultado['duplicadas'], 5)
+    verificar("total de despesas continua 5", db.session.query(Despesa).count(), 5)
+    print()
+
+print("=" * 60)
+if falhas:
+    print(f"[ERRO] {falhas} verificação(ões) falharam")
+    sys.exit(1)
+print("[OK] Todas as verificações passaram")
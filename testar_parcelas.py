@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para testar as datas das parcelas de uma compra parcelada (não precisa do servidor)
+"""
+
+import sys
+from datetime import date
+
+from installments import expand_installments
+
+falhas = 0
+
+
+def verificar(descricao, obtido, esperado):
+    global falhas
+    if obtido == esperado:
+        print(f"   [OK] {descricao}")
+    else:
+        falhas += 1
+        print(f"   [ERRO] {descricao}: esperado {esperado}, obtido {obtido}")
+
+
+def datas(data_inicial, parcelas):
+    return [linha['data'] for linha in expand_installments('Compra', 30000, 30000, data_inicial, parcelas, 1)]
+
+
+print("=" * 60)
+print("TESTANDO DATAS DAS PARCELAS")
+print("=" * 60)
+print()
+
+print("1. Compra no dia 31 de janeiro (ano bissexto)...")
+verificar("31/01 -> 29/02 -> 31/03", datas(date(2024, 1, 31), 3),
+          [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)])
+print()
+
+print("2. Compra no dia 31 de janeiro (ano comum)...")
+verificar("31/01 -> 28/02 -> 31/03 -> 30/04", datas(date(2023, 1, 31), 4),
+          [date(2023, 1, 31), date(2023, 2, 28), date(2023, 3, 31), date(2023, 4, 30)])
+print()
+
+print("3. Compra no dia 30, virando o ano...")
+verificar("30/11 -> 30/12 -> 30/01 -> 28/02", datas(date(2024, 11, 30), 4),
+          [date(2024, 11, 30), date(2024, 12, 30), date(2025, 1, 30), date(2025, 2, 28)])
+print()
+
+print("4. Compra no dia 15 (sem ajuste)...")
+verificar("15 de cada mês", datas(date(2024, 12, 15), 3),
+          [date(2024, 12, 15), date(2025, 1, 15), date(2025, 2, 15)])
+print()
+
+print("=" * 60)
+if falhas:
+    print(f"[ERRO] {falhas} verificação(ões) falharam")
+    sys.exit(1)
+print("[OK] Todas as verificações passaram")
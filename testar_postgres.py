@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para testar as travas do PostgreSQL: migrações rodando em vários workers ao mesmo tempo e ids
+de compras parceladas criadas em paralelo (não precisa do servidor)
+
+Usa o servidor de DATABASE_URL, mas grava num banco descartável criado e apagado aqui. Sem
+PostgreSQL em DATABASE_URL, sem o psycopg (requirements-postgres.txt) ou sem acesso ao servidor,
+avisa e termina sem erro.
+"""
+
+import os
+import secrets
+import sys
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine import make_url
+
+from database import database_url
+
+URL = os.environ.get('DATABASE_URL', '')
+THREADS = 4
+
+falhas = 0
+
+
+def pular(motivo):
+    print(f"[PULADO] {motivo}")
+    sys.exit(0)
+
+
+def verificar(descricao, obtido, esperado):
+    global falhas
+    if obtido == esperado:
+        print(f"   [OK] {descricao}")
+    else:
+        falhas += 1
+        print(f"   [ERRO] {descricao}: esperado {esperado}, obtido {obtido}")
+
+
+def em_paralelo(funcao, quantidade=THREADS):
+    """Roda `funcao()` em `quantidade` threads, cada uma com o seu app_context; devolve os resultados."""
+    resultados = [None] * quantidade
+    erros = []
+
+    def rodar(indice):
+        with app.app.app_context():
+            try:
+                resultados[indice] = funcao()
+            except Exception as e:
+                erros.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=rodar, args=(i,)) for i in range(quantidade)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if erros:
+        raise erros[0]
+    return resultados
+
+
+def espera_a_trava(chave, funcao):
+    """Se `funcao()` fica parada enquanto outra conexão segura a trava `chave`, e termina depois de soltá-la."""
+    with servidor.connect() as conexao:
+        conexao.execute(select(func.pg_advisory_lock(chave)))
+        thread = threading.Thread(target=lambda: em_paralelo(funcao, 1))
+        thread.start()
+        thread.join(1)
+        parada = thread.is_alive()
+        conexao.execute(select(func.pg_advisory_unlock(chave)))
+        conexao.commit()
+    thread.join(30)
+    return parada and not thread.is_alive()
+
+
+if not URL.startswith(('postgres://', 'postgresql://')):
+    pular("DATABASE_URL não aponta para um PostgreSQL")
+try:
+    import psycopg  # noqa: F401
+except ImportError:
+    pular("psycopg não instalado (pip install -r requirements-postgres.txt)")
+
+# Banco descartável no mesmo servidor
+base = make_url(database_url(URL))
+nome_banco = 'financeiro_teste_' + secrets.token_hex(4)
+try:
+    administracao = create_engine(base, isolation_level='AUTOCOMMIT')
+    with administracao.connect() as conexao:
+        conexao.exec_driver_sql(f'CREATE DATABASE {nome_banco}')
+except Exception as e:
+    pular(f"sem acesso ao PostgreSQL ({e.__class__.__name__}: {str(e).strip().splitlines()[0]})")
+
+os.environ['DATABASE_URL'] = base.set(database=nome_banco).render_as_string(hide_password=False)
+servidor = create_engine(os.environ['DATABASE_URL'])
+
+try:
+    import app
+    from installments import TRAVA_COMPRAS_PARCELADAS, next_purchase_ids
+    from migrations import TRAVA_MIGRACOES, VERSAO_ATUAL, schema_version, upgrade
+    from models import db, Despesa, SchemaVersion
+
+    print("=" * 60)
+    print("TESTANDO TRAVAS NO POSTGRESQL")
+    print("=" * 60)
+    print(f"Banco descartável: {nome_banco}")
+    print()
+
+    print(f"1. Migrando com {THREADS} workers ao mesmo tempo...")
+    calado = lambda mensagem: None
+    aplicadas = [versao for lista in em_paralelo(lambda: upgrade(avisar=calado)) for versao in lista]
+    verificar("cada versão aplicada uma única vez", sorted(aplicadas), list(range(1, VERSAO_ATUAL + 1)))
+    with app.app.app_context():
+        verificar(f"banco na versão {VERSAO_ATUAL}", schema_version(db.engine), VERSAO_ATUAL)
+        verificar("uma linha por versão em schema_version", db.session.query(SchemaVersion).count(), VERSAO_ATUAL)
+        db.session.remove()
+    verificar("migrar espera a trava de outro nó", espera_a_trava(TRAVA_MIGRACOES, lambda: upgrade(avisar=calado)), True)
+    print()
+
+    print(f"2. Criando compras parceladas em {THREADS} workers ao mesmo tempo...")
+
+    def nova_compra():
+        ids = next_purchase_ids(2)
+        for compra_parcelada_id in ids:
+            db.session.add(Despesa(descricao='Compra paralela', valor=10, valor_previsto=10, efetivado=False,
+                                   data=date(2024, 1, 1), compra_parcelada_id=compra_parcelada_id))
+        time.sleep(0.1)  # segura a trava um pouco: sem ela, as outras threads leriam o mesmo máximo
+        db.session.commit()
+        return ids
+
+    ids = [compra for lista in em_paralelo(nova_compra) for compra in lista]
+    verificar(f"{len(ids)} ids distintos", len(set(ids)), THREADS * 2)
+    verificar("next_purchase_ids espera a trava de outra transação",
+              espera_a_trava(TRAVA_COMPRAS_PARCELADAS, lambda: next_purchase_ids(1)), True)
+    print()
+finally:
+    if 'app' in sys.modules:
+        with app.app.app_context():
+            db.engine.dispose()
+    servidor.dispose()
+    with administracao.connect() as conexao:
+        conexao.exec_driver_sql(f'DROP DATABASE IF EXISTS {nome_banco}')
+    administracao.dispose()
+
+print("=" * 60)
+if falhas:
+    print(f"[ERRO] {falhas} verificação(ões) falharam")
+    sys.exit(1)
+print("[OK] Todas as verificações passaram")
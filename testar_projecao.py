@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para testar a projeção de saldo (/api/projecao) contra uma conta feita dia a dia
+(banco temporário, não precisa do servidor; com e sem numpy)
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+pasta = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(pasta, 'teste.db')
+os.environ['CACHE_DIR'] = os.path.join(pasta, 'cache')
+
+import app
+import projection
+from migrations import upgrade
+from models import db, Despesa, Receita
+from money import to_cents
+
+falhas = 0
+
+INICIO = date(2024, 3, 15)
+FIM = date(2024, 5, 31)  # 3 meses a partir de março
+
+# (data, efetivado, valor, valor_previsto)
+RECEITAS = [
+    (date(2024, 2, 1), True, 0.10, 0.10),        # realizadas antes do início: saldo inicial
+    (date(2024, 2, 2), True, 0.20, 0.20),
+    (date(2024, 3, 1), True, 3000.00, 3000.00),
+    (date(2024, 3, 10), False, 0, 500.50),       # pendente atrasada: entra no primeiro período
+    (date(2024, 3, 20), True, 200.00, 250.00),   # efetivada: entra pelo valor, não pelo previsto
+    (date(2024, 4, 5), False, 0, 3000.00),
+    (date(2024, 6, 1), False, 0, 999.00),        # depois do horizonte
+]
+DESPESAS = [
+    (date(2024, 1, 10), False, 0, 10.00),        # pendente atrasada de outro mês
+    (date(2024, 2, 20), True, 1200.00, 1200.00),
+    (date(2024, 3, 5), False, 0, 150.25),
+    (date(2024, 3, 15), False, 0, 80.00),        # no próprio dia do início
+    (date(2024, 4, 30), True, 45.55, 50.00),
+    (date(2024, 5, 31), False, 0, 1000.00),      # último dia do horizonte
+]
+
+
+def verificar(descricao, obtido, esperado):
+    global falhas
+    if obtido == esperado:
+        print(f"   [OK] {descricao}")
+    else:
+        falhas += 1
+        print(f"   [ERRO] {descricao}: esperado {esperado}, obtido {obtido}")
+
+
+def conta_dia_a_dia(saldo_inicial=None):
+    """(dia, entradas, saídas, saldo) de cada dia do horizonte, somando os lançamentos um a um em centavos."""
+    if saldo_inicial is None:
+        # realizado até o início: só os efetivados, pelo valor
+        saldo = sum(to_cents(valor) for data, efetivado, valor, _ in RECEITAS if efetivado and data < INICIO) \
+            - sum(to_cents(valor) for data, efetivado, valor, _ in DESPESAS if efetivado and data < INICIO)
+    else:
+        saldo = to_cents(saldo_inicial)
+    dias = []
+    dia = INICIO
+    while dia <= FIM:
+        totais = []
+        for lancamentos in (RECEITAS, DESPESAS):
+            total = 0
+            for data, efetivado, valor, previsto in lancamentos:
+                # efetivados no próprio dia, pelo valor; pendentes pelo previsto, os atrasados no primeiro dia
+                if efetivado and data == dia:
+                    total += to_cents(valor)
+                elif not efetivado and max(data, INICIO) == dia:
+                    total += to_cents(previsto)
+            totais.append(total)
+        entradas, saidas = totais
+        saldo += entradas - saidas
+        dias.append((dia.isoformat(), entradas / 100, saidas / 100, saldo / 100))
+        dia += timedelta(days=1)
+    return dias
+
+
+def por_mes(dias):
+    meses = {}
+    for rotulo, entradas, saidas, saldo in dias:
+        mes = meses.setdefault(rotulo[:7], [0, 0, 0])
+        mes[0] += to_cents(entradas)
+        mes[1] += to_cents(saidas)
+        mes[2] = to_cents(saldo)
+    return [(rotulo, e / 100, s / 100, saldo / 100) for rotulo, (e, s, saldo) in meses.items()]
+
+
+def series(resultado):
+    return list(zip(resultado['periodos'], resultado['entradas'], resultado['saidas'], resultado['saldos']))
+
+
+print("=" * 60)
+print("TESTANDO PROJECAO DE SALDO")
+print("=" * 60)
+print()
+
+with app.app.app_context():
+    upgrade(avisar=lambda mensagem: None)
+    for model, lancamentos in ((Receita, RECEITAS), (Despesa, DESPESAS)):
+        for i, (data, efetivado, valor, previsto) in enumerate(lancamentos):
+            db.session.add(model(descricao=f'{model.__name__} {i}', data=data, efetivado=efetivado,
+                                 valor=valor, valor_previsto=previsto))
+    db.session.commit()
+
+    dias = conta_dia_a_dia()
+    dias_com_saldo = conta_dia_a_dia(saldo_inicial=100)
+
+    caminhos = [('numpy', projection.np)] if projection.np is not None else []
+    if not caminhos:
+        print("(numpy não instalado: só o caminho em Python puro é testado)")
+        print()
+    caminhos.append(('Python puro', None))
+    numpy_original = projection.np
+
+    for numero, (nome, modulo) in enumerate(caminhos, 1):
+        projection.np = modulo
+        print(f"{numero}. Projeção com {nome}...")
+        mensal = projection.compute_projection(inicio=INICIO, meses=3)
+        # conta feita à mão a partir dos lançamentos acima
+        verificar("saldo inicial (realizado até o início)", mensal['saldo_inicial'], 1800.30)
+        verificar("meses com entradas, saídas e saldo calculados à mão", series(mensal), [
+            ('2024-03', 700.50, 240.25, 2260.55),
+            ('2024-04', 3000.00, 45.55, 5215.00),
+            ('2024-05', 0.0, 1000.00, 4215.00),
+        ])
+        verificar("totais do horizonte", (mensal['total_entradas'], mensal['total_saidas'], mensal['saldo_final']),
+                  (3700.50, 1285.80, 4215.00))
+        verificar("menor saldo", mensal['menor_saldo'], {'periodo': '2024-03', 'saldo': 2260.55})
+        verificar("meses iguais à conta dia a dia", series(mensal), por_mes(dias))
+
+        diaria = projection.compute_projection(inicio=INICIO, meses=3, granularidade='dia')
+        verificar(f"{len(dias)} dias iguais à conta dia a dia", series(diaria), dias)
+        verificar("atrasados no primeiro dia", series(diaria)[0], ('2024-03-15', 500.50, 240.25, 2060.55))
+        verificar("saldo inicial informado", series(projection.compute_projection(
+            inicio=INICIO, meses=3, granularidade='dia', saldo_inicial=100)), dias_com_saldo)
+        print()
+    projection.np = numpy_original
+
+    if len(caminhos) == 2:
+        print(f"{len(caminhos) + 1}. Comparando numpy com Python puro...")
+        for granularidade in projection.GRANULARIDADES:
+            resultados = []
+            for _, modulo in caminhos:
+                projection.np = modulo
+                resultados.append(projection.compute_projection(inicio=INICIO, meses=6, granularidade=granularidade))
+            projection.np = numpy_original
+            verificar(f"granularidade '{granularidade}': resultados idênticos", resultados[0], resultados[1])
+        print()
+
+print("=" * 60)
+if falhas:
+    print(f"[ERRO] {falhas} verificação(ões) falharam")
+    sys.exit(1)
+print("[OK] Todas as verificações passaram")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para testar se o ResumoMensal mantido a cada gravação bate com o reconstruído das linhas brutas
+(banco temporário, não precisa do servidor)
+"""
+
+import io
+import os
+import sys
+import tempfile
+from datetime import date
+
+pasta = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(pasta, 'teste.db')
+os.environ['CACHE_DIR'] = os.path.join(pasta, 'cache')
+
+import app
+from migrations import upgrade
+from collections import defaultdict
+
+from sqlalchemy import delete, insert, update
+
+from models import db, Despesa, Receita, ResumoMensal
+from money import to_cents
+from report_engine import ReportFilters, _dividir_periodo, compute_summary, compute_totals
+from rollup import add_to_monthly_summary, monthly_summary_adjusted, rebuild_monthly_summary
+
+falhas = 0
+
+
+def verificar(descricao, obtido, esperado):
+    global falhas
+    if obtido == esperado:
+        print(f"   [OK] {descricao}")
+    else:
+        falhas += 1
+        print(f"   [ERRO] {descricao}: esperado {esperado}, obtido {obtido}")
+
+
+def resumo():
+    """Linhas do ResumoMensal com os valores em centavos; linhas zeradas equivalem a linha nenhuma."""
+    linhas = db.session.query(ResumoMensal).all()
+    return sorted(
+        (l.tipo, l.mes, l.categoria or '', l.categoria_id or 0, l.subcategoria_id or 0, l.tipo_pagamento_id or 0,
+         bool(l.efetivado), l.total_valor.centavos, l.total_previsto.centavos, l.quantidade)
+        for l in linhas if l.quantidade or l.total_valor or l.total_previsto
+    )
+
+
+def somas_brutas():
+    """(tipo, mês, efetivado) -> [valor, previsto, quantidade] somados direto das linhas de receita e despesa."""
+    somas = defaultdict(lambda: [0, 0, 0])
+    for tipo, model in (('receita', Receita), ('despesa', Despesa)):
+        for linha in db.session.query(model.data, model.efetivado, model.valor, model.valor_previsto):
+            soma = somas[(tipo, linha.data.replace(day=1), bool(linha.efetivado))]
+            soma[0] += to_cents(linha.valor or 0)
+            soma[1] += to_cents(linha.valor_previsto or 0)
+            soma[2] += 1
+    return dict(somas)
+
+
+def somas_do_resumo():
+    somas = defaultdict(lambda: [0, 0, 0])
+    for linha in db.session.query(ResumoMensal):
+        soma = somas[(linha.tipo, linha.mes, bool(linha.efetivado))]
+        soma[0] += linha.total_valor.centavos
+        soma[1] += linha.total_previsto.centavos
+        soma[2] += linha.quantidade
+    return {chave: soma for chave, soma in somas.items() if any(soma)}
+
+
+def conferir_resumo(descricao):
+    """Compara o resumo mantido pelas gravações com as somas das linhas brutas e com o reconstruído do zero
+    (a reconstrução é descartada)."""
+    db.session.remove()
+    verificar(f"{descricao}: totais por mês iguais às somas de receita e despesa", somas_do_resumo(), somas_brutas())
+    mantido = resumo()
+    rebuild_monthly_summary()
+    reconstruido = resumo()
+    db.session.rollback()
+    verificar(f"{descricao}: resumo igual ao reconstruído ({len(mantido)} linha(s))", mantido, reconstruido)
+
+
+def sucesso(resposta):
+    corpo = resposta.get_json()
+    if not corpo.get('success'):
+        print(f"   [ERRO] requisição falhou: {corpo}")
+    return corpo
+
+
+print("=" * 60)
+print("TESTANDO RESUMO MENSAL")
+print("=" * 60)
+print()
+
+with app.app.app_context():
+    upgrade(avisar=lambda mensagem: None)
+
+cliente = app.app.test_client()
+cliente.post('/login', data={'username': 'admin', 'password': 'admin'})
+
+with app.app.app_context():
+    print("1. Inserindo receitas e despesas...")
+    sucesso(cliente.post('/api/receita', json={'descricao': 'Salário', 'valor_previsto': 5000.10, 'data': '2024-01-05',
+                                               'categoria': 'Salário', 'efetivado': True}))
+    sucesso(cliente.post('/api/receita', json={'descricao': 'Freela', 'valor_previsto': 333.33, 'data': '2024-02-20',
+                                               'categoria': 'Extra', 'efetivado': False}))
+    sucesso(cliente.post('/api/despesa', json={'descricao': 'Mercado', 'valor_previsto': 250.75, 'data': '2024-01-10',
+                                               'categoria': 'Alimentação', 'subcategoria': 'Mercado',
+                                               'tipo_pagamento_id': 1, 'efetivado': True}))
+    sucesso(cliente.post('/api/despesa', json={'descricao': 'Notebook', 'valor_previsto': 1000, 'data': '2024-01-31',
+                                               'categoria': 'Eletrônicos', 'tipo_pagamento_id': 2, 'parcelas': 6}))
+    conferir_resumo("inserção")
+    print()
+
+    print("2. Atualizando todas as parcelas de uma compra (valor proporcional)...")
+    segunda = Despesa.query.filter_by(descricao='Notebook (2/6)').one()
+    sucesso(cliente.put(f'/api/despesa/{segunda.id}', json={'compra_parcelada_id': segunda.compra_parcelada_id,
+                                                           'atualizar_todas_parcelas': True,
+                                                           'efetivado': True, 'valor': 170.01}))
+    conferir_resumo("PUT proporcional do grupo")
+    sucesso(cliente.put(f'/api/despesa/{segunda.id}', json={'efetivado': False, 'valor': 0}))
+    receita = Receita.query.filter_by(descricao='Freela').one()
+    sucesso(cliente.put(f'/api/receita/{receita.id}', json={'efetivado': True}))
+    conferir_resumo("PUT de uma linha só")
+    print()
+
+    print("3. Deletando uma parcela e as futuras (opção 2)...")
+    quarta = Despesa.query.filter_by(descricao='Notebook (4/6)').one()
+    sucesso(cliente.delete(f'/api/despesa/{quarta.id}?compra_parcelada_id={quarta.compra_parcelada_id}&opcao_delete=2'))
+    verificar("restam 3 parcelas", Despesa.query.filter(Despesa.descricao.like('Notebook (%')).count(), 3)
+    conferir_resumo("delete opção 2")
+    print()
+
+    print("4. Gravando em lote...")
+    sucesso(cliente.post('/api/receitas/lote', json=[
+        {'descricao': f'Aluguel recebido {i}', 'valor_previsto': 1200.5, 'data': f'2024-0{i}-10', 'categoria': 'Aluguel',
+         'efetivado': i % 2 == 0}
+        for i in range(1, 5)
+    ]))
+    sucesso(cliente.post('/api/despesas/lote', json=[
+        {'descricao': 'Academia', 'valor_previsto': 99.9, 'data': '2024-03-01', 'categoria': 'Saúde', 'efetivado': True},
+        {'descricao': 'Geladeira', 'valor_previsto': 3000, 'data': '2024-02-29', 'categoria': 'Casa', 'parcelas': 7,
+         'tipo_pagamento_id': 2},
+    ]))
+    conferir_resumo("lote")
+    print()
+
+    print("5. Importando extrato...")
+    extrato = ("Data;Histórico;Valor;Categoria\n"
+               "15/03/2024;Padaria;-12,34;Alimentação\n"
+               "01/04/2024;Reembolso;45,60;Extra\n"
+               "15/03/2024;Padaria;-12,34;Alimentação\n"
+               "30/04/2024;Luz;-180,00;Casa\n")
+    sucesso(cliente.post('/api/importar', data={'arquivo': (io.BytesIO(extrato.encode('utf-8')), 'extrato.csv')},
+                         content_type='multipart/form-data'))
+    conferir_resumo("importação")
+    print()
+
+    print("6. Gravando pela sessão (ORM) e em lote, fora das rotas...")
+    receita = Receita(descricao='Bônus', valor_previsto=800, valor=0, data=date(2024, 5, 3), categoria='Salário')
+    db.session.add(receita)
+    db.session.commit()
+    receita_id = receita.id
+    conferir_resumo("inserção pelo ORM")
+    receita = db.session.get(Receita, receita_id)
+    receita.valor, receita.efetivado, receita.data = 812.49, True, date(2024, 6, 1)
+    db.session.commit()
+    conferir_resumo("alteração pelo ORM (mudando de mês)")
+    db.session.delete(db.session.get(Receita, receita_id))
+    db.session.commit()
+    conferir_resumo("remoção pelo ORM")
+
+    linhas = [{'descricao': f'Rendimento {i}', 'valor_previsto': 10.01 * i, 'valor': 10.01 * i, 'data': date(2024, 5, i),
+               'categoria': 'Investimentos', 'efetivado': True} for i in range(1, 11)]
+    db.session.execute(insert(Receita.__table__), linhas)
+    add_to_monthly_summary(Receita, linhas)
+    db.session.commit()
+    conferir_resumo("INSERT em lote")
+    criterio = Despesa.descricao.like('Geladeira (%')
+    with monthly_summary_adjusted(Despesa, criterio):
+        db.session.execute(update(Despesa).where(criterio).values(efetivado=True, valor=Despesa.valor_previsto)
+                           .execution_options(synchronize_session=False))
+    db.session.commit()
+    conferir_resumo("UPDATE em lote")
+    criterio = Receita.descricao.like('Rendimento %')
+    with monthly_summary_adjusted(Receita, criterio):
+        db.session.execute(delete(Receita).where(criterio).execution_options(synchronize_session=False))
+    db.session.commit()
+    conferir_resumo("DELETE em lote")
+    print()
+
+    print("7. Separando o período em meses completos e bordas...")
+    verificar("15/01 a 10/03: fevereiro completo e duas bordas",
+              _dividir_periodo(date(2024, 1, 15), date(2024, 3, 10)),
+              ((date(2024, 2, 1), date(2024, 2, 1)),
+               [(date(2024, 1, 15), date(2024, 1, 31)), (date(2024, 3, 1), date(2024, 3, 10))]))
+    verificar("01/01 a 31/03: só meses completos",
+              _dividir_periodo(date(2024, 1, 1), date(2024, 3, 31)), ((date(2024, 1, 1), date(2024, 3, 1)), []))
+    verificar("10/02 a 20/02: uma borda só",
+              _dividir_periodo(date(2024, 2, 10), date(2024, 2, 20)), (None, [(date(2024, 2, 10), date(2024, 2, 20))]))
+    verificar("15/01 a 10/02: duas bordas, nenhum mês completo",
+              _dividir_periodo(date(2024, 1, 15), date(2024, 2, 10)),
+              (None, [(date(2024, 1, 15), date(2024, 1, 31)), (date(2024, 2, 1), date(2024, 2, 10))]))
+    verificar("sem início até 10/03",
+              _dividir_periodo(None, date(2024, 3, 10)), ((None, date(2024, 2, 1)), [(date(2024, 3, 1), date(2024, 3, 10))]))
+    verificar("de 15/01 sem fim",
+              _dividir_periodo(date(2024, 1, 15), None), ((date(2024, 2, 1), None), [(date(2024, 1, 15), date(2024, 1, 31))]))
+    verificar("início depois do fim", _dividir_periodo(date(2024, 3, 1), date(2024, 2, 1)), (None, []))
+    print()
+
+    print("8. Totais do resumo (meses + bordas) contra as linhas brutas...")
+    periodos = [(None, None), (date(2024, 1, 15), date(2024, 3, 10)), (date(2024, 1, 1), date(2024, 3, 31)),
+                (date(2024, 2, 10), date(2024, 2, 29)), (date(2024, 1, 31), date(2024, 2, 1)),
+                (None, date(2024, 3, 15)), (date(2024, 2, 29), None)]
+    for inicio, fim in periodos:
+        for status in (None, 'efetivado', 'pendente'):
+            filtros = ReportFilters(data_inicio=inicio, data_fim=fim, status=status)
+            calculado, bruto = compute_summary(filtros), compute_totals(filtros)
+            verificar(f"{inicio or '...'} a {fim or '...'} ({status or 'todos'})",
+                      (calculado['total_receitas'], calculado['total_despesas']),
+                      (bruto['total_receitas'], bruto['total_despesas']))
+    print()
+
+print("=" * 60)
+if falhas:
+    print(f"[ERRO] {falhas} verificação(ões) falharam")
+    sys.exit(1)
+print("[OK] Todas as verificações passaram")
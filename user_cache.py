@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import namedtuple
+
+TTL_PADRAO = 300  # segundos
+
+# Só o necessário para as páginas e os decorators: nada de hash de senha em memória
+UsuarioCache = namedtuple('UsuarioCache', 'id username is_admin')
+
+
+class UserCache:
+    """Cache por processo dos usuários logados (id -> UsuarioCache) com validade e contadores de acerto.
+
+    Alterações feitas neste processo invalidam a entrada na hora. Para os outros workers, `versao`
+    devolve uma versão compartilhada dos usuários (data_version.user_version): entradas lidas em
+    outra versão são carregadas de novo, então um usuário removido ou rebaixado perde o acesso na
+    requisição seguinte em qualquer worker. Sem `versao`, a entrada expira pelo TTL.
+    """
+
+    def __init__(self, ttl=TTL_PADRAO, relogio=time.monotonic, versao=None):
+        self.ttl = ttl
+        self.relogio = relogio
+        self.versao = versao
+        self._entradas = {}
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def get(self, user_id, carregar):
+        """Usuário em cache ou, se ausente/expirado, o resultado de `carregar(user_id)` (None se não existir)."""
+        agora = self.relogio()
+        # lida antes de carregar: se o usuário mudar durante a carga, a entrada fica com a versão antiga e é recarregada
+        versao = self.versao() if self.versao else None
+        with self._lock:
+            entrada = self._entradas.get(user_id)
+            if entrada and entrada[0] > agora and entrada[1] == versao:
+                self.acertos += 1
+                return entrada[2]
+            self.falhas += 1
+
+        usuario = carregar(user_id)
+        dados = UsuarioCache(usuario.id, usuario.username, bool(usuario.is_admin)) if usuario else None
+        with self._lock:
+            self._entradas[user_id] = (agora + self.ttl, versao, dados)
+        return dados
+
+    def invalidate(self, user_id=None):
+        """Descarta um usuário (ou todos, sem argumento)."""
+        with self._lock:
+            if user_id is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / total, 4) if total else 0.0,
+                'entradas': len(self._entradas),
+                'ttl': self.ttl,
+            }
@@ -23,8 +23,8 @@ def verificar_banco():
             if despesas:
                 despesa = despesas[0]
                 print(f"Primeira despesa: {despesa.descricao}")
-                print(f"Categoria: {despesa.categoria}")
-                print(f"Subcategoria: {despesa.subcategoria}")
+                print(f"Categoria: {despesa.categoria.nome if despesa.categoria else None}")
+                print(f"Subcategoria: {despesa.subcategoria.nome if despesa.subcategoria else None}")
             
             print("Banco de dados OK!")
             
@@ -0,0 +1,165 @@
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+# Estilos (índices de cellXfs em styles.xml)
+TEXTO = 0
+DATA = 1
+MOEDA = 2
+NEGRITO = 3
+
+_EPOCA = date(1899, 12, 30)
+# Caracteres de controle não são aceitos em XML
+_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_ASPAS = {'"': '&quot;'}
+
+_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+{planilhas}</Types>'''
+
+_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+
+_WORKBOOK = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets>{planilhas}</sheets>
+</workbook>'''
+
+_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+{planilhas}<Relationship Id="rIdEstilos" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>'''
+
+# Formatos 14 (data) e 4 (#,##0.00) são embutidos no Excel: não precisam de numFmts
+_STYLES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="4">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>
+</cellXfs>
+</styleSheet>'''
+
+_INICIO_PLANILHA = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">')
+
+
+def _coluna(indice):
+    """0 -> A, 25 -> Z, 26 -> AA."""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celula(referencia, valor, estilo):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return f'<c r="{referencia}" t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, datetime):
+        valor = valor.date()
+    if isinstance(valor, date):
+        return f'<c r="{referencia}" s="{DATA}"><v>{(valor - _EPOCA).days}</v></c>'
+    if isinstance(valor, (int, float)):
+        estilo_attr = f' s="{estilo}"' if estilo else ''
+        return f'<c r="{referencia}"{estilo_attr}><v>{valor!r}</v></c>'
+    texto = escape(_INVALIDOS.sub('', str(valor)))
+    estilo_attr = f' s="{estilo}"' if estilo else ''
+    return f'<c r="{referencia}" t="inlineStr"{estilo_attr}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+class _Planilha:
+    """Planilha aberta no zip; as linhas são gravadas à medida que chegam."""
+
+    def __init__(self, saida, cabecalho, estilos):
+        self._saida = saida
+        self._colunas = [_coluna(i) for i in range(len(cabecalho))]
+        self._estilos = estilos or [TEXTO] * len(cabecalho)
+        self._proxima = 2
+
+    def append(self, linha):
+        numero = self._proxima
+        self._proxima += 1
+        celulas = ''.join(_celula(f'{coluna}{numero}', valor, estilo)
+                          for coluna, valor, estilo in zip(self._colunas, linha, self._estilos))
+        self._saida.write(f'<row r="{numero}">{celulas}</row>'.encode('utf-8'))
+
+    def close(self):
+        self._saida.write(b'</sheetData></worksheet>')
+        self._saida.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        self.close()
+
+
+class XlsxWriter:
+    """Gera um .xlsx mínimo (planilhas com texto, números, datas e booleanos) sem dependências.
+
+    As linhas vão direto para o zip conforme são acrescentadas, então a memória não cresce com o
+    tamanho da exportação e `arquivo` não precisa permitir seek. Como no zipfile, só uma planilha
+    fica aberta por vez.
+    """
+
+    def __init__(self, arquivo):
+        self._zip = zipfile.ZipFile(arquivo, 'w', zipfile.ZIP_DEFLATED)
+        self._planilhas = []
+
+    def add_sheet(self, nome, cabecalho, estilos=None, larguras=None):
+        """Abre a planilha `nome` e devolve-a para receber linhas via `append`.
+
+        `estilos` é o estilo de cada coluna (TEXTO, DATA, MOEDA) e `larguras` a largura em caracteres.
+        """
+        self._planilhas.append(nome)
+        saida = self._zip.open(f'xl/worksheets/sheet{len(self._planilhas)}.xml', 'w')
+        partes = [_INICIO_PLANILHA,
+                  # cabeçalho fixo ao rolar
+                  '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+                  'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>']
+        if larguras:
+            partes.append('<cols>' + ''.join(f'<col min="{i}" max="{i}" width="{largura}" customWidth="1"/>'
+                                             for i, largura in enumerate(larguras, 1)) + '</cols>')
+        partes.append('<sheetData><row r="1">')
+        partes.extend(_celula(f'{_coluna(i)}1', titulo, NEGRITO) for i, titulo in enumerate(cabecalho))
+        partes.append('</row>')
+        saida.write(''.join(partes).encode('utf-8'))
+        return _Planilha(saida, cabecalho, estilos)
+
+    def close(self):
+        planilhas = range(1, len(self._planilhas) + 1)
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES.format(planilhas=''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>\n'
+            for i in planilhas)))
+        self._zip.writestr('_rels/.rels', _RELS)
+        self._zip.writestr('xl/workbook.xml', _WORKBOOK.format(planilhas=''.join(
+            f'<sheet name="{escape(nome[:31], _ASPAS)}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, nome in zip(planilhas, self._planilhas))))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS.format(planilhas=''.join(
+            f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+            f'worksheet" Target="worksheets/sheet{i}.xml"/>\n' for i in planilhas)))
+        self._zip.writestr('xl/styles.xml', _STYLES)
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        self.close()